@@ -1,31 +1,200 @@
-from django.contrib import admin
-from .models import Profile, ChatThread, ChatMessage, ImageJob, PaymentTransaction, PasswordResetToken
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .models import (
+    Profile, ChatThread, ChatMessage, ImageJob, PaymentTransaction, PasswordResetToken, OutboundEmail,
+    ArchivedImageJob, ArchivedChatMessage, ImageUsageRollup, RevenueRollup, DeletionRequest, OrphanedBlob,
+)
+from .deletion import request_thread_deletion, request_user_deletion
+from .payment_services import available_gateways
+from .provider_routing import router
+from .search import search
+from .services import available_providers
+
+
+def estimated_row_count(model, using: str):
+    """Planner estimate of a table's rows (summed over partitions), or None when unknown"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        # reltuples is -1 until the first VACUUM/ANALYZE; a partitioned parent holds no rows itself
+        cursor.execute(
+            "SELECT sum(reltuples) FILTER (WHERE reltuples >= 0) FROM pg_class "
+            "WHERE oid = %s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+            [model._meta.db_table] * 2,
+        )
+        estimate = cursor.fetchone()[0]
+    return int(estimate) if estimate is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids COUNT(*) over large tables: an unfiltered changelist uses the planner's row
+    estimate, and a filtered one counts at most ADMIN_COUNT_LIMIT rows, so only the
+    first pages are reachable until the filter is narrowed.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+
+
+class BackgroundDeletionMixin:
+    """Replaces the collector-based delete with a DeletionRequest handled by process_deletions"""
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Schedule deletion of selected rows (runs in the background)')
+    def schedule_deletion(self, request, queryset):
+        for obj in queryset:
+            self.request_deletion(obj)
+        self.message_user(request, f"Scheduled {queryset.count()} deletion(s)", messages.SUCCESS)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+
+
+class ChoicesListFilter(admin.SimpleListFilter):
+    """
+    Filter whose options come from a known catalogue instead of SELECT DISTINCT over the
+    table, which Django's default filter for a plain CharField runs on every page load.
+    """
+
+    def choices_for(self, request):
+        return []
+
+    def lookups(self, request, model_admin):
+        return [(value, value) for value in self.choices_for(request)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class ProviderListFilter(ChoicesListFilter):
+    title = 'provider'
+    parameter_name = 'provider'
+
+    def choices_for(self, request):
+        return available_providers()
+
+
+class ImageModelListFilter(ChoicesListFilter):
+    title = 'model'
+    parameter_name = 'model'
+
+    def choices_for(self, request):
+        # The daily rollups hold every provider/model pair in a few rows per day
+        models = cache.get('admin:image_models')
+        if models is None:
+            models = list(
+                ImageUsageRollup.objects.filter(granularity='day')
+                .values_list('model', flat=True).distinct().order_by('model')
+            )
+            cache.set('admin:image_models', models, 600)
+        # Rollups only cover finished jobs; routed models can be queued before any has run
+        return sorted({*models, *(candidate.model for candidate in router.candidates())})
+
+
+class GatewayListFilter(ChoicesListFilter):
+    title = 'gateway'
+    parameter_name = 'gateway'
+
+    def choices_for(self, request):
+        return available_gateways()
+
+
+class FullTextSearchMixin:
+    """Matches the model's text column through the full-text index instead of an ILIKE '%q%' scan"""
+
+    def get_search_results(self, request, queryset, search_term):
+        matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return matches, may_have_duplicates
+        text_matches = search(queryset, search_term).values('pk')
+        return queryset.filter(Q(pk__in=matches.values('pk')) | Q(pk__in=text_matches)), may_have_duplicates
+
+
+class RecentMessagesFormSet(BaseInlineFormSet):
+    def get_queryset(self):
+        if not hasattr(self, '_recent'):
+            messages = super().get_queryset().order_by('-created_at', '-id')
+            self._recent = messages[:settings.ADMIN_INLINE_LIMIT]
+        return self._recent
 
 
 class ChatMessageInline(admin.TabularInline):
+    """Read-only view of a thread's latest messages; the full list is linked from the thread"""
     model = ChatMessage
+    formset = RecentMessagesFormSet
+    fields = ['role', 'content', 'created_at']
+    readonly_fields = fields
+    show_change_link = True
     extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'credits', 'total_images_generated']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email']
 
 
 @admin.register(ChatThread)
-class ChatThreadAdmin(admin.ModelAdmin):
-    list_display = ['title', 'user', 'created_at', 'updated_at']
+class ChatThreadAdmin(BackgroundDeletionMixin, LargeTableAdmin):
+    list_display = ['title', 'user', 'created_at', 'updated_at', 'deleted_at']
     list_filter = ['created_at', 'updated_at']
-    search_fields = ['title', 'user__username']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['title', '=user__username']
+    readonly_fields = ['all_messages', 'deleted_at']
     inlines = [ChatMessageInline]
+    actions = ['schedule_deletion']
+    request_deletion = staticmethod(request_thread_deletion)
+
+    @admin.display(description='Messages')
+    def all_messages(self, obj):
+        url = reverse('admin:api_chatmessage_changelist')
+        return format_html('<a href="{}?thread__id__exact={}">View all messages</a>', url, obj.pk)
 
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ['thread', 'role', 'content_preview', 'created_at']
     list_filter = ['role', 'created_at']
-    search_fields = ['content', 'thread__title', 'thread__user__username']
+    list_select_related = ['thread__user']
+    raw_id_fields = ['thread']
+    # `content` is covered by FullTextSearchMixin
+    search_fields = ['=thread__user__username']
     
     def content_preview(self, obj):
         return obj.content[:50] + "..." if len(obj.content) > 50 else obj.content
@@ -33,18 +202,23 @@ class ChatMessageAdmin(admin.ModelAdmin):
 
 
 @admin.register(ImageJob)
-class ImageJobAdmin(admin.ModelAdmin):
-    list_display = ['user', 'provider', 'model', 'status', 'created_at', 'credits_spent']
-    list_filter = ['provider', 'model', 'status', 'created_at']
-    search_fields = ['prompt', 'user__username']
-    readonly_fields = ['created_at', 'completed_at']
+class ImageJobAdmin(FullTextSearchMixin, LargeTableAdmin):
+    list_display = ['user', 'provider', 'model', 'status', 'priority', 'created_at', 'credits_spent']
+    list_filter = [ProviderListFilter, ImageModelListFilter, 'status', 'priority', 'created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user', 'thread']
+    # `prompt` is covered by FullTextSearchMixin
+    search_fields = ['=user__username']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
 
 
 @admin.register(PaymentTransaction)
-class PaymentTransactionAdmin(admin.ModelAdmin):
+class PaymentTransactionAdmin(LargeTableAdmin):
     list_display = ['user', 'gateway', 'transaction_id', 'amount', 'credits_purchased', 'status', 'created_at']
-    list_filter = ['gateway', 'status', 'created_at']
-    search_fields = ['transaction_id', 'user__username', 'user__email']
+    list_filter = [GatewayListFilter, 'status', 'created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['=transaction_id', '=user__username', '=user__email']
     readonly_fields = ['created_at', 'completed_at']
 
 
@@ -52,5 +226,80 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
 class PasswordResetTokenAdmin(admin.ModelAdmin):
     list_display = ['user', 'token', 'created_at', 'expires_at', 'used']
     list_filter = ['used', 'created_at']
+    list_select_related = ['user']
+    ordering = ['-id']
     search_fields = ['user__username', 'user__email', 'token']
     readonly_fields = ['token', 'created_at']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+
+@admin.register(ArchivedImageJob)
+class ArchivedImageJobAdmin(LargeTableAdmin):
+    list_display = ['original_id', 'user', 'provider', 'model', 'status', 'created_at', 'archived_at']
+    list_filter = [ProviderListFilter, 'status']
+    list_select_related = ['user']
+    search_fields = ['prompt', 'user__username']
+    readonly_fields = ['archived_at']
+
+
+@admin.register(ArchivedChatMessage)
+class ArchivedChatMessageAdmin(LargeTableAdmin):
+    list_display = ['original_id', 'thread', 'role', 'created_at', 'archived_at']
+    list_filter = ['role']
+    list_select_related = ['thread']
+    search_fields = ['content', 'thread__title']
+    readonly_fields = ['archived_at']
+
+
+class RollupAdmin(LargeTableAdmin):
+    """Rollups are written by api.rollups only"""
+    list_select_related = ['user']
+    search_fields = ['=user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImageUsageRollup)
+class ImageUsageRollupAdmin(RollupAdmin):
+    list_display = ['bucket', 'granularity', 'user', 'provider', 'model', 'jobs', 'failed_jobs', 'images', 'credits_spent']
+    list_filter = ['granularity', ProviderListFilter, 'bucket']
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(RollupAdmin):
+    list_display = ['bucket', 'granularity', 'user', 'gateway', 'transactions', 'amount', 'credits_purchased']
+    list_filter = ['granularity', GatewayListFilter, 'bucket']
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(BackgroundDeletionMixin, BaseUserAdmin):
+    actions = ['schedule_deletion']
+    request_deletion = staticmethod(request_user_deletion)
+
+
+@admin.register(DeletionRequest)
+class DeletionRequestAdmin(admin.ModelAdmin):
+    list_display = ['target', 'object_id', 'status', 'attempts', 'created_at', 'updated_at', 'completed_at']
+    list_filter = ['target', 'status']
+    search_fields = ['=object_id']
+    readonly_fields = ['rows_deleted', 'last_error', 'attempts', 'created_at', 'updated_at', 'completed_at']
+
+
+@admin.register(OrphanedBlob)
+class OrphanedBlobAdmin(admin.ModelAdmin):
+    list_display = ['storage', 'name', 'created_at']
+    list_filter = ['storage']
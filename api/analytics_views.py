@@ -0,0 +1,90 @@
+from datetime import timedelta
+from django.db.models import Sum
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import ImageUsageRollup, RevenueRollup
+from .rollups import GRANULARITIES, USAGE_COUNTERS, REVENUE_COUNTERS
+
+# Longest window per granularity, which bounds the rows a dashboard query touches
+MAX_DAYS = {'hour': 14, 'day': 366}
+
+
+def rollup_series(request, queryset, counters, dimensions):
+    """
+    Totals per bucket from a rollup table, optionally split by `?group_by=` dimensions.
+    Query parameters: granularity (hour|day), days, group_by (comma separated).
+    """
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValidationError({'granularity': f"Must be one of: {', '.join(GRANULARITIES)}."})
+    days = request.query_params.get('days', '30')
+    if not days.isdigit() or not 1 <= int(days) <= MAX_DAYS[granularity]:
+        raise ValidationError({'days': f"Must be between 1 and {MAX_DAYS[granularity]} for {granularity} buckets."})
+    group_by = [name for name in request.query_params.get('group_by', '').split(',') if name]
+    unknown = set(group_by) - set(dimensions)
+    if unknown:
+        raise ValidationError({'group_by': f"Unknown dimension(s): {', '.join(sorted(unknown))}."})
+
+    since = timezone.now() - timedelta(days=int(days))
+    rows = (
+        queryset.filter(granularity=granularity, bucket__gte=since)
+        .values('bucket', *group_by)
+        .annotate(**{name: Sum(name) for name in counters})
+        .order_by('bucket', *group_by)
+    )
+    return Response({'granularity': granularity, 'since': since, 'group_by': group_by, 'results': list(rows)})
+
+
+def _parameters(dimensions):
+    return [
+        OpenApiParameter('granularity', str, enum=list(GRANULARITIES), description='Bucket size (default: day)'),
+        OpenApiParameter('days', int, description='Window length in days (default: 30)'),
+        OpenApiParameter('group_by', str, description=f"Comma-separated dimensions: {', '.join(dimensions)}"),
+    ]
+
+
+USAGE_DIMENSIONS = ('provider', 'model')
+STAFF_USAGE_DIMENSIONS = USAGE_DIMENSIONS + ('user',)
+REVENUE_DIMENSIONS = ('gateway', 'user')
+
+
+@extend_schema(
+    tags=['Analytics'],
+    summary='Image generation usage over time',
+    description='Your own usage; staff see every user, or one with `?user=<id>`.',
+    parameters=_parameters(STAFF_USAGE_DIMENSIONS) + [OpenApiParameter('user', int, description='Staff only')],
+    responses={200: OpenApiResponse(description='Jobs, failed jobs, images and credits spent per bucket')},
+)
+class UsageAnalyticsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        queryset = ImageUsageRollup.objects.all()
+        dimensions = USAGE_DIMENSIONS
+        if not request.user.is_staff:
+            queryset = queryset.filter(user=request.user)
+        else:
+            dimensions = STAFF_USAGE_DIMENSIONS
+            user_id = request.query_params.get('user')
+            if user_id:
+                if not user_id.isdigit():
+                    raise ValidationError({'user': 'Must be a user id.'})
+                queryset = queryset.filter(user_id=int(user_id))
+        return rollup_series(request, queryset, USAGE_COUNTERS, dimensions)
+
+
+@extend_schema(
+    tags=['Analytics'],
+    summary='Revenue over time',
+    parameters=_parameters(REVENUE_DIMENSIONS),
+    responses={200: OpenApiResponse(description='Completed transactions, amount and credits sold per bucket')},
+)
+class RevenueAnalyticsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return rollup_series(request, RevenueRollup.objects.all(), REVENUE_COUNTERS, REVENUE_DIMENSIONS)
@@ -0,0 +1,61 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def _version_key(user_id) -> str:
+    return f"auth:user-version:{user_id}"
+
+
+def get_user_cache_version(user_id) -> str:
+    """Current cache version for a user; a fresh random version is minted if none is stored"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Rotate the user's cache version so every cached copy of the user and profile is bypassed"""
+    cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user (with profile) from the cache.
+    Entries are keyed by user id and cache version and live for AUTH_USER_CACHE_TIMEOUT
+    seconds; saving a User or Profile rotates the version (see signals.py).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache_key = f"auth:user:{user_id}:{get_user_cache_version(user_id)}"
+        user = cache.get(cache_key)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(cache_key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,257 @@
+"""
+Load-testing helpers used by `python manage.py benchmark`.
+
+Seeds a throwaway database with realistic volumes, swaps the image providers for
+fakes with configurable latency and drives the main endpoints concurrently.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from decimal import Decimal
+from typing import Callable, Dict, List, Tuple
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from .image_preprocessing import PreparedImage
+from .models import Profile, ChatThread, ChatMessage, ImageJob, PaymentTransaction
+
+# 1x1 transparent PNG
+FAKE_PNG_B64 = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+
+
+class FakeImageService:
+    """Stand-in for a real provider: sleeps for `latency` seconds and returns fixed images"""
+    provider = 'fake'
+
+    def __init__(self, model: str, latency: float = 0.0):
+        self.model = model
+        self.latency = latency
+
+    def generate(self, prompt: str, input_images: List[PreparedImage] | None = None) -> List[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [FAKE_PNG_B64]
+
+
+class FakeOpenAIImageService(FakeImageService):
+    provider = 'openai'
+
+    def generate(self, prompt: str, input_images: List[PreparedImage] | None = None, size: str = "1024x1024") -> List[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [f"https://example.invalid/{abs(hash(prompt))}.png"]
+
+
+class FakeGeminiImageService(FakeImageService):
+    provider = 'gemini'
+
+
+PROVIDER_MODELS = [('openai', 'dall-e-3'), ('gemini', 'gemini-2.5-flash-image-preview')]
+
+
+def fake_select_service(latency: float) -> Callable:
+    def select_service(provider: str):
+        if provider == 'openai':
+            return FakeOpenAIImageService('dall-e-3', latency)
+        if provider == 'gemini':
+            return FakeGeminiImageService('gemini-2.5-flash-image-preview', latency)
+        raise ValueError('Unsupported provider')
+    return select_service
+
+
+def seed(users: int, threads_per_user: int, messages_per_thread: int, jobs_per_user: int,
+         payments_per_user: int, batch_size: int = 1000) -> List[User]:
+    """Bulk-insert a realistic dataset and return the created users"""
+    password = make_password('benchmark-password')
+    stamp = int(time.time())
+    User.objects.bulk_create(
+        [User(username=f'bench_{stamp}_{i}', email=f'bench_{stamp}_{i}@example.com', password=password)
+         for i in range(users)],
+        batch_size=batch_size,
+    )
+    created = list(User.objects.filter(username__startswith=f'bench_{stamp}_').order_by('id'))
+    Profile.objects.bulk_create([Profile(user=user, credits=1_000_000) for user in created], batch_size=batch_size)
+
+    ChatThread.objects.bulk_create(
+        [ChatThread(user=user, title=f'Thread {t}') for user in created for t in range(threads_per_user)],
+        batch_size=batch_size,
+    )
+    threads = list(ChatThread.objects.filter(user__in=created).values_list('id', flat=True))
+    messages = (
+        ChatMessage(thread_id=thread_id, role='user' if m % 2 == 0 else 'assistant',
+                    content=f'Generate image: a lighthouse at dusk, variation {m}')
+        for thread_id in threads for m in range(messages_per_thread)
+    )
+    _bulk_create_iter(ChatMessage, messages, batch_size)
+
+    now = timezone.now()
+    jobs = (
+        ImageJob(user=user, provider=provider, model=model,
+                 prompt=f'A watercolor painting of mountains #{j}', output_images=[FAKE_PNG_B64],
+                 status='completed', completed_at=now, credits_spent=1)
+        for user in created for j in range(jobs_per_user)
+        for provider, model in [random.choice(PROVIDER_MODELS)]
+    )
+    _bulk_create_iter(ImageJob, jobs, batch_size)
+
+    payments = (
+        PaymentTransaction(user=user, gateway=random.choice(['khalti', 'esewa', 'stripe', 'razorpay', 'binance']),
+                           transaction_id=f'bench_{user.id}_{p}', amount=Decimal('10.00'),
+                           credits_purchased=100, status='completed', completed_at=now)
+        for user in created for p in range(payments_per_user)
+    )
+    _bulk_create_iter(PaymentTransaction, payments, batch_size)
+    return created
+
+
+def _bulk_create_iter(model, objects, batch_size: int) -> None:
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def build_scenarios(users: List[User]) -> Dict[str, Callable]:
+    """Map scenario name to a callable(client, user) that performs one request"""
+    thread_ids: Dict[int, List[int]] = {}
+    for thread_id, user_id in ChatThread.objects.filter(user__in=users).values_list('id', 'user_id'):
+        thread_ids.setdefault(user_id, []).append(thread_id)
+    job_ids: Dict[int, List[int]] = {}
+    for job_id, user_id in ImageJob.objects.filter(user__in=users).values_list('id', 'user_id'):
+        job_ids.setdefault(user_id, []).append(job_id)
+
+    def image_job_create(client, user):
+        provider, model = random.choice(PROVIDER_MODELS)
+        return client.post('/api/image-jobs/', json.dumps({
+            'provider': provider,
+            'model': model,
+            'prompt': 'A benchmark robot painting a sunset',
+        }), content_type='application/json')
+
+    return {
+        'me': lambda client, user: client.get('/api/me/'),
+        'chat_threads': lambda client, user: client.get('/api/chat/threads/'),
+        'chat_thread_detail': lambda client, user: client.get(
+            f"/api/chat/threads/{random.choice(thread_ids.get(user.id) or [0])}/"),
+        'image_jobs': lambda client, user: client.get('/api/image-jobs/'),
+        'image_job_detail': lambda client, user: client.get(
+            f"/api/image-jobs/{random.choice(job_ids.get(user.id) or [0])}/"),
+        'payments': lambda client, user: client.get('/api/payments/'),
+        'image_job_create': image_job_create,
+    }
+
+
+def run_scenario(request: Callable, users: List[User], requests: int, concurrency: int) -> Dict[str, float]:
+    """Issue `requests` calls from `concurrency` threads and summarise latency and query counts"""
+    tokens = {user.id: str(RefreshToken.for_user(user).access_token) for user in users}
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        client = Client(raise_request_exception=False)
+        try:
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+                user = random.choice(users)
+                client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {tokens[user.id]}"
+                # Reads may be routed to a replica; count queries on every database
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    start = time.perf_counter()
+                    response = request(client, user)
+                    elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(sum(len(context) for context in captured))
+                    if response.status_code >= 400:
+                        errors += 1
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': sum(queries) / len(queries) if queries else 0.0,
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+# Latency is recorded relative to this scenario's p95 in the same run, so a baseline
+# recorded on one machine still means something on another
+CALIBRATION_SCENARIO = 'me'
+
+
+def add_relative_latency(results: Dict[str, Dict[str, float]]) -> None:
+    """Set each scenario's `p95_relative` (its p95 over the calibration scenario's)"""
+    reference = results.get(CALIBRATION_SCENARIO, {}).get('p95_ms')
+    for current in results.values():
+        current['p95_relative'] = current['p95_ms'] / reference if reference else None
+
+
+def baseline_from(results: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """The hardware-independent part of a run, as stored in benchmarks/baseline.json"""
+    return {
+        name: {key: current[key] for key in ('queries_per_request', 'p95_relative')}
+        for name, current in results.items()
+    }
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        tolerance: float) -> Tuple[List[str], List[str]]:
+    """
+    (regressions, warnings) against the stored baseline. Errors and queries per request
+    are deterministic and fail the run; relative latency drifting past `tolerance` is only
+    reported, since timings stay noisy even after calibration.
+    """
+    regressions, warnings = [], []
+    for name, current in results.items():
+        if current['errors']:
+            regressions.append(f"{name}: {current['errors']} failed request(s)")
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['queries_per_request'] > previous['queries_per_request'] + 0.5:
+            regressions.append(
+                f"{name}: queries/request {current['queries_per_request']:.1f} > {previous['queries_per_request']:.1f}")
+        if current.get('p95_relative') and previous.get('p95_relative') \
+                and current['p95_relative'] > previous['p95_relative'] * (1 + tolerance):
+            warnings.append(
+                f"{name}: p95 is {current['p95_relative']:.2f}x the {CALIBRATION_SCENARIO} scenario's, "
+                f"baseline {previous['p95_relative']:.2f}x")
+    return regressions, warnings
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+REPLICA_ALIAS = 'replica'
+
+# Alias used for reads in the current request; None means the default (primary) database
+_read_alias: ContextVar[Optional[str]] = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def use_replica_for_reads(alias: str = REPLICA_ALIAS):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only inside use_replica_for_reads(), which
+    ReplicaRoutingMiddleware enters for safe requests from clients that have not
+    written recently. Writes, workers and management commands always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,223 @@
+"""
+Background deletion of chat threads and user accounts.
+
+Deleting through the ORM makes Django's collector load every dependent row and fire
+per-object signals, holding locks for as long as that takes. Here the request hides
+the target immediately (thread.deleted_at / user.is_active) and queues a
+DeletionRequest; the worker then removes dependents in bounded batches of raw
+`DELETE ... WHERE id IN (...)`, each in its own short transaction, and finally
+deletes the now-childless row through the ORM. Every step is idempotent, so a
+request interrupted part-way simply resumes. Stored images of deleted jobs are
+recorded as OrphanedBlob rows and removed from storage by a separate sweep.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .image_storage import stored_image_name
+from .models import (
+    ArchivedChatMessage, ArchivedImageJob, ChatMessage, ChatThread, DeletionRequest, ImageJob,
+    ImageUsageRollup, OrphanedBlob, OutboundEmail, PasswordResetToken, PaymentTransaction, RevenueRollup,
+)
+from .retention import COLD_PREFIX, cold_storage
+
+logger = logging.getLogger(__name__)
+
+
+def request_thread_deletion(thread: ChatThread) -> DeletionRequest:
+    with transaction.atomic():
+        ChatThread.objects.filter(pk=thread.pk).update(deleted_at=timezone.now())
+        request, _ = DeletionRequest.objects.get_or_create(
+            target='thread', object_id=thread.pk, status__in=['pending', 'running'],
+            defaults={'status': 'pending'},
+        )
+    return request
+
+
+def request_user_deletion(user: User) -> DeletionRequest:
+    with transaction.atomic():
+        # Deactivation blocks new logins and token use until the account is gone
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        request, _ = DeletionRequest.objects.get_or_create(
+            target='user', object_id=user.pk, status__in=['pending', 'running'],
+            defaults={'status': 'pending'},
+        )
+    return request
+
+
+def blob_refs(values: Iterable) -> List[Tuple[str, str]]:
+    """(storage, name) for the stored images among a job's image values"""
+    refs = []
+    for value in values or []:
+        if not isinstance(value, str):
+            continue
+        if value.startswith(COLD_PREFIX):
+            refs.append(('cold', value[len(COLD_PREFIX):]))
+        else:
+            name = stored_image_name(value)
+            if name is not None:
+                refs.append(('default', name))
+    return refs
+
+
+class _Batcher:
+    """Runs one DeletionRequest's batches, counting rows and keeping its heartbeat fresh"""
+
+    def __init__(self, deletion: DeletionRequest, batch_size: int):
+        self.deletion = deletion
+        self.batch_size = batch_size
+
+    def _record(self, table: str, count: int):
+        counts = self.deletion.rows_deleted
+        counts[table] = counts.get(table, 0) + count
+        DeletionRequest.objects.filter(pk=self.deletion.pk).update(rows_deleted=counts, updated_at=timezone.now())
+        if settings.DELETION['PAUSE']:
+            # Give replicas and competing writers room between batches
+            time.sleep(settings.DELETION['PAUSE'])
+
+    def delete(self, queryset, on_batch: Optional[Callable[[List[int]], None]] = None) -> int:
+        """Delete the queryset's rows batch by batch with raw DELETEs; `on_batch` runs in each batch's transaction"""
+        model = queryset.model
+        table = model._meta.db_table
+        qn = connection.ops.quote_name
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.order_by().values_list('pk', flat=True)[:self.batch_size])
+                if not ids:
+                    return total
+                if on_batch is not None:
+                    on_batch(ids)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {qn(table)} WHERE {qn(model._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+                        ids,
+                    )
+            total += len(ids)
+            self._record(table, len(ids))
+
+    def detach_jobs(self, thread_ids) -> int:
+        """ImageJob.thread is SET_NULL: unlink jobs from the threads being deleted, in batches"""
+        qn = connection.ops.quote_name
+        table = qn(ImageJob._meta.db_table)
+        jobs = ImageJob.objects.filter(thread_id__in=thread_ids).order_by()
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(jobs.values_list('id', flat=True)[:self.batch_size])
+                if not ids:
+                    return total
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET thread_id = NULL WHERE id IN ({', '.join(['%s'] * len(ids))})", ids,
+                    )
+            total += len(ids)
+            self._record(f"{ImageJob._meta.db_table}.thread", len(ids))
+
+
+def _orphan_job_blobs(model):
+    def on_batch(ids):
+        blobs = []
+        for inputs, outputs in model.objects.filter(pk__in=ids).values_list('input_images', 'output_images'):
+            blobs += [OrphanedBlob(storage=storage, name=name) for storage, name in blob_refs(inputs + outputs)]
+        OrphanedBlob.objects.bulk_create(blobs)
+    return on_batch
+
+
+def delete_thread(batcher: _Batcher, thread_id: int):
+    batcher.detach_jobs([thread_id])
+    batcher.delete(ChatMessage.objects.filter(thread_id=thread_id))
+    batcher.delete(ArchivedChatMessage.objects.filter(thread_id=thread_id))
+    # Nothing references the thread any more, so the collector has nothing to load
+    ChatThread.objects.filter(pk=thread_id).delete()
+
+
+def delete_user(batcher: _Batcher, user_id: int):
+    batcher.delete(ImageJob.objects.filter(user_id=user_id), on_batch=_orphan_job_blobs(ImageJob))
+    batcher.delete(ArchivedImageJob.objects.filter(user_id=user_id), on_batch=_orphan_job_blobs(ArchivedImageJob))
+    threads = ChatThread.objects.filter(user_id=user_id)
+    # Other users' jobs could still point at these threads
+    batcher.detach_jobs(threads.values('pk'))
+    batcher.delete(ChatMessage.objects.filter(thread__in=threads.values('pk')))
+    batcher.delete(ArchivedChatMessage.objects.filter(thread__in=threads.values('pk')))
+    batcher.delete(threads)
+    for model in (PaymentTransaction, ImageUsageRollup, RevenueRollup, PasswordResetToken):
+        batcher.delete(model.objects.filter(user_id=user_id))
+    # The outbox has no user link, only the address; keep mail for another account sharing it
+    email = User.objects.filter(pk=user_id).values_list('email', flat=True).first()
+    if email and not User.objects.filter(email__iexact=email).exclude(pk=user_id).exists():
+        batcher.delete(OutboundEmail.objects.filter(to_email__iexact=email))
+    # Profile, social accounts, tokens: a handful of rows the collector can take
+    User.objects.filter(pk=user_id).delete()
+
+
+HANDLERS = {
+    'thread': delete_thread,
+    'user': delete_user,
+}
+
+
+def _claim() -> Optional[DeletionRequest]:
+    stale = timezone.now() - timedelta(seconds=settings.DELETION['STALE_AFTER'])
+    with transaction.atomic():
+        due = DeletionRequest.objects.filter(
+            Q(status='pending') | Q(status='running', updated_at__lt=stale),
+        ).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        deletion = due.first()
+        if deletion is None:
+            return None
+        deletion.status = 'running'
+        deletion.attempts += 1
+        deletion.save(update_fields=['status', 'attempts', 'updated_at'])
+    return deletion
+
+
+def process_deletion_requests(batch_size: int = None, limit: int = None) -> Tuple[int, int]:
+    """Work through queued requests; returns (completed, failed)"""
+    batch_size = batch_size or settings.DELETION['BATCH_SIZE']
+    completed = failed = 0
+    while limit is None or completed + failed < limit:
+        deletion = _claim()
+        if deletion is None:
+            break
+        try:
+            HANDLERS[deletion.target](_Batcher(deletion, batch_size), deletion.object_id)
+        except Exception as e:
+            logger.exception(f"Deletion of {deletion.target} {deletion.object_id} failed")
+            status = 'failed' if deletion.attempts >= settings.DELETION['MAX_ATTEMPTS'] else 'pending'
+            DeletionRequest.objects.filter(pk=deletion.pk).update(status=status, last_error=str(e))
+            failed += 1
+            continue
+        DeletionRequest.objects.filter(pk=deletion.pk).update(
+            status='completed', completed_at=timezone.now(), last_error='',
+        )
+        logger.info(f"Deleted {deletion.target} {deletion.object_id}")
+        completed += 1
+    return completed, failed
+
+
+def delete_orphaned_blobs(batch_size: int = None) -> int:
+    """Remove stored files of deleted jobs; returns how many were handled"""
+    batch_size = batch_size or settings.DELETION['BATCH_SIZE']
+    storages = {'default': default_storage, 'cold': cold_storage()}
+    handled = 0
+    while True:
+        blobs = list(OrphanedBlob.objects.order_by('id')[:batch_size])
+        if not blobs:
+            return handled
+        for blob in blobs:
+            try:
+                storages[blob.storage].delete(blob.name)
+            except OSError as e:
+                logger.warning(f"Could not delete {blob}: {e}")
+        OrphanedBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+        handled += len(blobs)
@@ -0,0 +1,114 @@
+import logging
+from datetime import timedelta
+from typing import List, Tuple
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(to_email: str, subject: str, body: str, from_email: str = None) -> OutboundEmail:
+    """Store an email in the outbox; it is delivered later by the outbox worker"""
+    return OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff between delivery attempts, capped at EMAIL_OUTBOX_MAX_RETRY_DELAY"""
+    seconds = settings.EMAIL_OUTBOX_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_MAX_RETRY_DELAY))
+
+
+def _claim(batch_size: int) -> List[OutboundEmail]:
+    """
+    Mark due emails as `sending` and commit, so no transaction (or row lock) is held
+    while talking to the SMTP server. Each row is claimed with a conditional UPDATE,
+    which keeps two workers from taking the same email even without SKIP LOCKED (SQLite).
+    `next_attempt_at` doubles as the claim's lease: a worker that dies mid-send leaves
+    the email to be reclaimed once EMAIL_OUTBOX_SEND_LEASE has passed.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_SEND_LEASE)
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            status__in=['pending', 'sending'], next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        emails = []
+        for email in due[:batch_size]:
+            claimed = OutboundEmail.objects.filter(
+                pk=email.pk, status=email.status, next_attempt_at=email.next_attempt_at,
+            ).update(status='sending', next_attempt_at=lease_until)
+            if claimed:
+                email.status, email.next_attempt_at = 'sending', lease_until
+                emails.append(email)
+    return emails
+
+
+def send_pending_emails(batch_size: int = None) -> Tuple[int, int]:
+    """
+    Deliver due outbox emails over a single SMTP connection.
+    Returns a (sent, failed) tuple for the processed batch.
+    """
+    emails = _claim(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    sent = failed = 0
+
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+    except Exception as e:
+        # SMTP is down: push the whole batch back without burning attempts per message,
+        # so an outage cannot exhaust EMAIL_OUTBOX_MAX_ATTEMPTS
+        logger.warning(f"Email outbox could not connect: {e}")
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails], status='sending').update(
+            status='pending',
+            next_attempt_at=timezone.now() + retry_delay(1),
+            last_error=str(e),
+        )
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=[email.to_email],
+                connection=mail_connection,
+            )
+            try:
+                mail_connection.send_messages([message])
+            except Exception as e:
+                logger.warning(f"Email outbox delivery to {email.to_email} failed: {e}")
+                _record_failure(email, e)
+                failed += 1
+                continue
+
+            email.status = 'sent'
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+            sent += 1
+    finally:
+        mail_connection.close()
+
+    return sent, failed
+
+
+def _record_failure(email: OutboundEmail, error: Exception) -> None:
+    email.attempts += 1
+    email.last_error = str(error)
+    email.status = 'failed' if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS else 'pending'
+    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,50 @@
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+from .exports import InvalidCursor, ndjson_stream, parse_cursor, zip_stream
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'zip': 'application/zip',
+}
+
+
+@extend_schema(
+    tags=['User'],
+    summary='Export your history',
+    description=(
+        'Streams threads, messages, image jobs and images. `ndjson` emits one record per line, each '
+        'with a `cursor`; pass the last one received as `?cursor=` to resume an interrupted download. '
+        '`zip` bundles per-section NDJSON files with the image files.'
+    ),
+    parameters=[
+        OpenApiParameter('output', str, enum=list(CONTENT_TYPES), description='Export format (default: ndjson)'),
+        OpenApiParameter('cursor', str, description='Resume an NDJSON export after this record'),
+    ],
+    responses={200: OpenApiResponse(OpenApiTypes.BINARY, description='NDJSON or zip stream')},
+)
+class HistoryExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in CONTENT_TYPES:
+            raise ValidationError({'output': f"Must be one of: {', '.join(CONTENT_TYPES)}."})
+        cursor = request.query_params.get('cursor')
+        if cursor and output != 'ndjson':
+            raise ValidationError({'cursor': 'Only NDJSON exports can be resumed.'})
+        try:
+            parse_cursor(cursor)
+        except InvalidCursor as exc:
+            raise ValidationError({'cursor': str(exc)})
+
+        stream = ndjson_stream(request.user, cursor) if output == 'ndjson' else zip_stream(request.user)
+        response = StreamingHttpResponse(stream, content_type=CONTENT_TYPES[output])
+        filename = f"rupixai-export-{request.user.username}-{timezone.now():%Y%m%d}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
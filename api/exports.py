@@ -0,0 +1,215 @@
+"""
+Streaming export of a user's history (threads, messages, image jobs and images).
+
+Rows are read with keyset-ordered `.iterator(chunk_size=...)` queries and written out
+as they arrive, so memory stays flat however large the account is:
+- NDJSON: one `{"type", "cursor", "data"}` object per line. Passing the last cursor
+  received resumes an interrupted export right after that record.
+- zip: one NDJSON file per section plus the image files, written through a streaming
+  zip writer (data descriptors, no seeking) and a manifest.
+"""
+import base64
+import binascii
+import os
+import zipfile
+from io import BytesIO
+from typing import Iterator, Optional, Tuple
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .image_storage import stored_image_name
+from .models import ArchivedChatMessage, ArchivedImageJob, ChatMessage, ChatThread, ImageJob
+from .renderers import dumps
+from .retention import COLD_PREFIX, cold_storage, expand_cold_refs, is_inline_payload, sniff_mime
+
+# Stream chunks are flushed once they reach this size
+FLUSH_BYTES = 64 * 1024
+
+JOB_FIELDS = (
+    'thread', 'provider', 'model', 'prompt', 'num_images', 'input_images', 'output_images',
+    'status', 'credits_spent', 'created_at', 'completed_at',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _sections(user):
+    """(name, queryset, key field, output field -> column) in export order"""
+    job_columns = {'id': 'id', **{field: field for field in JOB_FIELDS}}
+    threads = ChatThread.objects.live().filter(user=user).values('pk')
+    return (
+        ('threads', ChatThread.objects.live().filter(user=user), 'id',
+         {'id': 'id', 'title': 'title', 'created_at': 'created_at', 'updated_at': 'updated_at'}),
+        ('archived_messages', ArchivedChatMessage.objects.filter(thread__in=threads), 'original_id',
+         {'id': 'original_id', 'thread': 'thread_id', 'role': 'role', 'content': 'content', 'created_at': 'created_at'}),
+        ('messages', ChatMessage.objects.filter(thread__in=threads), 'id',
+         {'id': 'id', 'thread': 'thread_id', 'role': 'role', 'content': 'content', 'created_at': 'created_at'}),
+        ('archived_image_jobs', ArchivedImageJob.objects.filter(user=user), 'original_id',
+         {**job_columns, 'id': 'original_id', 'thread': 'thread_id'}),
+        ('image_jobs', ImageJob.objects.filter(user=user), 'id', job_columns),
+    )
+
+
+SECTION_NAMES = ('threads', 'archived_messages', 'messages', 'archived_image_jobs', 'image_jobs')
+JOB_SECTIONS = ('archived_image_jobs', 'image_jobs')
+
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    """(section index, last key) from a `section:key` cursor; (0, 0) starts from the top"""
+    if not cursor:
+        return 0, 0
+    section, _, key = cursor.partition(':')
+    if section not in SECTION_NAMES or not key.isdigit():
+        raise InvalidCursor(f"Invalid export cursor: {cursor!r}")
+    return SECTION_NAMES.index(section), int(key)
+
+
+def iter_records(user, cursor: str = None) -> Iterator[Tuple[str, str, dict]]:
+    """(section, cursor, record) for every row after `cursor`, in a stable order"""
+    start, after = parse_cursor(cursor)
+    for index, (name, queryset, key, columns) in enumerate(_sections(user)):
+        if index < start:
+            continue
+        if index == start and after:
+            queryset = queryset.filter(**{f"{key}__gt": after})
+        chunk_size = settings.EXPORT['JOB_CHUNK_SIZE'] if name in JOB_SECTIONS else settings.EXPORT['CHUNK_SIZE']
+        rows = queryset.order_by(key).values_list(*columns.values()).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = dict(zip(columns, row))
+            yield name, f"{name}:{record['id']}", record
+
+
+def ndjson_stream(user, cursor: str = None) -> Iterator[bytes]:
+    """NDJSON lines in ~FLUSH_BYTES chunks, ending with a `{"type": "end"}` line"""
+    counts = dict.fromkeys(SECTION_NAMES, 0)
+    buffer = []
+    size = 0
+    for section, position, record in iter_records(user, cursor):
+        if section in JOB_SECTIONS:
+            # Cold payloads become signed links; the zip export carries the bytes instead
+            record['input_images'] = expand_cold_refs(record['input_images'])
+            record['output_images'] = expand_cold_refs(record['output_images'])
+        line = dumps({'type': section, 'cursor': position, 'data': record}) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        counts[section] += 1
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(dumps({'type': 'end', 'counts': counts, 'exported_at': timezone.now()}) + b'\n')
+    yield b''.join(buffer)
+
+
+class _StreamBuffer:
+    """Write-only file for ZipFile whose contents are drained into the response as it fills"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def _image_extension(value: str) -> str:
+    if value.startswith('data:'):
+        mime_type = value[5:].split(';')[0].split(',')[0]
+    elif value.startswith(COLD_PREFIX):
+        return os.path.splitext(value)[1]
+    else:
+        name = stored_image_name(value)
+        if name is not None:
+            return os.path.splitext(name)[1]
+        try:
+            mime_type = sniff_mime(base64.b64decode(value[:16]))
+        except (binascii.Error, ValueError):
+            mime_type = None
+    return {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp', 'image/gif': '.gif'}.get(mime_type, '.bin')
+
+
+def _is_exportable(value) -> bool:
+    """Payloads whose bytes we hold; links to third-party hosts are exported as links"""
+    return isinstance(value, str) and (
+        is_inline_payload(value) or value.startswith(COLD_PREFIX) or stored_image_name(value) is not None
+    )
+
+
+def _image_path(job_id: int, kind: str, index: int, value: str) -> str:
+    return f"images/{job_id}-{kind}-{index}{_image_extension(value)}"
+
+
+def _open_image(value: str):
+    """Readable binary file for an exportable image value"""
+    if value.startswith(COLD_PREFIX):
+        return cold_storage().open(value[len(COLD_PREFIX):], 'rb')
+    name = stored_image_name(value)
+    if name is not None:
+        return default_storage.open(name, 'rb')
+    return BytesIO(base64.b64decode(value.partition(',')[2] if value.startswith('data:') else value))
+
+
+def _job_images(record):
+    for kind in ('input', 'output'):
+        for index, value in enumerate(record[f"{kind}_images"] or []):
+            yield kind, index, value
+
+
+def zip_stream(user) -> Iterator[bytes]:
+    """A zip archive of the whole history, yielded in ~FLUSH_BYTES chunks"""
+    buffer = _StreamBuffer()
+    counts = dict.fromkeys(SECTION_NAMES, 0)
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        current, entry = None, None
+        for section, _, record in iter_records(user):
+            if section != current:
+                if entry is not None:
+                    entry.close()
+                current, entry = section, archive.open(f"{section}.ndjson", 'w', force_zip64=True)
+            if section in JOB_SECTIONS:
+                for kind, index, value in _job_images(record):
+                    if _is_exportable(value):
+                        record[f"{kind}_images"][index] = _image_path(record['id'], kind, index, value)
+            entry.write(dumps(record) + b'\n')
+            counts[section] += 1
+            if buffer.size >= FLUSH_BYTES:
+                yield buffer.drain()
+        if entry is not None:
+            entry.close()
+
+        # Only one zip entry can be open for writing, so image files follow in a second pass
+        missing = []
+        for section, _, record in iter_records(user, cursor=f"{JOB_SECTIONS[0]}:0"):
+            for kind, index, value in _job_images(record):
+                if not _is_exportable(value):
+                    continue
+                path = _image_path(record['id'], kind, index, value)
+                try:
+                    source = _open_image(value)
+                except (OSError, binascii.Error, ValueError):
+                    missing.append(path)
+                    continue
+                with source, archive.open(path, 'w', force_zip64=True) as target:
+                    while chunk := source.read(FLUSH_BYTES):
+                        target.write(chunk)
+                        if buffer.size >= FLUSH_BYTES:
+                            yield buffer.drain()
+                if buffer.size >= FLUSH_BYTES:
+                    yield buffer.drain()
+
+        manifest = {
+            'user': user.username, 'exported_at': timezone.now(), 'counts': counts, 'missing_images': missing,
+        }
+        archive.writestr('manifest.json', dumps(manifest, indent=2))
+    yield buffer.drain()
@@ -0,0 +1,32 @@
+"""
+Conditional GET helpers: views derive a weak ETag and Last-Modified from cheap
+timestamp columns and answer 304 before anything is serialized.
+"""
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .schema_cache import code_version
+
+
+def make_etag(*parts) -> str:
+    # The code version is included so a deploy that changes a serializer invalidates cached bodies
+    digest = hashlib.sha1(repr((code_version(),) + parts).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag: str, last_modified=None):
+    """A 304 response when the client's validators still match, otherwise None"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag: str, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: let the client revalidate, but keep shared caches out
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from .deletion import blob_refs
+from .image_preprocessing import prepare_images
+from .metrics import Counter
+from .models import ImageJob, OrphanedBlob
+from .provider_routing import AUTO_PROVIDER, router
+from .services import select_service
+
+logger = logging.getLogger(__name__)
+
+HEDGES = Counter('rupixai_provider_hedges_total', 'Hedged provider requests, by outcome', ('outcome',))
+
+# Provider calls run here when hedging so a slow call can be raced against a backup
+_hedge_pool = ThreadPoolExecutor(max_workers=settings.IMAGE_HEDGING['MAX_WORKERS'], thread_name_prefix='hedge')
+
+# Fan-out for providers that return fewer images per call than a job asks for
+_fanout_pool = ThreadPoolExecutor(max_workers=settings.IMAGE_FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+
+ServiceChoice = Tuple[str, object]  # (provider name, service instance)
+
+
+def generate_batch(service, prompt: str, input_images, n: int) -> List[str]:
+    """
+    Produce `n` images: one provider call when the service's max_batch allows it,
+    otherwise parallel calls of at most max_batch images each. Partial results are
+    returned if some calls fail; the first error is raised only if all of them fail.
+    """
+    max_batch = max(getattr(service, 'max_batch', 1), 1)
+    sizes = [min(max_batch, n - start) for start in range(0, n, max_batch)]
+
+    def call(size: int) -> List[str]:
+        if size == 1:
+            return service.generate(prompt, input_images)
+        return service.generate(prompt, input_images, n=size)
+
+    if len(sizes) == 1:
+        return call(sizes[0])
+
+    images: List[str] = []
+    first_error = None
+    for future in [_fanout_pool.submit(call, size) for size in sizes]:
+        try:
+            images.extend(future.result())
+        except Exception as e:
+            logger.warning(f"Image batch call failed: {e}")
+            first_error = first_error or e
+    if not images and first_error:
+        raise first_error
+    return images
+
+
+def _call_provider(provider: str, service, job: ImageJob) -> List[str]:
+    # Inputs are decoded, resized and re-encoded per provider before its clock starts
+    input_images = prepare_images(job.input_images, getattr(service, 'max_input_side', None)) if job.input_images else None
+    start = time.perf_counter()
+    try:
+        images = generate_batch(service, job.prompt, input_images, job.num_images)
+    except Exception:
+        router.record(provider, service.model, time.perf_counter() - start, ok=False)
+        raise
+    router.record(provider, service.model, time.perf_counter() - start, ok=True)
+    return images
+
+
+def _configured_services(exclude: Optional[Tuple[str, str]] = None, provider: Optional[str] = None) -> Iterator[ServiceChoice]:
+    """Router candidates in preference order (optionally of one provider), skipping ones this deployment can't construct"""
+    for candidate in router.rank():
+        if (candidate.provider, candidate.model) == exclude:
+            continue
+        if provider is not None and candidate.provider != provider:
+            continue
+        try:
+            service = select_service(candidate.provider)
+        except Exception as e:
+            # Provider not configured in this deployment (e.g. missing API key)
+            logger.debug(f"Skipping provider {candidate.provider}: {e}")
+            continue
+        service.model = candidate.model
+        yield candidate.provider, service
+
+
+def _take_hedge_budget(user_id) -> bool:
+    """Consume one hedge from the hourly global and per-user budgets"""
+    config = settings.IMAGE_HEDGING
+    hour = int(time.time() // 3600)
+    for key, limit in ((f"hedge:global:{hour}", config['GLOBAL_BUDGET_PER_HOUR']),
+                       (f"hedge:user:{user_id}:{hour}", config['USER_BUDGET_PER_HOUR'])):
+        cache.add(key, 0, 3600)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            used = 1
+        if used > limit:
+            return False
+    return True
+
+
+def _hedge_delay(provider: str, model: str) -> float:
+    config = settings.IMAGE_HEDGING
+    stats = router.stats(provider, model)
+    if len(stats.samples) >= settings.PROVIDER_ROUTING['MIN_SAMPLES']:
+        deadline = stats.percentile(config['PERCENTILE'])
+        if deadline is not None:
+            return max(deadline, config['MIN_DELAY'])
+    return config['DEFAULT_DELAY']
+
+
+def _submit(choice: ServiceChoice, job: ImageJob) -> Tuple[Future, threading.Event]:
+    """Queue a provider call on the hedge pool; the event is set once a worker picks it up"""
+    started = threading.Event()
+
+    def run() -> List[str]:
+        started.set()
+        return _call_provider(choice[0], choice[1], job)
+
+    return _hedge_pool.submit(run), started
+
+
+def _orphan_loser(future: Future) -> None:
+    """
+    Done-callback for an abandoned call: a running HTTP call can't be interrupted, so
+    images it stored once it finishes are handed to delete_orphaned_blobs.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    refs = blob_refs(future.result())
+    if refs:
+        OrphanedBlob.objects.bulk_create([OrphanedBlob(storage=storage, name=name) for storage, name in refs])
+
+
+def _orphan_on_completion(future: Future) -> None:
+    owner = threading.get_ident()
+
+    def callback(done: Future) -> None:
+        try:
+            _orphan_loser(done)
+        except Exception:
+            logger.exception('Could not record the images of an abandoned provider call')
+        finally:
+            # Runs on a pool thread unless the call had already finished; don't keep its connection
+            if threading.get_ident() != owner:
+                connections.close_all()
+
+    future.add_done_callback(callback)
+
+
+def _generate_hedged(job: ImageJob, primary: ServiceChoice, backups: Iterator[ServiceChoice]) -> Tuple[ServiceChoice, List[str]]:
+    """
+    Start the primary call; if it hasn't returned by its percentile deadline, start a
+    backup and take whichever succeeds first. The loser is abandoned and any images
+    it stores are recorded as orphaned.
+    """
+    future, started = _submit(primary, job)
+    futures = {future: primary}
+    # The deadline covers the provider call only, not time spent queued behind a busy pool
+    started.wait()
+    done, _ = wait(futures, timeout=_hedge_delay(primary[0], primary[1].model))
+    if not done:
+        backup = next(backups, None)
+        if backup and _take_hedge_budget(job.user_id):
+            logger.info(f"Hedging job {job.pk}: {primary[0]}/{primary[1].model} -> {backup[0]}/{backup[1].model}")
+            futures[_submit(backup, job)[0]] = backup
+
+    last_error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    if not loser.cancel():
+                        _orphan_on_completion(loser)
+                if len(futures) > 1:
+                    HEDGES.inc(outcome='primary_won' if futures[future] is primary else 'backup_won')
+                return futures[future], future.result()
+            last_error = future.exception()
+    if len(futures) > 1:
+        HEDGES.inc(outcome='both_failed')
+    raise last_error
+
+
+def _generate(job: ImageJob, primary: ServiceChoice, backups: Iterator[ServiceChoice]) -> Tuple[ServiceChoice, List[str]]:
+    if settings.IMAGE_HEDGING['ENABLED']:
+        return _generate_hedged(job, primary, backups)
+    return primary, _call_provider(primary[0], primary[1], job)
+
+
+def generate_images(job: ImageJob) -> List[str]:
+    """
+    Run generation for a job. For provider='auto' the router picks the best provider
+    within budget and fails over to the next candidate on error. With IMAGE_HEDGING
+    enabled, slow calls are raced against a backup: any provider for 'auto' jobs,
+    another model of the same provider for jobs that named one. job.provider and
+    job.model are updated to whichever provider/model actually served the job.
+    """
+    if job.provider != AUTO_PROVIDER:
+        service = select_service(job.provider)
+        primary = (job.provider, service)
+        backups = _configured_services(exclude=(job.provider, service.model), provider=job.provider)
+        (provider, winner), images = _generate(job, primary, backups)
+        if winner is not service:
+            job.model = winner.model
+        return images
+
+    services = _configured_services()
+    primary = next(services, None)
+    last_error = None
+    while primary:
+        try:
+            (provider, winner), images = _generate(job, primary, services)
+            job.provider, job.model = provider, winner.model
+            return images
+        except Exception as e:
+            logger.warning(f"Provider {primary[0]}/{primary[1].model} failed, trying next: {e}")
+            last_error = e
+            primary = next(services, None)
+    raise last_error or ValueError('No image provider available')
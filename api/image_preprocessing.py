@@ -0,0 +1,122 @@
+import base64
+import binascii
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Union
+from django.conf import settings
+from django.core.cache import cache
+
+
+class InvalidInputImage(ValueError):
+    """Raised when an input image cannot be decoded"""
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    digest: str  # sha256 of the original upload
+
+    @property
+    def b64(self) -> str:
+        return base64.b64encode(self.data).decode('ascii')
+
+
+RawImage = Union[bytes, str]
+
+ORIENTATION_TAG = 0x0112
+
+# Decoding and resizing release the GIL, so a small pool keeps request threads free
+_preprocess_pool = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PREPROCESSING['MAX_WORKERS'], thread_name_prefix='imgprep',
+)
+
+
+def decode_input(value: RawImage) -> bytes:
+    """Accept raw bytes, a base64 string or a data: URL"""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if not isinstance(value, str):
+        raise InvalidInputImage("Input images must be base64 strings")
+    if value.startswith('data:'):
+        value = value.partition(',')[2]
+    try:
+        return base64.b64decode(value, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidInputImage(f"Invalid base64 image: {e}")
+
+
+def _has_alpha(image) -> bool:
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        return image.getchannel('A').getextrema()[0] < 255
+    return image.mode == 'P' and 'transparency' in image.info
+
+
+def _process(raw: bytes, digest: str, max_side: int) -> PreparedImage:
+    # Pillow is imported on first use, like the provider SDKs, to keep it out of startup
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    config = settings.IMAGE_PREPROCESSING
+    try:
+        image = Image.open(io.BytesIO(raw))
+        source_format, source_size = image.format, image.size
+        rotated = image.getexif().get(ORIENTATION_TAG, 1) != 1
+        # Let the JPEG decoder skip detail we'd throw away when downscaling
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidInputImage(f"Unsupported image: {e}")
+
+    resized = max(source_size) > max_side
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    # Small, upright images already in a format providers accept are forwarded untouched
+    source_mime = Image.MIME.get(source_format or '')
+    if (not resized and not rotated and source_mime in config['PASSTHROUGH_MIME_TYPES']
+            and len(raw) <= config['PASSTHROUGH_MAX_BYTES']):
+        return PreparedImage(raw, source_mime, image.width, image.height, digest)
+
+    buffer = io.BytesIO()
+    if _has_alpha(image):
+        image.convert('RGBA').save(buffer, format='WEBP', quality=config['QUALITY'], method=4)
+        mime_type = 'image/webp'
+    else:
+        image.convert('RGB').save(buffer, format='JPEG', quality=config['QUALITY'], optimize=True, progressive=True)
+        mime_type = 'image/jpeg'
+    return PreparedImage(buffer.getvalue(), mime_type, image.width, image.height, digest)
+
+
+def _prepare(raw: bytes, digest: str, max_side: int) -> PreparedImage:
+    key = f"imgprep:{digest}:{max_side}:{settings.IMAGE_PREPROCESSING['QUALITY']}"
+    prepared = cache.get(key)
+    if prepared is None:
+        prepared = _process(raw, digest, max_side)
+        cache.set(key, prepared, settings.IMAGE_PREPROCESSING['CACHE_TIMEOUT'])
+    return prepared
+
+
+def prepare_image(value: RawImage, max_side: Optional[int] = None) -> PreparedImage:
+    """
+    Decode, orient, downscale and re-encode one input image. Results are cached by
+    content hash so repeated edits of the same source skip the Pillow work.
+    """
+    raw = decode_input(value)
+    return _prepare(raw, hashlib.sha256(raw).hexdigest(), max_side or settings.IMAGE_PREPROCESSING['MAX_SIDE'])
+
+
+def prepare_images(values: List[RawImage], max_side: Optional[int] = None) -> List[PreparedImage]:
+    """Prepare several inputs in parallel; duplicates within the list are processed once"""
+    max_side = max_side or settings.IMAGE_PREPROCESSING['MAX_SIDE']
+    raws = [decode_input(value) for value in values]
+    digests = [hashlib.sha256(raw).hexdigest() for raw in raws]
+    unique = dict(zip(digests, raws))
+    if len(unique) == 1:
+        results = {digest: _prepare(raw, digest, max_side) for digest, raw in unique.items()}
+    else:
+        futures = {digest: _preprocess_pool.submit(_prepare, raw, digest, max_side) for digest, raw in unique.items()}
+        results = {digest: future.result() for digest, future in futures.items()}
+    return [results[digest] for digest in digests]
@@ -0,0 +1,36 @@
+import mimetypes
+import uuid
+from typing import Optional
+from urllib.parse import urljoin
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+
+def store_image_bytes(data: bytes, mime_type: str = 'image/png') -> str:
+    """
+    Write one generated image to default_storage and return a URL for it.
+    Relative storage URLs are made absolute against BACKEND_URL so clients can tell
+    stored references apart from inline base64 payloads.
+    """
+    extension = mimetypes.guess_extension(mime_type or '') or '.png'
+    name = '%s/%s/%s%s' % (
+        settings.GENERATED_IMAGES_DIR,
+        timezone.now().strftime('%Y/%m/%d'),
+        uuid.uuid4().hex,
+        extension,
+    )
+    name = default_storage.save(name, ContentFile(data))
+    url = default_storage.url(name)
+    if not url.startswith(('http://', 'https://')):
+        url = urljoin(settings.BACKEND_URL, url)
+    return url
+
+
+def stored_image_name(url: str) -> Optional[str]:
+    """default_storage name behind a URL from store_image_bytes, or None for any other URL"""
+    base = urljoin(settings.BACKEND_URL, default_storage.url(''))
+    if not isinstance(url, str) or not url.startswith(base):
+        return None
+    return url[len(base):] or None
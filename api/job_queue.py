@@ -0,0 +1,288 @@
+"""
+Image job queue with priority classes and fair sharing across users.
+
+With IMAGE_JOB_QUEUE['ASYNC'] the API stores jobs as `pending` and `process_image_jobs`
+workers run them. Every claim:
+- picks the class with the fewest dispatches per unit of WEIGHT over the last
+  FAIR_SHARE_WINDOW seconds (ties go to the higher class), so paying classes jump the
+  line without starving the free tier;
+- within that class, picks the user with the fewest running plus recently started jobs,
+  so one user's backlog of thousands cannot hold back anyone else's first job;
+- skips users already at their class's MAX_IN_FLIGHT.
+All state lives in ImageJob rows (status, priority, started_at), so any number of workers
+can share the queue. The user's Profile row is locked while claiming, which keeps the
+in-flight cap exact across workers.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from .authentication import invalidate_cached_user
+from .deletion import blob_refs
+from .image_pipeline import generate_images
+from .metrics import IMAGE_QUEUE_JOBS, IMAGE_QUEUE_OLDEST_WAIT, IMAGE_QUEUE_WAIT, register_collector
+from .models import ChatMessage, ChatThread, ImageJob, OrphanedBlob, Profile
+from .rollups import record_image_jobs
+
+logger = logging.getLogger(__name__)
+
+WAIT_QUANTILES = (50, 95, 99)
+
+
+def _classes() -> Dict[str, dict]:
+    return settings.IMAGE_JOB_QUEUE['CLASSES']
+
+
+def class_name(priority: str) -> str:
+    """Configured class for a stored priority; jobs queued under a since-removed class rank lowest"""
+    classes = _classes()
+    return priority if priority in classes else list(classes)[-1]
+
+
+def refund_credits(user_id: int, amount: int) -> None:
+    with transaction.atomic():
+        profile = Profile.objects.select_for_update().get(user_id=user_id)
+        profile.credits += amount
+        profile.save(update_fields=['credits'])
+
+
+def _settle(job: ImageJob, **fields) -> bool:
+    """
+    Move a processing job to its final state. False when it already left `processing`
+    (failed by the stale sweep while its worker still ran) or was deleted with its
+    account; the caller must then skip refunds and rollups, which the other path owns.
+    """
+    if not ImageJob.objects.filter(pk=job.pk, status='processing').update(**fields):
+        return False
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return True
+
+
+def _fail_job(job: ImageJob) -> None:
+    refund = job.credits_spent
+    with transaction.atomic():
+        if not _settle(job, status='failed', credits_spent=0):
+            return
+        record_image_jobs([job])
+    refund_credits(job.user_id, refund)
+
+
+def run_image_job(job: ImageJob) -> None:
+    """
+    Generate a claimed job's images and settle credits, rollups and the chat thread.
+    The job ends completed or failed; credits for images not produced are refunded.
+    """
+    cost = job.credits_spent
+    try:
+        images = generate_images(job)
+    except Exception as e:
+        logger.warning(f"Image job {job.pk} failed: {e}")
+        _fail_job(job)
+        return
+
+    # Only charge for images actually produced
+    refund = max(cost - len(images), 0)
+    # The rollup upsert commits with the new status; rebuild_rollups relies on that
+    with transaction.atomic():
+        settled = _settle(
+            job, provider=job.provider, model=job.model, output_images=images, status='completed',
+            completed_at=timezone.now(), credits_spent=cost - refund,
+        )
+        if settled:
+            record_image_jobs([job])
+    if not settled:
+        # Nothing references the images just stored; hand them to delete_orphaned_blobs
+        logger.warning(f"Image job {job.pk} was settled or deleted while it ran; discarding its images")
+        OrphanedBlob.objects.bulk_create(
+            [OrphanedBlob(storage=storage, name=name) for storage, name in blob_refs(images)]
+        )
+        return
+    if refund:
+        refund_credits(job.user_id, refund)
+    Profile.objects.filter(user_id=job.user_id).update(
+        total_images_generated=F('total_images_generated') + len(images),
+    )
+    # .update() skips post_save, which would otherwise drop the cached user and profile
+    invalidate_cached_user(job.user_id)
+
+    # Add message to thread if specified (and not deleted while the job waited)
+    thread = ChatThread.objects.live().filter(pk=job.thread_id).first() if job.thread_id else None
+    if thread is not None:
+        ChatMessage.objects.create(
+            thread=thread,
+            role='user',
+            content=f"Generate image: {job.prompt}"
+        )
+        ChatMessage.objects.create(
+            thread=thread,
+            role='assistant',
+            content=f"Generated {len(images)} image(s) using {job.provider} {job.model}"
+        )
+        thread.touch()
+
+
+def _fair_order() -> Iterator[Tuple[str, int]]:
+    """(stored priority, user id) of every user with claimable work, best candidate first"""
+    classes = _classes()
+    window_start = timezone.now() - timedelta(seconds=settings.IMAGE_JOB_QUEUE['FAIR_SHARE_WINDOW'])
+    in_flight = dict(
+        ImageJob.objects.filter(status='processing')
+        .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count').order_by()
+    )
+    started, class_started = {}, Counter()
+    recent = (
+        ImageJob.objects.filter(started_at__gte=window_start)
+        .values('priority', 'user_id').annotate(count=Count('id')).values_list('priority', 'user_id', 'count')
+        .order_by()
+    )
+    for priority, user_id, count in recent:
+        started[(priority, user_id)] = count
+        class_started[class_name(priority)] += count
+
+    flows = defaultdict(list)
+    pending = (
+        # Deactivated accounts are waiting for deletion; don't spend provider calls on them
+        ImageJob.objects.filter(status='pending', user__is_active=True)
+        .values('priority', 'user_id').annotate(oldest=Min('created_at')).values_list('priority', 'user_id', 'oldest')
+        .order_by()
+    )
+    for priority, user_id, oldest in pending:
+        name = class_name(priority)
+        running = in_flight.get(user_id, 0)
+        if running >= classes[name]['MAX_IN_FLIGHT']:
+            continue
+        flows[name].append((running + started.get((priority, user_id), 0), oldest, priority, user_id))
+
+    rank = {name: index for index, name in enumerate(classes)}
+    for name in sorted(flows, key=lambda name: (class_started[name] / classes[name]['WEIGHT'], rank[name])):
+        for *_, priority, user_id in sorted(flows[name]):
+            yield priority, user_id
+
+
+def claim_next_job() -> Optional[ImageJob]:
+    """Mark the next job to run as processing and return it; None when nothing can start now"""
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    for priority, user_id in _fair_order():
+        with transaction.atomic():
+            # Another worker claiming for this user holds the lock; move on to the next user
+            profile = Profile.objects.select_for_update(skip_locked=skip_locked).filter(user_id=user_id)
+            if not profile.values_list('pk', flat=True).first():
+                continue
+            running = ImageJob.objects.filter(user_id=user_id, status='processing').count()
+            if running >= _classes()[class_name(priority)]['MAX_IN_FLIGHT']:
+                continue
+            job = (
+                ImageJob.objects.filter(status='pending', priority=priority, user_id=user_id)
+                .order_by('created_at', 'id').select_for_update(skip_locked=skip_locked).first()
+            )
+            if job is None:
+                continue
+            job.status = 'processing'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+        return job
+    return None
+
+
+def fail_stale_jobs(batch_size: int = 100) -> int:
+    """Fail and refund jobs left processing past STALE_AFTER, e.g. by a worker that died mid-job"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IMAGE_JOB_QUEUE['STALE_AFTER'])
+    failed = 0
+    while True:
+        with transaction.atomic():
+            stale = ImageJob.objects.filter(status='processing', started_at__lt=cutoff).order_by('started_at')
+            if connection.features.has_select_for_update_skip_locked:
+                stale = stale.select_for_update(skip_locked=True)
+            jobs = list(stale[:batch_size])
+            for job in jobs:
+                logger.warning(f"Image job {job.pk} was processing since {job.started_at}; failing it")
+                _fail_job(job)
+        failed += len(jobs)
+        if len(jobs) < batch_size:
+            return failed
+
+
+def process_image_jobs(limit: int = None) -> Tuple[int, int]:
+    """Run queued jobs until none can start (or `limit` ran); returns (completed, failed)"""
+    completed = failed = 0
+    while limit is None or completed + failed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        try:
+            run_image_job(job)
+        except DatabaseError:
+            logger.exception(f"Could not record the result of image job {job.pk}")
+            failed += 1
+            continue
+        except Exception:
+            # Keep the worker alive; the job is failed and refunded once it goes stale
+            logger.exception(f"Image job {job.pk} crashed while settling")
+            failed += 1
+            continue
+        if job.status == 'completed':
+            completed += 1
+        else:
+            failed += 1
+    return completed, failed
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def queue_snapshot() -> Dict[str, dict]:
+    """
+    Per class: waiting and running jobs, the oldest waiting job's age, and queue-wait
+    percentiles (seconds) of the jobs started within the fair-share window.
+    """
+    now = timezone.now()
+    window = settings.IMAGE_JOB_QUEUE['FAIR_SHARE_WINDOW']
+    snapshot = {
+        name: {'pending': 0, 'in_flight': 0, 'oldest_wait': 0.0, 'started': 0,
+               **{f"wait_p{pct}": None for pct in WAIT_QUANTILES}}
+        for name in _classes()
+    }
+    queued = (
+        ImageJob.objects.filter(status__in=['pending', 'processing'])
+        .values('priority', 'status').annotate(count=Count('id'), oldest=Min('created_at'))
+        .values_list('priority', 'status', 'count', 'oldest').order_by()
+    )
+    for priority, status, count, oldest in queued:
+        stats = snapshot[class_name(priority)]
+        if status == 'pending':
+            stats['pending'] += count
+            stats['oldest_wait'] = max(stats['oldest_wait'], (now - oldest).total_seconds())
+        else:
+            stats['in_flight'] += count
+
+    waits = defaultdict(list)
+    started = ImageJob.objects.filter(started_at__gte=now - timedelta(seconds=window))
+    for priority, created_at, started_at in started.values_list('priority', 'created_at', 'started_at').iterator():
+        waits[class_name(priority)].append((started_at - created_at).total_seconds())
+    for name, values in waits.items():
+        values.sort()
+        snapshot[name]['started'] = len(values)
+        for pct in WAIT_QUANTILES:
+            snapshot[name][f"wait_p{pct}"] = _percentile(values, pct)
+    return snapshot
+
+
+@register_collector
+def collect_queue_metrics():
+    snapshot = queue_snapshot()
+    for metric in (IMAGE_QUEUE_JOBS, IMAGE_QUEUE_OLDEST_WAIT, IMAGE_QUEUE_WAIT):
+        metric.clear()
+    for name, stats in snapshot.items():
+        IMAGE_QUEUE_JOBS.set(stats['pending'], priority_class=name, state='pending')
+        IMAGE_QUEUE_JOBS.set(stats['in_flight'], priority_class=name, state='in_flight')
+        IMAGE_QUEUE_OLDEST_WAIT.set(stats['oldest_wait'], priority_class=name)
+        for pct in WAIT_QUANTILES:
+            if stats[f"wait_p{pct}"] is not None:
+                IMAGE_QUEUE_WAIT.set(stats[f"wait_p{pct}"], priority_class=name, quantile=str(pct / 100))
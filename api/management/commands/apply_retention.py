@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Move old image payloads to cold storage and archive old jobs and messages per plan (run nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows handled per batch (default: RETENTION_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        results = apply_retention(batch_size=options['batch_size'])
+        for plan, counts in results.items():
+            summary = ', '.join(f"{key.replace('_', ' ')}: {value}" for key, value in counts.items())
+            self.stdout.write(f"{plan}: {summary}")
+        self.stdout.write(self.style.SUCCESS('Retention pass complete'))
@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from api import benchmarking
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and benchmark the main API endpoints against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--threads-per-user', type=int, default=5)
+        parser.add_argument('--messages-per-thread', type=int, default=20)
+        parser.add_argument('--jobs-per-user', type=int, default=40)
+        parser.add_argument('--payments-per-user', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=200, help='Requests issued per scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--provider-latency', type=float, default=0.05, help='Seconds slept by fake providers')
+        parser.add_argument('--scenario', action='append', help='Only run the named scenario (repeatable)')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Relative p95 slowdown reported as a warning')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        mirrors = self._mirror_replicas()
+        try:
+            results = self._run(options)
+        finally:
+            self._restore_replicas(mirrors)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        benchmarking.add_relative_latency(results)
+        self._report(results)
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline = benchmarking.baseline_from(results)
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+        elif baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+            regressions, warnings = benchmarking.compare_to_baseline(results, baseline, options['tolerance'])
+            for warning in warnings:
+                self.stdout.write(self.style.WARNING(f"Slower than baseline: {warning}"))
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def _mirror_replicas(self):
+        """Point read replicas (TEST MIRROR = default) at the benchmark database, as the test runner does"""
+        mirrors = {}
+        for alias in connections:
+            test_settings = connections.settings[alias].get('TEST') or {}
+            if alias == DEFAULT_DB_ALIAS or test_settings.get('MIRROR') != DEFAULT_DB_ALIAS:
+                continue
+            connections[alias].close()
+            # Connections are per thread and built from these settings, so the client threads follow too
+            mirrors[alias] = dict(connections.settings[alias])
+            connections.settings[alias].update(connection.settings_dict)
+        return mirrors
+
+    def _restore_replicas(self, mirrors):
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections.settings[alias].clear()
+            connections.settings[alias].update(settings_dict)
+
+    def _run(self, options):
+        self.stdout.write("Seeding benchmark data...")
+        users = benchmarking.seed(
+            users=options['users'],
+            threads_per_user=options['threads_per_user'],
+            messages_per_thread=options['messages_per_thread'],
+            jobs_per_user=options['jobs_per_user'],
+            payments_per_user=options['payments_per_user'],
+        )
+        scenarios = benchmarking.build_scenarios(users)
+        selected = options['scenario'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        results = {}
+        with mock.patch('api.image_pipeline.select_service', benchmarking.fake_select_service(options['provider_latency'])):
+            for name in selected:
+                self.stdout.write(f"Running {name}...")
+                results[name] = benchmarking.run_scenario(
+                    scenarios[name], users, options['requests'], options['concurrency'])
+        return results
+
+    def _report(self, results):
+        header = f"{'scenario':<22}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}{'p95 rel':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<22}{r['requests']:>7}{r['errors']:>8}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}"
+                f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['queries_per_request']:>7.1f}"
+                f"{r['p95_relative'] or 0:>9.2f}"
+            )
@@ -0,0 +1,81 @@
+import base64
+import io
+import os
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from api.models import ImageJob, PaymentTransaction
+from api.payment_serializers import PaymentTransactionSerializer
+from api.renderers import FAST_JSON_ENABLED, FastJSONParser, FastJSONRenderer
+from api.serializers import ImageJobSerializer
+
+
+def image_job_payload(count: int, image_kb: int):
+    now = timezone.now()
+    image = base64.b64encode(os.urandom(image_kb * 1024)).decode()
+    jobs = [
+        ImageJob(
+            id=index, provider='gemini', model='gemini-2.5-flash-image-preview', prompt=f"prompt {index} " * 8,
+            num_images=2, output_images=[image, f"https://cdn.example.com/{index}.png"], status='completed',
+            credits_spent=2, created_at=now - timedelta(minutes=index), completed_at=now,
+        )
+        for index in range(count)
+    ]
+    return ImageJobSerializer(jobs, many=True).data
+
+
+def payment_payload(count: int):
+    now = timezone.now()
+    payments = [
+        PaymentTransaction(
+            id=index, gateway='stripe', transaction_id=f"txn_{index:08d}", amount=Decimal('19.99'),
+            credits_purchased=100, status='completed', created_at=now, completed_at=now,
+            gateway_data={'fee': Decimal('0.59'), 'captured_at': now, 'tags': ['card', 'visa']},
+        )
+        for index in range(count)
+    ]
+    return PaymentTransactionSerializer(payments, many=True).data
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF JSONRenderer/JSONParser with the orjson-backed FastJSONRenderer/FastJSONParser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=50, help='Image jobs per payload')
+        parser.add_argument('--image-kb', type=int, default=256, help='Size of each inline image')
+        parser.add_argument('--payments', type=int, default=500, help='Payment transactions per payload')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def best_ms(self, func, repeat: int) -> float:
+        return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+    def handle(self, *args, **options):
+        if not FAST_JSON_ENABLED:
+            self.stdout.write(self.style.WARNING('orjson is unavailable or FAST_JSON is off; both columns use the stdlib'))
+        payloads = {
+            'image jobs': image_job_payload(options['jobs'], options['image_kb']),
+            'payments': payment_payload(options['payments']),
+        }
+        paths = {'drf': (JSONRenderer(), JSONParser()), 'fast': (FastJSONRenderer(), FastJSONParser())}
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'payload':<12} {'size':>10} {'drf render':>11} {'fast render':>12} "
+                          f"{'drf parse':>10} {'fast parse':>11}  same output")
+        for name, data in payloads.items():
+            rendered = {key: renderer.render(data) for key, (renderer, _) in paths.items()}
+            timings = {}
+            for key, (renderer, parser) in paths.items():
+                body = rendered[key]
+                timings[key] = (
+                    self.best_ms(lambda: renderer.render(data), repeat),
+                    self.best_ms(lambda: parser.parse(io.BytesIO(body)), repeat),
+                )
+            same = JSONParser().parse(io.BytesIO(rendered['drf'])) == JSONParser().parse(io.BytesIO(rendered['fast']))
+            self.stdout.write(
+                f"{name:<12} {len(rendered['drf']) / 1024:>8.0f}KB {timings['drf'][0]:>9.2f}ms {timings['fast'][0]:>10.2f}ms "
+                f"{timings['drf'][1]:>8.2f}ms {timings['fast'][1]:>9.2f}ms  {'yes' if same else 'NO'}"
+            )
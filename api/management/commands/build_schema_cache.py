@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.schema_cache import build_schema, code_version
+
+
+class Command(BaseCommand):
+    help = 'Render the OpenAPI schema for the current code version into SCHEMA_CACHE_DIR (run at deploy time)'
+
+    def handle(self, *args, **options):
+        for fmt in ('yaml', 'json'):
+            entry = build_schema(fmt)
+            self.stdout.write(f"{fmt}: {len(entry.body)} bytes, {len(entry.gzipped)} gzipped, etag {entry.etag}")
+        self.stdout.write(self.style.SUCCESS(f"Schema cache built for code version {code_version()}"))
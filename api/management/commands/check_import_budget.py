@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SCRIPT = "import django, importlib; django.setup(); importlib.import_module(%r)"
+
+
+def parse_importtime(output: str) -> List[Tuple[int, int, str]]:
+    """(self_us, cumulative_us, name) for every line of `python -X importtime` output"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure process startup (django.setup() plus importing the URLconf) with `python -X importtime` '
+        'and fail when it exceeds the budget or imports a module that must stay lazy. Run it in CI.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.ROOT_URLCONF, help='Module imported after django.setup()')
+        parser.add_argument('--budget-ms', type=int, default=settings.IMPORT_TIME_BUDGET_MS)
+        parser.add_argument('--runs', type=int, default=3, help='Fastest of N runs is compared against the budget')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+        best = None
+        for _ in range(max(options['runs'], 1)):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', SCRIPT % options['module']],
+                capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+            )
+            if result.returncode != 0:
+                raise CommandError(f"Import failed:\n{result.stderr[-2000:]}")
+            rows = parse_importtime(result.stderr)
+            # Top-level entries are not indented; their cumulative times add up to the whole run
+            top_level = [row for row in rows if not row[2].startswith('  ')]
+            total_ms = sum(row[1] for row in top_level) / 1000
+            if best is None or total_ms < best[0]:
+                best = (total_ms, rows, top_level)
+
+        total_ms, rows, top_level = best
+        for _, cumulative_us, name in sorted(top_level, key=lambda row: row[1], reverse=True)[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+        loaded = {name.strip() for _, _, name in rows}
+        eager = [module for module in settings.IMPORT_TIME_LAZY_MODULES if module in loaded]
+        self.stdout.write(f"Startup imports: {total_ms:.0f} ms (budget {options['budget_ms']} ms)")
+        if eager:
+            raise CommandError(f"Modules that should load lazily were imported at startup: {', '.join(eager)}")
+        if total_ms > options['budget_ms']:
+            raise CommandError(f"Startup imports took {total_ms:.0f} ms, over the {options['budget_ms']} ms budget")
+        self.stdout.write(self.style.SUCCESS('Import budget OK'))
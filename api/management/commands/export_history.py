@@ -0,0 +1,77 @@
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.exports import ndjson_stream, zip_stream
+from api.renderers import loads
+
+
+def line_start(handle, limit: int) -> int:
+    """Offset just past the last newline before `limit` (0 if there is none), scanning backwards"""
+    position = limit
+    while position > 0:
+        step = min(64 * 1024, position)
+        position -= step
+        handle.seek(position)
+        index = handle.read(step).rfind(b'\n')
+        if index != -1:
+            return position + index + 1
+    return 0
+
+
+def last_cursor(path: str):
+    """
+    Cursor of the last complete record in a partial NDJSON export, after truncating
+    any half-written trailing line. Returns (cursor, finished).
+    """
+    with open(path, 'rb+') as handle:
+        end = line_start(handle, handle.seek(0, os.SEEK_END))
+        handle.truncate(end)
+        if end == 0:
+            return None, False
+        start = line_start(handle, end - 1)
+        handle.seek(start)
+        record = loads(handle.read(end - start))
+    if record.get('type') == 'end':
+        return None, True
+    return record['cursor'], False
+
+
+class Command(BaseCommand):
+    help = (
+        "Export a user's threads, messages, image jobs and images to NDJSON or zip for data-portability "
+        "requests. Memory use is constant; NDJSON exports can be resumed with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', required=True, help='File to write')
+        parser.add_argument('--format', choices=['ndjson', 'zip'], default='ndjson')
+        parser.add_argument('--resume', action='store_true', help='Continue a partial NDJSON export in --output')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+        path = options['output']
+
+        cursor = None
+        mode = 'wb'
+        if options['resume']:
+            if options['format'] != 'ndjson':
+                raise CommandError('Only NDJSON exports can be resumed')
+            if os.path.exists(path):
+                cursor, finished = last_cursor(path)
+                if finished:
+                    self.stdout.write(self.style.SUCCESS(f"{path} is already complete"))
+                    return
+                mode = 'ab'
+                self.stdout.write(f"Resuming after {cursor or 'the start'}")
+
+        stream = ndjson_stream(user, cursor) if options['format'] == 'ndjson' else zip_stream(user)
+        written = 0
+        with open(path, mode) as handle:
+            for chunk in stream:
+                handle.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written / 1024 / 1024:.1f} MB to {path}"))
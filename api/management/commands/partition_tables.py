@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.partitioning import (
+    PARTITIONED_MODELS, PartitioningError, convert_table, ensure_future_partitions, is_partitioned, list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage monthly partitions of the image job and chat message tables (PostgreSQL only). '
+        'Without options, creates upcoming partitions; run it daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Rebuild unpartitioned tables as partitioned tables (locks them; use a maintenance window)')
+        parser.add_argument('--keep-legacy', action='store_true', help='Keep the <table>_legacy copy after --convert')
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future monthly partitions to keep ready')
+        parser.add_argument('--status', action='store_true', help='List partitions and exit')
+
+    def handle(self, *args, **options):
+        try:
+            if options['status']:
+                for model in PARTITIONED_MODELS:
+                    table = model._meta.db_table
+                    partitions = list_partitions(table) if is_partitioned(table) else []
+                    self.stdout.write(f"{table}: {', '.join(partitions) if partitions else 'not partitioned'}")
+                return
+
+            if options['convert']:
+                for model in PARTITIONED_MODELS:
+                    table = model._meta.db_table
+                    if is_partitioned(table):
+                        self.stdout.write(f"{table} is already partitioned")
+                        continue
+                    statements = convert_table(model, options['months_ahead'], keep_legacy=options['keep_legacy'])
+                    self.stdout.write(self.style.SUCCESS(f"Converted {table} ({len(statements)} statements)"))
+
+            for table, created in ensure_future_partitions(options['months_ahead']).items():
+                self.stdout.write(f"{table}: created {len(created)} partition(s) {', '.join(created)}".rstrip())
+        except PartitioningError as e:
+            raise CommandError(str(e))
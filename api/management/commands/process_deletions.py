@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from api.deletion import delete_orphaned_blobs, process_deletion_requests
+
+
+class Command(BaseCommand):
+    help = 'Delete queued threads and accounts in batches, then remove the stored images they left behind'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per DELETE (default: DELETION BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for requests instead of exiting')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds to sleep when there is nothing to do')
+
+    def handle(self, *args, **options):
+        while True:
+            completed, failed = process_deletion_requests(options['batch_size'])
+            blobs = delete_orphaned_blobs(options['batch_size'])
+            if completed or failed or blobs:
+                self.stdout.write(f"Deleted {completed} request(s), {failed} failed, {blobs} stored image(s) removed")
+            if not options['loop']:
+                break
+            if not (completed or failed or blobs):
+                time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api.job_queue import fail_stale_jobs, process_image_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued image jobs by priority class and fair share (IMAGE_JOBS_ASYNC=True)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run at once by this worker (PostgreSQL; SQLite allows one writer)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing can start')
+
+    def handle(self, *args, **options):
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(f"Failed {stale} stale job(s)")
+        if options['concurrency'] <= 1:
+            self.work(options)
+            return
+        with ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix='image-job') as pool:
+            for future in [pool.submit(self.work, options) for _ in range(options['concurrency'])]:
+                future.result()
+
+    def work(self, options):
+        try:
+            while True:
+                completed, failed = process_image_jobs()
+                if completed or failed:
+                    self.stdout.write(f"Ran {completed} job(s), {failed} failed")
+                if not options['loop']:
+                    break
+                if not (completed or failed):
+                    fail_stale_jobs()
+                    time.sleep(options['interval'])
+        finally:
+            # Each thread has its own database connection
+            connections.close_all()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired password reset tokens in bounded batches (run periodically, e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        deleted = PasswordResetToken.objects.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired password reset token(s)"))
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.rollups import rebuild_rollups
+
+
+def parse_date(value: str) -> datetime:
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}; use YYYY-MM-DD")
+    return timezone.make_aware(day, timezone.get_current_timezone())
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute usage and revenue rollups from ImageJob, ArchivedImageJob and PaymentTransaction rows. '
+        'Rollups are maintained incrementally; use this to backfill or to repair a range.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='First day to rebuild, YYYY-MM-DD (default: --days ago)')
+        parser.add_argument('--until', type=parse_date, help='Last day to rebuild, inclusive (default: today)')
+        parser.add_argument('--days', type=int, default=2, help='Days back to rebuild when --since is not given')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = options['since'] or timezone.now() - timedelta(days=options['days'])
+        written = rebuild_rollups(since, options['until'], batch_size=options['batch_size'])
+        summary = ', '.join(f"{table.replace('_', ' ')}: {count} rows" for table, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups since {since:%Y-%m-%d}: {summary}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api.search import SEARCH_COLUMNS, install_search_indexes, missing_search_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Create any missing full-text search indexes. On SQLite this also rebuilds the FTS5 tables, '
+        'which is needed after a migration remade api_imagejob or api_chatmessage and dropped their triggers '
+        '(`migrate` does this automatically when it finds them missing).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        missing = missing_search_indexes(connection)
+        if missing:
+            self.stdout.write(f"Missing search indexes for: {', '.join(missing)}")
+        install_search_indexes(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Search indexes ready on {connection.vendor} for {', '.join(SEARCH_COLUMNS)}"
+        ))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from api.email_services import send_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued transactional emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_pending_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed")
+            if not options['loop']:
+                break
+            if not (sent or failed):
+                time.sleep(options['interval'])
@@ -0,0 +1,197 @@
+"""
+Minimal in-process metrics registry with Prometheus text exposition.
+
+Each worker process keeps its own counters; scrape every worker (or run a single
+worker per container) to get complete numbers.
+"""
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+PROVIDER_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_registry: List['Metric'] = []
+_registry_lock = threading.Lock()
+# Run before each scrape to refresh gauges whose source of truth is elsewhere (e.g. the database)
+_collectors: List[Callable[[], None]] = []
+
+logger = logging.getLogger(__name__)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self) -> None:
+        """Drop every labelled value, so series that no longer exist stop being exported"""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += row[len(self.buckets)]
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def register_collector(func: Callable[[], None]) -> Callable[[], None]:
+    with _registry_lock:
+        _collectors.append(func)
+    return func
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        collectors = list(_collectors)
+        metrics = list(_registry)
+    for collector in collectors:
+        try:
+            collector()
+        except Exception:
+            # A failing source must not take the rest of the scrape down with it
+            logger.exception(f"Metrics collector {collector.__name__} failed")
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'rupixai_http_request_duration_seconds', 'Time spent handling a request, by view',
+    ('view', 'method', 'status'),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'rupixai_http_request_db_queries', 'SQL queries executed per request, by view',
+    ('view',), buckets=COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    'rupixai_http_request_db_duration_seconds', 'Time spent in SQL per request, by view',
+    ('view',),
+)
+IMAGE_QUEUE_JOBS = Gauge(
+    'rupixai_image_queue_jobs', 'Image jobs waiting or running, by priority class',
+    ('priority_class', 'state'),
+)
+IMAGE_QUEUE_OLDEST_WAIT = Gauge(
+    'rupixai_image_queue_oldest_wait_seconds', 'Age of the oldest waiting image job, by priority class',
+    ('priority_class',),
+)
+IMAGE_QUEUE_WAIT = Gauge(
+    'rupixai_image_queue_wait_seconds', 'Queue wait of image jobs started within the fair-share window',
+    ('priority_class', 'quantile'),
+)
+PROVIDER_DURATION = Histogram(
+    'rupixai_provider_request_duration_seconds', 'Latency of image provider calls, by provider and model',
+    ('provider', 'model', 'outcome'), buckets=PROVIDER_BUCKETS,
+)
+
+
+def track_provider_call(provider: str):
+    """Decorator for image service methods; records latency labelled by the service's model"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = func(self, *args, **kwargs)
+                outcome = 'success'
+                return result
+            finally:
+                PROVIDER_DURATION.observe(
+                    time.perf_counter() - start,
+                    provider=provider,
+                    model=getattr(self, 'model', 'unknown'),
+                    outcome=outcome,
+                )
+        return wrapper
+    return decorator
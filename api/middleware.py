@@ -0,0 +1,266 @@
+import cProfile
+import gzip
+import io
+import logging
+import pstats
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from .db_routers import REPLICA_ALIAS, use_replica_for_reads
+from .metrics import REQUEST_DURATION, REQUEST_DB_QUERIES, REQUEST_DB_DURATION
+
+try:
+    import brotli
+except ImportError:  # optional: br is simply not offered
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional: zstd is simply not offered
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_PIN_COOKIE = 'db_primary'
+
+
+class _QueryRecorder:
+    """execute_wrapper that counts queries and accumulates their duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-view latency and SQL query counts/durations, and serves on-demand
+    profiles to staff users that send an `X-Profile: cprofile|pyinstrument` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler = request.META.get(PROFILE_HEADER)
+            if profiler and settings.REQUEST_PROFILING_ENABLED and _is_staff(request):
+                response = self._profile(request, profiler)
+            else:
+                response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        REQUEST_DURATION.observe(duration, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(recorder.count, view=view)
+        REQUEST_DB_DURATION.observe(recorder.duration, view=view)
+        return response
+
+    def _profile(self, request, profiler: str):
+        if profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                return HttpResponse('pyinstrument is not installed', status=501, content_type='text/plain')
+            profile = Profiler()
+            profile.start()
+            try:
+                self.get_response(request)
+            finally:
+                profile.stop()
+            return HttpResponse(profile.output_html(), content_type='text/html')
+
+        profile = cProfile.Profile()
+        response = profile.runcall(self.get_response, request)
+        output = io.StringIO()
+        output.write(f"{request.method} {request.get_full_path()} -> {response.status_code}\n\n")
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(settings.REQUEST_PROFILING_LIMIT)
+        logger.info(f"Profiled {request.method} {request.path} for staff user")
+        return HttpResponse(output.getvalue(), content_type='text/plain')
+
+
+def _is_staff(request) -> bool:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate with JWT inside DRF, after middleware has run
+    from .authentication import CachedJWTAuthentication
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes reads of safe requests to the replica. After any unsafe request the client
+    is pinned to the primary for REPLICA_STICKY_SECONDS so it reads its own writes:
+    browsers through a cookie, token clients through a per-user cache marker.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = REPLICA_ALIAS in settings.DATABASES
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self._pin(request, response)
+            return response
+        if self._is_pinned(request):
+            return self.get_response(request)
+        with use_replica_for_reads():
+            return self.get_response(request)
+
+    def _is_pinned(self, request) -> bool:
+        if request.COOKIES.get(PRIMARY_PIN_COOKIE):
+            return True
+        user_id = _jwt_user_id(request)
+        return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+    def _pin(self, request, response):
+        seconds = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(PRIMARY_PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        # DRF copies the authenticated user onto the underlying request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            cache.set(_pin_key(user.pk), 1, seconds)
+
+
+def _pin_key(user_id) -> str:
+    return f"db:pin:{user_id}"
+
+
+def _jwt_user_id(request):
+    """User id from a valid bearer token, without touching the database"""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from rest_framework_simplejwt.settings import api_settings
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return auth.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except InvalidToken:
+        return None
+
+
+def _accepted_encodings(header: str) -> dict:
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def _compressors() -> dict:
+    """Available encoders in server preference order"""
+    options = settings.COMPRESSION
+    compressors = {}
+    if zstandard is not None:
+        compressors['zstd'] = zstandard.ZstdCompressor(level=options['ZSTD_LEVEL']).compress
+    if brotli is not None:
+        compressors['br'] = lambda data: brotli.compress(data, quality=options['BROTLI_QUALITY'])
+    compressors['gzip'] = lambda data: gzip.compress(data, compresslevel=options['GZIP_LEVEL'], mtime=0)
+    return compressors
+
+
+class CompressionMiddleware:
+    """
+    Compresses API responses with the best encoding the client accepts (zstd, br, then
+    gzip). Only the structured content types in COMPRESSION['CONTENT_TYPES'] are touched;
+    bodies that are already encoded, small, or marked no-transform pass through.
+    Streaming responses are gzipped chunk by chunk rather than buffered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.compressors = _compressors()
+        self.content_types = frozenset(settings.COMPRESSION['CONTENT_TYPES'])
+        self.min_size = settings.COMPRESSION['MIN_SIZE']
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self._negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), response.streaming)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = self.compressors[encoding](response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong validator no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _compressible(self, response) -> bool:
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', '').lower():
+            return False
+        if response.streaming and getattr(response, 'is_async', False):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type in self.content_types or content_type.endswith('+json')
+
+    def _negotiate(self, header: str, streaming: bool):
+        accepted = _accepted_encodings(header)
+        wildcard = accepted.get('*', 0.0)
+        # Streaming bodies can only be compressed incrementally with gzip
+        candidates = ['gzip'] if streaming else list(self.compressors)
+        best, best_q = None, 0.0
+        for encoding in candidates:
+            q = accepted.get(encoding, wildcard)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def retire_duplicate_live_tokens(apps, schema_editor):
+    """Keep only the newest unused token per user so the partial unique constraint can be added"""
+    PasswordResetToken = apps.get_model('api', 'PasswordResetToken')
+    seen_users = set()
+    stale_ids = []
+    live_tokens = PasswordResetToken.objects.filter(used=False).order_by('user_id', '-created_at', '-id')
+    for token_id, user_id in live_tokens.values_list('id', 'user_id').iterator():
+        if user_id in seen_users:
+            stale_ids.append(token_id)
+        else:
+            seen_users.add(user_id)
+    for i in range(0, len(stale_ids), 1000):
+        PasswordResetToken.objects.filter(id__in=stale_ids[i:i + 1000]).update(used=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='passwordresettoken',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['expires_at'], name='reset_token_expires_idx'),
+        ),
+        migrations.RunPython(retire_duplicate_live_tokens, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='passwordresettoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('used', False)), fields=('user',), name='unique_live_reset_token_per_user'),
+        ),
+    ]
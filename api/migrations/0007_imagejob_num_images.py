@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_passwordresettoken_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='num_images',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
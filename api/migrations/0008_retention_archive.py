@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_imagejob_num_images'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('role', models.CharField(max_length=20)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('thread_id', models.BigIntegerField(blank=True, null=True)),
+                ('provider', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt', models.TextField()),
+                ('num_images', models.PositiveSmallIntegerField(default=1)),
+                ('input_images', models.JSONField(blank=True, default=list)),
+                ('output_images', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('credits_spent', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='imagejob',
+            name='storage_tier',
+            field=models.CharField(choices=[('hot', 'Hot'), ('cold', 'Cold')], default='hot', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['storage_tier', 'created_at'], name='imagejob_tier_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedchatmessage',
+            name='thread',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='api.chatthread'),
+        ),
+        migrations.AddField(
+            model_name='archivedimagejob',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_image_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
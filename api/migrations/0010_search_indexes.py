@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from api.search import drop_search_indexes, install_search_indexes
+
+
+def create_indexes(apps, schema_editor):
+    install_search_indexes(schema_editor.connection)
+
+
+def remove_indexes(apps, schema_editor):
+    drop_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_paymenttransaction_updated_at'),
+    ]
+
+    operations = [
+        # Postgres GIN expression indexes or SQLite FTS5 tables, depending on the backend
+        migrations.RunPython(create_indexes, remove_indexes),
+    ]
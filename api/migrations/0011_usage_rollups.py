@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('provider', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('jobs', models.PositiveIntegerField(default=0)),
+                ('failed_jobs', models.PositiveIntegerField(default=0)),
+                ('images', models.PositiveIntegerField(default=0)),
+                ('credits_spent', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket'], name='image_usage_rollup_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'user', 'provider', 'model'), name='unique_image_usage_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('gateway', models.CharField(max_length=50)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('credits_purchased', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket'], name='revenue_rollup_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'user', 'gateway'), name='unique_revenue_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_usage_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['created_at'], name='chatthread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['updated_at'], name='chatthread_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['status', 'created_at'], name='imagejob_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['created_at'], name='payment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_deletion_requests'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='priority',
+            field=models.CharField(default='free', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='imagejob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['status', 'priority', 'user', 'created_at'], name='imagejob_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['started_at'], name='imagejob_started_idx'),
+        ),
+        # On SQLite these AddFields (and their reversal) remake api_imagejob, dropping the FTS5
+        # triggers from 0010; api.signals.reinstall_search_indexes restores them after migrate
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_image_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedimagejob',
+            index=models.Index(fields=['user', 'created_at'], name='archivedjob_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['user', 'created_at'], name='imagejob_user_created_idx'),
+        ),
+    ]
@@ -13,15 +13,41 @@ class Profile(models.Model):
         return f"{self.user.username}'s profile"
 
 
+class ChatThreadQuerySet(models.QuerySet):
+    def live(self):
+        """Threads not scheduled for deletion"""
+        return self.filter(deleted_at__isnull=True)
+
+
 class ChatThread(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_threads')
     title = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)  # Set when a DeletionRequest is queued
+
+    objects = ChatThreadQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='chatthread_created_idx'),
+            models.Index(fields=['updated_at'], name='chatthread_updated_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.user.username})"
 
+    def touch(self):
+        """Bump updated_at after messages change, which feeds the thread's ETag and list ordering"""
+        self.updated_at = timezone.now()
+        ChatThread.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
+
+class ChatMessageQuerySet(models.QuerySet):
+    def for_thread(self, thread):
+        # Messages never predate their thread; the bound lets Postgres skip older monthly partitions
+        return self.filter(thread=thread, created_at__gte=thread.created_at)
+
 
 class ChatMessage(models.Model):
     thread = models.ForeignKey(ChatThread, on_delete=models.CASCADE, related_name='messages')
@@ -29,16 +55,28 @@ class ChatMessage(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ChatMessageQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"{self.role}: {self.content[:50]}..."
 
 
+class ImageJobQuerySet(models.QuerySet):
+    def for_user(self, user, since=None):
+        """A user's jobs; pass `since` so Postgres only scans the matching monthly partitions"""
+        queryset = self.filter(user=user)
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        return queryset
+
+
 class ImageJob(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='image_jobs')
     thread = models.ForeignKey(ChatThread, on_delete=models.SET_NULL, null=True, blank=True)
     provider = models.CharField(max_length=50)  # 'openai', 'gemini'
     model = models.CharField(max_length=100)  # 'dall-e-3', 'gemini-2.5-flash-image-preview'
     prompt = models.TextField()
+    num_images = models.PositiveSmallIntegerField(default=1)
     input_images = models.JSONField(default=list, blank=True)  # List of base64 images
     output_images = models.JSONField(default=list, blank=True)  # List of generated image URLs
     status = models.CharField(max_length=20, choices=[
@@ -50,10 +88,90 @@ class ImageJob(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     credits_spent = models.PositiveIntegerField(default=0)
+    # 'cold' once inline payloads have been moved to cold storage by the retention engine
+    storage_tier = models.CharField(max_length=10, choices=[
+        ('hot', 'Hot'),
+        ('cold', 'Cold')
+    ], default='hot')
+    # Scheduling class from settings.IMAGE_JOB_QUEUE, fixed when the job is queued
+    priority = models.CharField(max_length=20, default='free')
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ImageJobQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"{self.provider} - {self.prompt[:50]}..."
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['storage_tier', 'created_at'], name='imagejob_tier_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='imagejob_status_created_idx'),
+            models.Index(fields=['status', 'priority', 'user', 'created_at'], name='imagejob_queue_idx'),
+            models.Index(fields=['started_at'], name='imagejob_started_idx'),
+            models.Index(fields=['user', 'created_at'], name='imagejob_user_created_idx'),
+        ]
+
+
+# Archive tables: rows moved out of the hot tables by the retention engine
+class ArchivedImageJob(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_image_jobs')
+    thread_id = models.BigIntegerField(null=True, blank=True)
+    provider = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    prompt = models.TextField()
+    num_images = models.PositiveSmallIntegerField(default=1)
+    input_images = models.JSONField(default=list, blank=True)
+    output_images = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    credits_spent = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archivedjob_user_created_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Archived {self.provider} - {self.prompt[:50]}..."
+
+    def as_image_job(self) -> ImageJob:
+        """Unsaved ImageJob carrying the archived values, for read-only serialization"""
+        return ImageJob(
+            id=self.original_id, user_id=self.user_id, thread_id=self.thread_id,
+            provider=self.provider, model=self.model, prompt=self.prompt, num_images=self.num_images,
+            input_images=self.input_images, output_images=self.output_images, status=self.status,
+            created_at=self.created_at, completed_at=self.completed_at,
+            credits_spent=self.credits_spent, storage_tier='cold',
+        )
+
+
+class ArchivedChatMessage(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    thread = models.ForeignKey(ChatThread, on_delete=models.CASCADE, related_name='archived_messages')
+    role = models.CharField(max_length=20)
+    content = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Archived {self.role}: {self.content[:50]}..."
+
+    def as_chat_message(self) -> ChatMessage:
+        return ChatMessage(
+            id=self.original_id, thread_id=self.thread_id, role=self.role,
+            content=self.content, created_at=self.created_at,
+        )
+
+
+class PaymentTransactionQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # auto_now only fires on save(); the payment list ETag is built from updated_at
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
 
 class PaymentTransaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payment_transactions')
@@ -68,27 +186,191 @@ class PaymentTransaction(models.Model):
         ('cancelled', 'Cancelled')
     ], default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     gateway_data = models.JSONField(default=dict, blank=True)  # Store gateway-specific data
 
+    objects = PaymentTransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"{self.gateway} - {self.transaction_id}"
 
 
 # Password Reset Model
+class PasswordResetTokenQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(expires_at__lt=timezone.now())
+
+    def purge_expired(self, batch_size: int = 1000) -> int:
+        """Delete expired tokens in bounded batches; used tokens go once they pass expiry too"""
+        deleted = 0
+        while True:
+            ids = list(self.expired().order_by('expires_at').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += PasswordResetToken.objects.filter(id__in=ids).delete()[0]
+
+
 class PasswordResetToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.UUIDField(default=uuid.uuid4, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     used = models.BooleanField(default=False)
+
+    objects = PasswordResetTokenQuerySet.as_manager()
     
     def is_valid(self):
         return not self.used and timezone.now() < self.expires_at
     
     def mark_as_used(self):
         self.used = True
-        self.save()
+        self.save(update_fields=['used'])
     
     class Meta:
-        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['expires_at'], name='reset_token_expires_idx'),
+        ]
+        constraints = [
+            # At most one live (unused) token per user
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(used=False),
+                name='unique_live_reset_token_per_user',
+            ),
+        ]
+
+
+# Transactional Email Outbox
+class OutboundEmail(models.Model):
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed')
+    ], default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.to_email} - {self.subject} ({self.status})"
+
+
+# Usage and revenue rollups, maintained incrementally by api.rollups
+ROLLUP_GRANULARITIES = [
+    ('hour', 'Hourly'),
+    ('day', 'Daily'),
+]
+
+
+class ImageUsageRollup(models.Model):
+    granularity = models.CharField(max_length=4, choices=ROLLUP_GRANULARITIES)
+    bucket = models.DateTimeField()  # Start of the hour/day (UTC) the jobs were created in
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    provider = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    jobs = models.PositiveIntegerField(default=0)
+    failed_jobs = models.PositiveIntegerField(default=0)
+    images = models.PositiveIntegerField(default=0)
+    credits_spent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'user', 'provider', 'model'], name='unique_image_usage_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket'], name='image_usage_rollup_bucket_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.granularity} {self.bucket:%Y-%m-%d %H:%M} {self.provider}/{self.model}"
+
+
+class RevenueRollup(models.Model):
+    granularity = models.CharField(max_length=4, choices=ROLLUP_GRANULARITIES)
+    bucket = models.DateTimeField()  # Start of the hour/day (UTC) the payments completed in
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    gateway = models.CharField(max_length=50)
+    transactions = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credits_purchased = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'bucket', 'user', 'gateway'], name='unique_revenue_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket'], name='revenue_rollup_bucket_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.granularity} {self.bucket:%Y-%m-%d %H:%M} {self.gateway}"
+
+
+# Background deletion of threads and accounts (api.deletion)
+class DeletionRequest(models.Model):
+    target = models.CharField(max_length=10, choices=[
+        ('thread', 'Chat thread'),
+        ('user', 'User account'),
+    ])
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ], default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    rows_deleted = models.JSONField(default=dict, blank=True)  # Rows removed so far, by table
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Heartbeat while running
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='deletion_request_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['target', 'object_id'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_open_deletion_request',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Delete {self.target} {self.object_id} ({self.status})"
+
+
+class OrphanedBlob(models.Model):
+    """A stored image whose row is gone; removed from storage by delete_orphaned_blobs()"""
+    storage = models.CharField(max_length=10, choices=[
+        ('default', 'Media storage'),
+        ('cold', 'Cold storage'),
+    ])
+    name = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.storage}:{self.name}"
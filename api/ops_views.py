@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .job_queue import queue_snapshot
+from .metrics import render_prometheus
+from .provider_routing import router
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>`, a staff session or DEBUG"""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), expected):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not settings.DEBUG and not getattr(request.user, 'is_staff', False):
+        return HttpResponse('Forbidden: set METRICS_TOKEN to scrape metrics', status=403, content_type='text/plain')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@extend_schema(tags=['Ops'], summary='Provider routing statistics', responses={200: OpenApiResponse(description='Rolling latency, error rate and cost per provider/model')})
+class ProviderRoutingStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(router.snapshot())
+
+
+def database_connection_stats(alias: str) -> dict:
+    connection = connections[alias]
+    pool = getattr(connection, 'pool', None)  # psycopg 3 pool when OPTIONS['pool'] is set
+    stats = {
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'health_checks': connection.settings_dict.get('CONN_HEALTH_CHECKS', False),
+        'pool': pool.get_stats() if pool is not None else None,
+    }
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # `sessions` counts connections ever opened (PG 14+); its growth rate is the churn
+            cursor.execute(
+                "SELECT numbackends, sessions FROM pg_stat_database WHERE datname = current_database()"
+            )
+            backends, sessions = cursor.fetchone()
+        stats['server'] = {'active_backends': backends, 'sessions_total': sessions}
+    return stats
+
+
+@extend_schema(tags=['Ops'], summary='Database connection and pool statistics', responses={200: OpenApiResponse(description='Persistent-connection settings, pool counters and server session totals per database')})
+class DatabasePoolStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({alias: database_connection_stats(alias) for alias in settings.DATABASES})
+
+
+@extend_schema(tags=['Ops'], summary='Image job queue statistics', responses={200: OpenApiResponse(description='Waiting and running jobs, oldest wait and recent wait percentiles per priority class')})
+class ImageQueueStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_snapshot())
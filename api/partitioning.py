@@ -0,0 +1,180 @@
+"""
+Monthly range partitioning of the high-growth tables on PostgreSQL.
+
+Django keeps treating `id` as the primary key; in the database the key becomes
+(id, created_at) because Postgres requires the partition key in every unique
+constraint. Ids stay unique because they come from a single sequence.
+"""
+from datetime import date
+from typing import Dict, List
+from django.db import connection, transaction
+from .models import ImageJob, ChatMessage
+
+PARTITION_KEY = 'created_at'
+
+# Tables partitioned by month, by model
+PARTITIONED_MODELS = (ImageJob, ChatMessage)
+
+
+class PartitioningError(RuntimeError):
+    pass
+
+
+def _check_backend():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError(f"Table partitioning requires PostgreSQL (current backend: {connection.vendor})")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(table: str) -> bool:
+    _check_backend()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table: str) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace ORDER BY c.relname",
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(cursor, table: str, month: date) -> bool:
+    """Create the partition holding `month`; returns False if it already existed"""
+    name = partition_name(table, month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    qn = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+        [month.isoformat(), add_months(month, 1).isoformat()],
+    )
+    return True
+
+
+def ensure_future_partitions(months_ahead: int, today: date = None) -> Dict[str, List[str]]:
+    """Create partitions from the current month through `months_ahead` months from now"""
+    _check_backend()
+    today = month_start(today or date.today())
+    created = {}
+    for model in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        if not is_partitioned(table):
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            created[table] = [
+                partition_name(table, month)
+                for month in (add_months(today, offset) for offset in range(months_ahead + 1))
+                if create_partition(cursor, table, month)
+            ]
+    return created
+
+
+def _index_definitions(cursor, table: str) -> List[str]:
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid "
+        "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisprimary",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _foreign_keys(cursor, table: str) -> List[tuple]:
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _index_names(cursor, table: str) -> List[str]:
+    cursor.execute(
+        "SELECT ic.relname FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert_table(model, months_ahead: int, keep_legacy: bool = False) -> List[str]:
+    """
+    Rebuild a model's table as a monthly partitioned table and copy its rows over.
+    Runs in one transaction and holds an ACCESS EXCLUSIVE lock on the table while
+    rows are copied, so run it in a maintenance window. Returns the statements executed.
+    """
+    _check_backend()
+    table = model._meta.db_table
+    if is_partitioned(table):
+        raise PartitioningError(f"{table} is already partitioned")
+    qn = connection.ops.quote_name
+    legacy = f"{table}_legacy"
+    # Distinct from the legacy identity sequence, which is dropped with the legacy table
+    sequence = f"{table}_pid_seq"
+    executed = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        def run(sql, params=None):
+            executed.append(sql)
+            cursor.execute(sql, params)
+
+        indexes = _index_definitions(cursor, table)
+        foreign_keys = _foreign_keys(cursor, table)
+        cursor.execute(f"SELECT min({qn(PARTITION_KEY)}) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        # Move the old table and its index names out of the way
+        run(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        for index in _index_names(cursor, legacy):
+            run(f"ALTER INDEX {qn(index)} RENAME TO {qn((index + '_legacy')[-63:])}")
+
+        run(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({qn(PARTITION_KEY)})"
+        )
+        # Identity columns are not allowed on partitioned tables before PG 17; use a plain sequence
+        run(f"CREATE SEQUENCE IF NOT EXISTS {qn(sequence)}")
+        run(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        run(f"ALTER SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        run(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(PARTITION_KEY)})")
+
+        first = month_start(oldest.date() if oldest else date.today())
+        last = add_months(month_start(date.today()), months_ahead)
+        month = first
+        while month <= last:
+            if create_partition(cursor, table, month):
+                executed.append(f"-- partition {partition_name(table, month)}")
+            month = add_months(month, 1)
+
+        for definition in indexes:
+            run(definition)
+        for name, definition in foreign_keys:
+            run(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+        run(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        run(f"SELECT setval('{sequence}', COALESCE((SELECT max(id) FROM {qn(table)}), 0) + 1, false)")
+        if not keep_legacy:
+            run(f"DROP TABLE {qn(legacy)}")
+    return executed
@@ -1,6 +1,6 @@
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
 from django.conf import settings
 from rest_framework import status
 from rest_framework.response import Response
@@ -8,12 +8,13 @@ from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from django.contrib.auth.models import User
 from .models import PasswordResetToken
+from .email_services import queue_email
 
 
 @extend_schema(
     tags=['Password Reset'],
     summary='Request password reset',
-    responses={200: OpenApiResponse(description='Password reset email sent')}
+    responses={200: OpenApiResponse(description='Password reset email queued')}
 )
 class ForgotPasswordView(APIView):
     def post(self, request):
@@ -21,41 +22,38 @@ class ForgotPasswordView(APIView):
         if not email:
             return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            user = User.objects.get(email=email)
-            
-            # Create password reset token (expires in 1 hour)
-            token_obj = PasswordResetToken.objects.create(
-                user=user,
-                expires_at=timezone.now() + timezone.timedelta(hours=1)
-            )
+        # The same response is returned whether or not the email exists, and the
+        # email itself is only queued here, so SMTP latency never reaches the client.
+        response_data = {
+            'message': 'If the email exists, a password reset link has been sent'
+        }
+        
+        user = User.objects.filter(email=email).first()
+        if user:
+            try:
+                with transaction.atomic():
+                    # Each user has at most one live token; a new request replaces the old one
+                    PasswordResetToken.objects.filter(user=user, used=False).delete()
+                    # Create password reset token (expires in 1 hour)
+                    token_obj = PasswordResetToken.objects.create(
+                        user=user,
+                        expires_at=timezone.now() + timezone.timedelta(hours=1)
+                    )
+            except IntegrityError:
+                # A concurrent request already issued a live token and queued its email
+                return Response(response_data)
             
-            # Send password reset email
             reset_url = f"{settings.FRONTEND_URL}/auth/reset-password?token={token_obj.token}"
+            queue_email(
+                email,
+                'Password Reset Request',
+                f'Click the link to reset your password: {reset_url}',
+            )
             
-            # In a real application, you would send an actual email
-            # For now, we'll just log it or return the URL for testing
-            print(f"Password reset email for {email}: {reset_url}")
-            
-            # If you have email configured, uncomment this:
-            # send_mail(
-            #     'Password Reset Request',
-            #     f'Click the link to reset your password: {reset_url}',
-            #     settings.DEFAULT_FROM_EMAIL,
-            #     [email],
-            #     fail_silently=False,
-            # )
-            
-            return Response({
-                'message': 'Password reset email sent',
-                'reset_url': reset_url  # Remove this in production
-            })
-            
-        except User.DoesNotExist:
-            # Don't reveal if email exists or not
-            return Response({
-                'message': 'If the email exists, a password reset link has been sent'
-            })
+            if settings.DEBUG:
+                response_data['reset_url'] = reset_url  # Development convenience only
+        
+        return Response(response_data)
 
 
 @extend_schema(
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 import uuid
 import os
+from django.conf import settings
+from django.utils.module_loading import import_string
 
 
 class PaymentService(ABC):
@@ -199,18 +201,25 @@ class BinanceService(PaymentService):
         return {'refund_id': f'refund_{transaction_id}', 'status': 'processed'}
 
 
+# Gateway name -> dotted service class path; classes (and any SDKs they need) load on first use.
+# Deployments can add or override gateways through settings.PAYMENT_GATEWAYS.
+GATEWAYS = {
+    'khalti': 'api.payment_services.KhaltiService',
+    'esewa': 'api.payment_services.ESewaService',
+    'stripe': 'api.payment_services.StripeService',
+    'razorpay': 'api.payment_services.RazorpayService',
+    'binance': 'api.payment_services.BinanceService',
+}
+
+
+def available_gateways() -> List[str]:
+    return sorted({**GATEWAYS, **settings.PAYMENT_GATEWAYS})
+
+
 def get_payment_service(gateway: str) -> PaymentService:
     """Factory function to get the appropriate payment service"""
-    services = {
-        'khalti': KhaltiService,
-        'esewa': ESewaService,
-        'stripe': StripeService,
-        'razorpay': RazorpayService,
-        'binance': BinanceService,
-    }
-    
-    service_class = services.get(gateway.lower())
-    if not service_class:
+    path = {**GATEWAYS, **settings.PAYMENT_GATEWAYS}.get(gateway.lower())
+    if not path:
         raise ValueError(f"Unsupported payment gateway: {gateway}")
     
-    return service_class()
+    return import_string(path)()
@@ -1,5 +1,7 @@
+from typing import Optional
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Count, Max
 from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
@@ -11,7 +13,9 @@ from .payment_serializers import (
     CreatePaymentSerializer,
     VerifyPaymentSerializer,
 )
+from .http_caching import make_etag, not_modified, set_validators
 from .payment_services import get_payment_service
+from .rollups import record_payments
 
 
 @extend_schema(tags=['Payments'], summary='List user payment transactions', responses={200: PaymentTransactionSerializer(many=True)})
@@ -22,6 +26,17 @@ class PaymentTransactionListView(generics.ListAPIView):
     def get_queryset(self):
         return PaymentTransaction.objects.filter(user=self.request.user).order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        # One aggregate query decides whether the list has changed since the client's copy
+        state = PaymentTransaction.objects.filter(user=request.user).aggregate(
+            count=Count('id'), last_modified=Max('updated_at'),
+        )
+        etag = make_etag('payments', request.user.pk, state['count'], state['last_modified'], request.GET.urlencode())
+        cached = not_modified(request, etag, state['last_modified'])
+        if cached is not None:
+            return cached
+        return set_validators(super().list(request, *args, **kwargs), etag, state['last_modified'])
+
 
 @extend_schema(tags=['Payments'], summary='Create payment for credits', responses={201: OpenApiResponse(description='Payment created')})
 class CreatePaymentView(APIView):
@@ -67,6 +82,28 @@ class CreatePaymentView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def complete_payment(payment_transaction: PaymentTransaction, gateway_data: dict) -> Optional[Profile]:
+    """
+    Credit the user and record the payment exactly once. Returns the updated profile, or
+    None when the transaction was already completed (e.g. a redelivered gateway webhook).
+    """
+    with transaction.atomic():
+        # Locking the row serializes webhooks and client verification for the same payment
+        locked = PaymentTransaction.objects.select_for_update().get(pk=payment_transaction.pk)
+        if locked.status == 'completed':
+            return None
+        profile = Profile.objects.select_for_update().get(user_id=locked.user_id)
+        profile.credits += locked.credits_purchased
+        profile.save(update_fields=['credits'])
+
+        payment_transaction.status = 'completed'
+        payment_transaction.completed_at = timezone.now()
+        payment_transaction.gateway_data.update(gateway_data)
+        payment_transaction.save()
+        record_payments([payment_transaction])
+    return profile
+
+
 @extend_schema(tags=['Payments'], summary='Verify payment completion', responses={200: OpenApiResponse(description='Payment verified')})
 class VerifyPaymentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -95,21 +132,15 @@ class VerifyPaymentView(APIView):
             is_verified, verification_data = service.verify_payment(transaction_id, gateway_data)
             
             if is_verified:
-                # Add credits to user
-                with transaction.atomic():
-                    profile = request.user.profile
-                    profile.credits += transaction_obj.credits
-                    profile.save(update_fields=['credits'])
-                    
-                    transaction_obj.status = 'completed'
-                    transaction_obj.completed_at = timezone.now()
-                    transaction_obj.gateway_data.update(verification_data)
-                    transaction_obj.save()
+                # Add credits to user, unless a gateway webhook completed it meanwhile
+                profile = complete_payment(transaction_obj, verification_data)
+                if profile is None:
+                    return Response({'error': 'Transaction already processed'}, status=status.HTTP_400_BAD_REQUEST)
                 
                 return Response({
                     'status': 'completed',
-                    'credits_added': transaction_obj.credits,
-                    'total_credits': request.user.profile.credits
+                    'credits_added': transaction_obj.credits_purchased,
+                    'total_credits': profile.credits
                 })
             else:
                 transaction_obj.status = 'failed'
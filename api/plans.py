@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, QuerySet, Sum
+from .models import PaymentTransaction
+
+# Users who have completed at least one payment are on the paid plan
+FREE = 'free'
+PAID = 'paid'
+PLANS = (FREE, PAID)
+
+
+def _paying_user_ids() -> QuerySet:
+    return PaymentTransaction.objects.filter(status='completed').values('user_id')
+
+
+def get_user_plan(user) -> str:
+    return PAID if _paying_user_ids().filter(user_id=user.pk).exists() else FREE
+
+
+def users_on_plan(plan: str) -> QuerySet:
+    """Subquery-friendly queryset of the users on `plan`"""
+    if plan == PAID:
+        return User.objects.filter(id__in=_paying_user_ids())
+    if plan == FREE:
+        return User.objects.exclude(id__in=_paying_user_ids())
+    raise ValueError(f"Unknown plan: {plan}")
+
+
+def priority_class(user) -> str:
+    """
+    Scheduling class for the user's image jobs: the first of IMAGE_JOB_QUEUE['CLASSES']
+    whose PLAN matches and whose MIN_CREDITS_PURCHASED (lifetime, completed payments) is met.
+    """
+    history = _paying_user_ids().filter(user_id=user.pk).aggregate(
+        payments=Count('id'), credits=Sum('credits_purchased', default=0),
+    )
+    plan = PAID if history['payments'] else FREE
+    for name, options in settings.IMAGE_JOB_QUEUE['CLASSES'].items():
+        if options['PLAN'] == plan and history['credits'] >= options.get('MIN_CREDITS_PURCHASED', 0):
+            return name
+    return FREE
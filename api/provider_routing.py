@@ -0,0 +1,109 @@
+"""
+Latency-aware routing across interchangeable image providers.
+
+Jobs created with provider='auto' are sent to the candidate with the best recent
+latency and error rate among those within the configured cost budget. Statistics are
+kept per process over a rolling window of recent calls.
+"""
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from django.conf import settings
+
+AUTO_PROVIDER = 'auto'
+
+
+@dataclass(frozen=True)
+class Candidate:
+    provider: str
+    model: str
+    cost: float  # USD per image
+
+
+class ProviderStats:
+    """Rolling window of (latency seconds, succeeded) samples for one provider/model"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.samples.append((latency, ok))
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        index = min(int(len(latencies) * pct / 100), len(latencies) - 1)
+        return latencies[index]
+
+
+class ProviderRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], ProviderStats] = {}
+
+    @property
+    def config(self):
+        return settings.PROVIDER_ROUTING
+
+    def candidates(self) -> List[Candidate]:
+        return [Candidate(c['provider'], c['model'], float(c['cost'])) for c in self.config['CANDIDATES']]
+
+    def stats(self, provider: str, model: str) -> ProviderStats:
+        key = (provider, model)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = ProviderStats(self.config['WINDOW'])
+            return self._stats[key]
+
+    def record(self, provider: str, model: str, latency: float, ok: bool) -> None:
+        stats = self.stats(provider, model)
+        with self._lock:
+            stats.record(latency, ok)
+
+    def score(self, candidate: Candidate) -> float:
+        """Lower is better: p95 latency inflated by the error rate. Unexplored candidates go first."""
+        stats = self.stats(candidate.provider, candidate.model)
+        with self._lock:
+            if len(stats.samples) < self.config['MIN_SAMPLES']:
+                return 0.0
+            p95 = stats.percentile(95)
+            error_rate = stats.error_rate
+        if p95 is None:
+            return float('inf')
+        return p95 / max(1.0 - error_rate, 0.05)
+
+    def rank(self, max_cost: Optional[float] = None) -> List[Candidate]:
+        """Candidates within budget ordered best first, falling back to the cheapest if none fit"""
+        max_cost = self.config['COST_BUDGET'] if max_cost is None else max_cost
+        candidates = self.candidates()
+        affordable = [c for c in candidates if max_cost is None or c.cost <= max_cost]
+        if not affordable:
+            affordable = sorted(candidates, key=lambda c: c.cost)[:1]
+        return sorted(affordable, key=lambda c: (self.score(c), c.cost))
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        rows = []
+        for candidate in self.candidates():
+            stats = self.stats(candidate.provider, candidate.model)
+            with self._lock:
+                rows.append({
+                    'provider': candidate.provider,
+                    'model': candidate.model,
+                    'cost': candidate.cost,
+                    'samples': len(stats.samples),
+                    'error_rate': stats.error_rate,
+                    'p50': stats.percentile(50),
+                    'p95': stats.percentile(95),
+                })
+        return rows
+
+
+router = ProviderRouter()
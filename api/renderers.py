@@ -0,0 +1,81 @@
+"""
+orjson-backed JSON rendering and parsing for DRF, with a stdlib fallback.
+
+Output matches rest_framework.renderers.JSONRenderer byte for byte for the data our
+serializers produce: compact UTF-8, U+2028/U+2029 escaped for embedding in <script>,
+and every non-JSON type (datetimes included, so microseconds and the `Z` suffix follow
+DRF) encoded by DRF's own JSONEncoder.default. Known differences on the orjson path:
+
+- NaN and Infinity floats become null, where DRF raises ValueError under STRICT_JSON.
+- Integers outside the 64-bit range raise TypeError instead of being rendered.
+- Dataclasses are serialized natively rather than rejected.
+
+Settings orjson cannot honour (STRICT_JSON, COMPACT_JSON or UNICODE_JSON off, or an
+indent other than 2) make the renderer defer to DRF. COERCE_DECIMAL_TO_STRING acts in
+serializer fields and applies unchanged; raw Decimals outside DecimalField (e.g. in
+gateway_data) become floats on both paths.
+"""
+import json
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib paths below are used instead
+    orjson = None
+
+FAST_JSON_ENABLED = orjson is not None and settings.FAST_JSON
+
+# Types orjson does not handle natively, plus datetimes via OPT_PASSTHROUGH_DATETIME
+_default = JSONEncoder().default
+
+
+def dumps(data, indent=None) -> bytes:
+    if not FAST_JSON_ENABLED:
+        separators = None if indent else (',', ':')
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, indent=indent, separators=separators).encode()
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=option)
+
+
+def loads(data):
+    """Parse bytes or str; raises ValueError (json.JSONDecodeError) on invalid input"""
+    if FAST_JSON_ENABLED:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not (FAST_JSON_ENABLED and self._orjson_matches(indent)):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = dumps(data, indent=indent)
+        # Same JavaScript-safe escaping as DRF; the scan is skipped for the common case
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+    def _orjson_matches(self, indent) -> bool:
+        """orjson writes UTF-8 with compact or two-space-indented layout only"""
+        layout_ok = indent == 2 or (indent is None and self.compact)
+        return layout_ok and self.strict and not self.ensure_ascii
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not FAST_JSON_ENABLED:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,296 @@
+"""
+Retention engine for image jobs and chat history.
+
+Two stages run per plan (see RETENTION_POLICIES):
+- tiering: inline base64 payloads and media-storage files of finished jobs are moved
+  to cold storage and replaced with `cold://` references, which keeps the hot JSON
+  columns small and the media storage lean;
+- archiving: old jobs and the messages of idle threads are moved to the archive
+  tables in bounded batches.
+
+Reads rehydrate lazily without moving anything back: archived rows are served read-only
+from the archive tables (merged into job lists and thread detail) and cold payloads
+through signed URLs, so reading old data never undoes retention.
+"""
+import base64
+import binascii
+import logging
+import mimetypes
+import os
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from .image_storage import stored_image_name
+from .models import ImageJob, ChatThread, ChatMessage, ArchivedImageJob, ArchivedChatMessage
+from .plans import PLANS, users_on_plan
+
+logger = logging.getLogger(__name__)
+
+COLD_PREFIX = 'cold://'
+COLD_URL_SALT = 'api.retention.cold-image'
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+_MAGIC = (
+    (b'\x89PNG', 'image/png'),
+    (b'\xff\xd8', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+)
+
+
+@lru_cache(maxsize=1)
+def cold_storage() -> FileSystemStorage:
+    # A local directory stands in for an object-storage bucket
+    return FileSystemStorage(location=settings.COLD_STORAGE_ROOT)
+
+
+def sniff_mime(data: bytes) -> str:
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, mime_type in _MAGIC:
+        if data.startswith(magic):
+            return mime_type
+    return 'application/octet-stream'
+
+
+def is_inline_payload(value) -> bool:
+    return isinstance(value, str) and not value.startswith(('http://', 'https://', '/', COLD_PREFIX))
+
+
+def freeze_payload(value: str, prefix: str) -> str:
+    """Write an inline base64 (or data: URL) payload to cold storage and return its reference"""
+    mime_type = None
+    if value.startswith('data:'):
+        header, _, value = value.partition(',')
+        mime_type = header[5:].split(';')[0] or None
+    data = base64.b64decode(value)
+    mime_type = mime_type or sniff_mime(data)
+    name = cold_storage().save(prefix + (mimetypes.guess_extension(mime_type) or ''), ContentFile(data))
+    return COLD_PREFIX + name
+
+
+def freeze_stored_image(name: str, prefix: str) -> str:
+    """Copy a media-storage file (see store_image_bytes) to cold storage and return its reference"""
+    with default_storage.open(name, 'rb') as source:
+        name = cold_storage().save(prefix + os.path.splitext(name)[1], source)
+    return COLD_PREFIX + name
+
+
+class _Freezer:
+    """
+    Moves one job's payloads to cold storage. A storage error propagates (OSError) so the
+    caller can leave the job hot for the next run; `abandon()` then removes the cold copies
+    made so far, while `commit()` deletes the media files once the new references are saved.
+    """
+
+    def __init__(self):
+        self.created: List[str] = []
+        self.moved: List[str] = []
+
+    def freeze(self, values: List, prefix: str) -> List:
+        frozen = []
+        for index, value in enumerate(values or []):
+            stored = stored_image_name(value) if isinstance(value, str) else None
+            if stored is not None:
+                value = freeze_stored_image(stored, f"{prefix}-{index}")
+                self.moved.append(stored)
+                self.created.append(value)
+            elif is_inline_payload(value):
+                try:
+                    value = freeze_payload(value, f"{prefix}-{index}")
+                    self.created.append(value)
+                except (binascii.Error, ValueError):
+                    # Retrying won't help; the value stays inline for good
+                    logger.warning(f"Leaving undecodable payload {prefix}-{index} inline")
+            frozen.append(value)
+        return frozen
+
+    def abandon(self) -> None:
+        for ref in self.created:
+            try:
+                cold_storage().delete(ref[len(COLD_PREFIX):])
+            except OSError as e:
+                logger.warning(f"Could not remove cold copy {ref}: {e}")
+
+    def commit(self) -> None:
+        for name in self.moved:
+            try:
+                default_storage.delete(name)
+            except OSError as e:
+                logger.warning(f"Could not delete tiered image {name}: {e}")
+
+
+def cold_image_url(ref: str, request=None) -> str:
+    """Signed, unauthenticated URL that streams a cold payload (used by <img> tags)"""
+    token = signing.dumps(ref[len(COLD_PREFIX):], salt=COLD_URL_SALT, compress=True)
+    path = reverse('cold_image', args=[token])
+    if request is not None:
+        return request.build_absolute_uri(path)
+    return settings.BACKEND_URL.rstrip('/') + path
+
+
+def resolve_cold_image_token(token: str) -> str:
+    """Storage name for a token from cold_image_url; raises signing.BadSignature"""
+    return signing.loads(token, salt=COLD_URL_SALT, max_age=settings.COLD_IMAGE_URL_MAX_AGE)
+
+
+def expand_cold_refs(values: List, request=None) -> List:
+    return [cold_image_url(value, request) if isinstance(value, str) and value.startswith(COLD_PREFIX) else value
+            for value in values or []]
+
+
+def _jobs_for_plan(plan: str, cutoff):
+    return ImageJob.objects.filter(
+        created_at__lt=cutoff, status__in=FINISHED_STATUSES, user__in=users_on_plan(plan),
+    )
+
+
+def tier_image_jobs(plan: str, cutoff, batch_size: int) -> Tuple[int, int]:
+    """
+    Move inline payloads and stored files of finished jobs created before `cutoff` to cold
+    storage. Returns (tiered, deferred); a job hitting a storage error stays hot and is
+    retried by the next run.
+    """
+    tiered = deferred = 0
+    queryset = _jobs_for_plan(plan, cutoff).filter(storage_tier='hot').order_by('id')
+    last_id = 0
+    while True:
+        # Keyset on id: deferred jobs are still hot and would otherwise be picked again
+        jobs = list(queryset.filter(id__gt=last_id).only('id', 'input_images', 'output_images')[:batch_size])
+        if not jobs:
+            return tiered, deferred
+        last_id = jobs[-1].id
+        frozen, freezers = [], []
+        for job in jobs:
+            freezer = _Freezer()
+            try:
+                job.input_images = freezer.freeze(job.input_images, f"jobs/{job.id}/input")
+                job.output_images = freezer.freeze(job.output_images, f"jobs/{job.id}/output")
+            except OSError as e:
+                logger.warning(f"Leaving image job {job.id} hot until the next run: {e}")
+                freezer.abandon()
+                deferred += 1
+                continue
+            job.storage_tier = 'cold'
+            frozen.append(job)
+            freezers.append(freezer)
+        ImageJob.objects.bulk_update(frozen, ['input_images', 'output_images', 'storage_tier'])
+        for freezer in freezers:
+            freezer.commit()
+        tiered += len(frozen)
+
+
+def archive_image_jobs(plan: str, cutoff, batch_size: int) -> Tuple[int, int]:
+    """Move finished jobs created before `cutoff` to the archive table; returns (archived, deferred)"""
+    archived = deferred = 0
+    queryset = _jobs_for_plan(plan, cutoff).order_by('id')
+    last_id = 0
+    while True:
+        freezers = []
+        with transaction.atomic():
+            jobs = list(queryset.filter(id__gt=last_id).select_for_update()[:batch_size])
+            if not jobs:
+                return archived, deferred
+            last_id = jobs[-1].id
+            rows = []
+            for job in jobs:
+                freezer = _Freezer()
+                try:
+                    # Anything still inline is frozen on the way out
+                    input_images = freezer.freeze(job.input_images, f"jobs/{job.id}/input")
+                    output_images = freezer.freeze(job.output_images, f"jobs/{job.id}/output")
+                except OSError as e:
+                    logger.warning(f"Leaving image job {job.id} unarchived until the next run: {e}")
+                    freezer.abandon()
+                    deferred += 1
+                    continue
+                freezers.append(freezer)
+                rows.append(ArchivedImageJob(
+                    original_id=job.id, user_id=job.user_id, thread_id=job.thread_id,
+                    provider=job.provider, model=job.model, prompt=job.prompt, num_images=job.num_images,
+                    input_images=input_images, output_images=output_images,
+                    status=job.status, created_at=job.created_at, completed_at=job.completed_at,
+                    credits_spent=job.credits_spent,
+                ))
+            ArchivedImageJob.objects.bulk_create(rows, ignore_conflicts=True)
+            ImageJob.objects.filter(id__in=[row.original_id for row in rows]).delete()
+        for freezer in freezers:
+            freezer.commit()
+        archived += len(rows)
+
+
+def archive_chat_messages(plan: str, cutoff, batch_size: int) -> int:
+    """Archive messages older than `cutoff` in threads with no activity since then; the threads stay"""
+    archived = 0
+    queryset = ChatMessage.objects.filter(
+        # The message's own age keeps recent messages hot even where updated_at lags behind them
+        created_at__lt=cutoff, thread__updated_at__lt=cutoff, thread__user__in=users_on_plan(plan),
+    ).order_by('id')
+    while True:
+        with transaction.atomic():
+            messages = list(queryset.select_for_update(of=('self',))[:batch_size])
+            if not messages:
+                return archived
+            ArchivedChatMessage.objects.bulk_create([
+                ArchivedChatMessage(
+                    original_id=message.id, thread_id=message.thread_id, role=message.role,
+                    content=message.content, created_at=message.created_at,
+                ) for message in messages
+            ], ignore_conflicts=True)
+            ChatMessage.objects.filter(id__in=[message.id for message in messages]).delete()
+        archived += len(messages)
+
+
+def apply_retention(batch_size: Optional[int] = None, now=None) -> Dict[str, Dict[str, int]]:
+    """Run every stage for every plan; returns counts per plan"""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    now = now or timezone.now()
+    results = {}
+    for plan in PLANS:
+        policy = settings.RETENTION_POLICIES[plan]
+        cold_cutoff = now - timedelta(days=policy['COLD_AFTER_DAYS'])
+        archive_cutoff = now - timedelta(days=policy['ARCHIVE_AFTER_DAYS'])
+        tiered, tier_deferred = tier_image_jobs(plan, cold_cutoff, batch_size)
+        archived, archive_deferred = archive_image_jobs(plan, archive_cutoff, batch_size)
+        results[plan] = {
+            'tiered_jobs': tiered,
+            'archived_jobs': archived,
+            'archived_messages': archive_chat_messages(plan, archive_cutoff, batch_size),
+            # Storage errors; these jobs are retried by the next run
+            'deferred_jobs': tier_deferred + archive_deferred,
+        }
+    return results
+
+
+def archived_image_jobs(user, since=None, before=None, limit=None) -> List[ImageJob]:
+    """
+    A user's archived jobs as read-only ImageJob instances, newest first. `before` is a
+    (created_at, id) keyset position; only jobs strictly after it in that order are returned.
+    """
+    queryset = ArchivedImageJob.objects.filter(user=user)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if before is not None:
+        created_at, job_id = before
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, original_id__lt=job_id))
+    queryset = queryset.order_by('-created_at', '-original_id')
+    if limit is not None:
+        queryset = queryset[:limit]
+    return [archived.as_image_job() for archived in queryset]
+
+
+def find_archived_image_job(user, job_id: int) -> Optional[ImageJob]:
+    archived = ArchivedImageJob.objects.filter(user=user, original_id=job_id).first()
+    return archived.as_image_job() if archived else None
+
+
+def archived_messages(thread: ChatThread) -> List[ChatMessage]:
+    return [archived.as_chat_message() for archived in thread.archived_messages.order_by('created_at')]
@@ -0,0 +1,21 @@
+import mimetypes
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.views.decorators.http import require_GET
+from .retention import cold_storage, resolve_cold_image_token
+
+
+@require_GET
+def cold_image_view(request, token):
+    """Stream a payload from cold storage; the signed token is the only credential"""
+    try:
+        name = resolve_cold_image_token(token)
+    except signing.BadSignature:
+        raise Http404("Image link is invalid or has expired")
+    storage = cold_storage()
+    if not storage.exists(name):
+        raise Http404("Image not found")
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
@@ -0,0 +1,183 @@
+"""
+Hourly and daily usage/revenue rollups.
+
+Jobs and payments add themselves to their buckets as they finish, with one multi-row
+INSERT ... ON CONFLICT DO UPDATE per table that adds to the existing counters, so
+dashboards read summary rows instead of aggregating ImageJob/PaymentTransaction.
+`rebuild_rollups` recomputes any range from the raw (and archived) rows; it holds off
+incremental updates while it runs, so callers must record a job or payment in the same
+transaction that finishes it.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Tuple
+from django.db import connections, router, transaction
+from django.db.models import Count, Func, IntegerField, Q, Sum
+from django.db.models.functions import Trunc
+from .models import ArchivedImageJob, ImageJob, ImageUsageRollup, PaymentTransaction, RevenueRollup
+
+GRANULARITIES = ('hour', 'day')
+
+USAGE_KEY = ('granularity', 'bucket', 'user', 'provider', 'model')
+USAGE_COUNTERS = ('jobs', 'failed_jobs', 'images', 'credits_spent')
+REVENUE_KEY = ('granularity', 'bucket', 'user', 'gateway')
+REVENUE_COUNTERS = ('transactions', 'amount', 'credits_purchased')
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class _JSONArrayLength(Func):
+    function = 'JSON_ARRAY_LENGTH'
+    output_field = IntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='JSONB_ARRAY_LENGTH', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='JSON_LENGTH', **extra_context)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(dt_timezone.utc)
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert(model, key_fields: Tuple[str, ...], counter_fields: Tuple[str, ...], rows: Dict[tuple, list]):
+    """Add each row's counters to the stored ones, inserting missing rows, in a single statement"""
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields + counter_fields]
+    columns = ', '.join(qn(field.column) for field in fields)
+    conflict = ', '.join(qn(model._meta.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f"{qn(field.column)} = {table}.{qn(field.column)} + EXCLUDED.{qn(field.column)}"
+        for field in fields[len(key_fields):]
+    )
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    params = []
+    # Sorted so concurrent writers lock rows in the same order
+    for key in sorted(rows):
+        for field, value in zip(fields, key + tuple(rows[key])):
+            params.append(field.get_db_prep_value(value, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) VALUES {', '.join([placeholders] * len(rows))} "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+            params,
+        )
+
+
+def record_image_jobs(jobs: Iterable[ImageJob]):
+    """Count finished jobs into their hourly and daily buckets"""
+    rows = {}
+    for job in jobs:
+        if job.status not in FINISHED_STATUSES:
+            continue
+        completed = job.status == 'completed'
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(job.created_at, granularity), job.user_id, job.provider, job.model)
+            counters = rows.setdefault(key, [0, 0, 0, 0])
+            counters[0] += 1
+            counters[1] += 0 if completed else 1
+            counters[2] += len(job.output_images) if completed else 0
+            counters[3] += job.credits_spent
+    _upsert(ImageUsageRollup, USAGE_KEY, USAGE_COUNTERS, rows)
+
+
+def record_payments(payments: Iterable[PaymentTransaction]):
+    """Count completed payments into their hourly and daily buckets"""
+    rows = {}
+    for payment in payments:
+        if payment.status != 'completed':
+            continue
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(payment.completed_at, granularity), payment.user_id, payment.gateway)
+            counters = rows.setdefault(key, [0, 0, 0])
+            counters[0] += 1
+            counters[1] += payment.amount
+            counters[2] += payment.credits_purchased
+    _upsert(RevenueRollup, REVENUE_KEY, REVENUE_COUNTERS, rows)
+
+
+def _usage_rows(queryset, granularity: str) -> List[dict]:
+    return list(
+        queryset.filter(status__in=FINISHED_STATUSES)
+        .annotate(bucket=Trunc('created_at', granularity, tzinfo=dt_timezone.utc))
+        .values('bucket', 'user_id', 'provider', 'model')
+        .annotate(
+            jobs=Count('id'),
+            failed_jobs=Count('id', filter=Q(status='failed')),
+            # Counted in the database so the image payloads are never loaded
+            images=Sum(_JSONArrayLength('output_images'), filter=Q(status='completed'), default=0),
+            credits_spent=Sum('credits_spent', default=0),
+        )
+        .order_by()
+    )
+
+
+def _fence_incremental_updates(connection):
+    """Make record_image_jobs/record_payments wait until the current transaction ends"""
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        tables = ', '.join(qn(model._meta.db_table) for model in (ImageUsageRollup, RevenueRollup))
+        with connection.cursor() as cursor:
+            # Conflicts with the ROW EXCLUSIVE lock every INSERT ... ON CONFLICT takes, and
+            # waits for upserts already in flight to commit
+            cursor.execute(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+    # SQLite serialises writers: the DELETE that follows takes the database write lock
+
+
+def rebuild_rollups(since: datetime, until: datetime = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Replace the rollups from the start of `since`'s day up to `until` (exclusive, default:
+    no upper bound) with totals computed from the raw rows. Returns rows written per table.
+
+    Incremental updates are blocked from before the raw rows are read until the new rollups
+    commit, so a job finishing meanwhile is counted either here or by its own upsert, never
+    both and never neither.
+    """
+    start = bucket_start(since, 'day')
+    end = bucket_start(until, 'day') + timedelta(days=1) if until else None
+
+    def in_range(queryset, field):
+        queryset = queryset.filter(**{f"{field}__gte": start})
+        return queryset.filter(**{f"{field}__lt": end}) if end else queryset
+
+    connection = connections[router.db_for_write(ImageUsageRollup)]
+    with transaction.atomic(using=connection.alias):
+        _fence_incremental_updates(connection)
+        for model in (ImageUsageRollup, RevenueRollup):
+            in_range(model.objects.all(), 'bucket').delete()
+
+        usage, revenue = [], []
+        for granularity in GRANULARITIES:
+            totals = {}
+            # Archived jobs still count towards usage
+            for queryset in (ImageJob.objects.all(), ArchivedImageJob.objects.all()):
+                for row in _usage_rows(in_range(queryset, 'created_at'), granularity):
+                    key = (row['bucket'], row['user_id'], row['provider'], row['model'])
+                    counters = totals.setdefault(key, dict.fromkeys(USAGE_COUNTERS, 0))
+                    for name in USAGE_COUNTERS:
+                        counters[name] += row[name]
+            usage += [
+                ImageUsageRollup(granularity=granularity, bucket=bucket, user_id=user_id, provider=provider,
+                                 model=model, **counters)
+                for (bucket, user_id, provider, model), counters in totals.items()
+            ]
+
+            payments = (
+                in_range(PaymentTransaction.objects.filter(status='completed'), 'completed_at')
+                .annotate(bucket=Trunc('completed_at', granularity, tzinfo=dt_timezone.utc))
+                .values('bucket', 'user_id', 'gateway')
+                .annotate(transactions=Count('id'), amount=Sum('amount'), credits_purchased=Sum('credits_purchased'))
+                .order_by()
+            )
+            revenue += [RevenueRollup(granularity=granularity, **row) for row in payments]
+
+        ImageUsageRollup.objects.bulk_create(usage, batch_size=batch_size)
+        RevenueRollup.objects.bulk_create(revenue, batch_size=batch_size)
+    return {'image_usage': len(usage), 'revenue': len(revenue)}
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+from django.conf import settings
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+logger = logging.getLogger(__name__)
+
+# Directories whose source defines the API surface
+SOURCE_DIRS = ('api', 'backend')
+
+
+@dataclass(frozen=True)
+class CachedSchema:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+_memory: Dict[Tuple[str, str], CachedSchema] = {}
+_build_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """CODE_VERSION when the deploy sets it, otherwise a hash of the API source files"""
+    if settings.CODE_VERSION:
+        return settings.CODE_VERSION
+    digest = hashlib.sha256(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode())
+    for directory in SOURCE_DIRS:
+        for path in sorted(Path(settings.BASE_DIR, directory).rglob('*.py')):
+            digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _renderer_for(fmt: str):
+    return OpenApiJsonRenderer() if fmt == 'json' else OpenApiYamlRenderer()
+
+
+def _cache_path(fmt: str) -> Path:
+    return Path(settings.SCHEMA_CACHE_DIR, f"schema-{code_version()}.{fmt}.gz")
+
+
+def _entry(body: bytes, gzipped: bytes) -> CachedSchema:
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    return CachedSchema(body, gzipped, etag)
+
+
+def build_schema(fmt: str) -> CachedSchema:
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    body = _renderer_for(fmt).render(schema, renderer_context={})
+    entry = _entry(body, gzip.compress(body, compresslevel=9))
+    path = _cache_path(fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent workers never read a partial file
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(entry.gzipped)
+    tmp.replace(path)
+    return entry
+
+
+def get_schema(fmt: str) -> CachedSchema:
+    """Schema for the running code version, from memory, then disk, then a fresh build"""
+    key = (code_version(), fmt)
+    entry = _memory.get(key)
+    if entry is not None:
+        return entry
+    with _build_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            path = _cache_path(fmt)
+            if path.exists():
+                gzipped = path.read_bytes()
+                entry = _entry(gzip.decompress(gzipped), gzipped)
+            else:
+                logger.info(f"Building OpenAPI schema ({fmt}) for code version {key[0]}")
+                entry = build_schema(fmt)
+            _memory[key] = entry
+    return entry
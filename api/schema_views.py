@@ -0,0 +1,28 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from .schema_cache import get_schema
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serves the OpenAPI schema pre-rendered for the running code version instead of
+    introspecting every view per request. Supports ETag revalidation and gzip.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        entry = get_schema('json' if 'json' in renderer.format else 'yaml')
+        if request.META.get('HTTP_IF_NONE_MATCH') == entry.etag:
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(entry.gzipped, content_type=renderer.media_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(entry.body, content_type=renderer.media_type)
+        response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = entry.etag
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
@@ -0,0 +1,151 @@
+"""
+Full-text search over image prompts and chat messages.
+
+PostgreSQL uses expression GIN indexes on to_tsvector(SEARCH_CONFIG, column); SQLite uses
+external-content FTS5 tables kept in sync by triggers. Either way the database updates the
+index on every insert, update and delete, so there is no reindexing job. Other backends
+fall back to a case-insensitive substring match.
+
+The indexes and triggers live outside Django's schema state: on SQLite any migration that
+remakes api_imagejob or api_chatmessage (AddField with a default, AlterField, ...) drops
+the triggers. A post_migrate handler (api.signals) reinstalls whatever
+missing_search_indexes() reports, and `manage.py rebuild_search_index` does the same by hand.
+"""
+import re
+from typing import List
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+# Text search configuration (stemming and stop words) used by the Postgres indexes and queries
+SEARCH_CONFIG = 'english'
+
+# Searched column by table; the indexes are created by install_search_indexes()
+SEARCH_COLUMNS = {
+    'api_imagejob': 'prompt',
+    'api_chatmessage': 'content',
+}
+
+_TOKEN = re.compile(r'\w+')
+
+
+def index_name(table: str) -> str:
+    return f"{table}_{SEARCH_COLUMNS[table]}_search_idx"
+
+
+def fts_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def _postgres_ddl(table: str, column: str):
+    # Not CONCURRENTLY: it is not supported on partitioned tables, where the index cascades to every partition
+    return [
+        f"CREATE INDEX IF NOT EXISTS {index_name(table)} ON {table} "
+        f"USING gin (to_tsvector('{SEARCH_CONFIG}', {column}))",
+    ]
+
+
+def _sqlite_ddl(table: str, column: str):
+    fts = fts_table(table)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install_search_indexes(connection):
+    """Create the search indexes (idempotent). On SQLite this also rebuilds the FTS5 tables."""
+    with connection.cursor() as cursor:
+        for table, column in SEARCH_COLUMNS.items():
+            if connection.vendor == 'postgresql':
+                statements = _postgres_ddl(table, column)
+            elif connection.vendor == 'sqlite':
+                statements = _sqlite_ddl(table, column)
+            else:
+                statements = []
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def missing_search_indexes(connection) -> List[str]:
+    """Tables whose search index (Postgres) or FTS5 table and triggers (SQLite) are absent"""
+    missing = []
+    with connection.cursor() as cursor:
+        for table in SEARCH_COLUMNS:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [index_name(table)])
+                if cursor.fetchone() is None:
+                    missing.append(table)
+            elif connection.vendor == 'sqlite':
+                fts = fts_table(table)
+                expected = {fts, f"{fts}_ai", f"{fts}_ad", f"{fts}_au"}
+                cursor.execute(
+                    f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(expected))})",
+                    sorted(expected),
+                )
+                if {row[0] for row in cursor.fetchall()} != expected:
+                    missing.append(table)
+    return missing
+
+
+def drop_search_indexes(connection):
+    with connection.cursor() as cursor:
+        for table in SEARCH_COLUMNS:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name(table)}")
+            elif connection.vendor == 'sqlite':
+                fts = fts_table(table)
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def fts5_query(query: str) -> str:
+    """Every word quoted, so user input cannot use (or break) FTS5 query syntax; terms are ANDed"""
+    return ' '.join(f'"{token}"' for token in _TOKEN.findall(query))
+
+
+def search(queryset, query: str):
+    """
+    `queryset` narrowed to rows matching `query` and annotated with `search_rank`
+    (higher is better). The match runs on whichever database the queryset reads from.
+    """
+    table = queryset.model._meta.db_table
+    column = SEARCH_COLUMNS[table]
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+
+    if connection.vendor == 'postgresql':
+        # Must match the index expression exactly for the GIN index to be used
+        vector = f"to_tsvector('{SEARCH_CONFIG}', {qn(table)}.{qn(column)})"
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.alias(
+            search_match=RawSQL(f"{vector} @@ {tsquery}", [query], output_field=BooleanField()),
+        ).filter(search_match=True).annotate(
+            search_rank=RawSQL(f"ts_rank_cd({vector}, {tsquery})", [query], output_field=FloatField()),
+        )
+
+    if connection.vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        fts = fts_table(table)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match]),
+        ).annotate(
+            # bm25() is lower-is-better and only defined inside a MATCH query
+            search_rank=RawSQL(
+                f"(SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {qn(table)}.id)",
+                [match], output_field=FloatField(),
+            ),
+        )
+
+    return queryset.filter(**{f"{column}__icontains": query}).annotate(search_rank=Value(0.0))
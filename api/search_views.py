@@ -0,0 +1,58 @@
+from django.conf import settings
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from .models import ChatMessage, ImageJob
+from .search import search
+from .serializers import ChatMessageSearchResultSerializer, ImageJobSearchResultSerializer
+from .views import created_since
+
+SEARCH_PARAMETERS = [
+    OpenApiParameter('q', str, required=True, description='Search terms; supports "quoted phrases" and -exclusions on PostgreSQL'),
+    OpenApiParameter('days', int, description='Only results from the last N days'),
+]
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = settings.SEARCH_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def search_terms(request) -> str:
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        raise ValidationError({'q': 'This parameter is required.'})
+    if len(query) > settings.SEARCH_MAX_QUERY_LENGTH:
+        raise ValidationError({'q': f'Must be at most {settings.SEARCH_MAX_QUERY_LENGTH} characters.'})
+    return query
+
+
+@extend_schema(tags=['Search'], summary='Search your image prompts', parameters=SEARCH_PARAMETERS)
+class ImageJobSearchView(generics.ListAPIView):
+    serializer_class = ImageJobSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        jobs = ImageJob.objects.for_user(self.request.user, since=created_since(self.request)).defer(
+            'input_images', 'output_images',
+        )
+        return search(jobs, search_terms(self.request)).order_by('-search_rank', '-created_at')
+
+
+@extend_schema(tags=['Search'], summary='Search your chat history', parameters=SEARCH_PARAMETERS)
+class ChatMessageSearchView(generics.ListAPIView):
+    serializer_class = ChatMessageSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        messages = ChatMessage.objects.filter(
+            thread__user=self.request.user, thread__deleted_at__isnull=True,
+        ).select_related('thread')
+        since = created_since(self.request)
+        if since is not None:
+            messages = messages.filter(created_at__gte=since)
+        return search(messages, search_terms(self.request)).order_by('-search_rank', '-created_at')
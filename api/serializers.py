@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 from .models import Profile, ChatThread, ChatMessage, ImageJob
+from .services import available_providers
+from .provider_routing import AUTO_PROVIDER
+from .retention import expand_cold_refs
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -43,15 +48,37 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
 
 class ChatThreadSerializer(serializers.ModelSerializer):
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatThread
         fields = ["id", "title", "created_at", "updated_at", "messages"]
 
+    @extend_schema_field(ChatMessageSerializer(many=True))
+    def get_messages(self, thread):
+        messages = ChatMessage.objects.for_thread(thread).order_by("created_at")
+        return ChatMessageSerializer(messages, many=True).data
+
+
+class ChatMessageSearchResultSerializer(serializers.ModelSerializer):
+    thread_title = serializers.CharField(source="thread.title", read_only=True)
+    rank = serializers.FloatField(source="search_rank", read_only=True)
+
+    class Meta:
+        model = ChatMessage
+        fields = ["id", "thread", "thread_title", "role", "content", "created_at", "rank"]
+
+
+class ImageJobSearchResultSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(source="search_rank", read_only=True)
+
+    class Meta:
+        model = ImageJob
+        fields = ["id", "thread", "provider", "model", "prompt", "status", "created_at", "rank"]
+
 
 class ImageJobSerializer(serializers.ModelSerializer):
-    thread = serializers.PrimaryKeyRelatedField(queryset=ChatThread.objects.all(), required=False, allow_null=True)
+    thread = serializers.PrimaryKeyRelatedField(queryset=ChatThread.objects.live(), required=False, allow_null=True)
 
     class Meta:
         model = ImageJob
@@ -61,11 +88,45 @@ class ImageJobSerializer(serializers.ModelSerializer):
             "provider",
             "model",
             "prompt",
+            "num_images",
             "input_images",
             "output_images",
             "status",
+            "priority",
             "credits_spent",
             "created_at",
+            "started_at",
             "completed_at",
         ]
-        read_only_fields = ["output_images", "status", "credits_spent", "created_at", "completed_at"] 
\ No newline at end of file
+        read_only_fields = [
+            "output_images", "status", "priority", "credits_spent", "created_at", "started_at", "completed_at",
+        ]
+        extra_kwargs = {
+            # Chosen by the router when provider is 'auto'
+            "model": {"required": False, "allow_blank": True}
+        }
+
+    def validate_provider(self, value):
+        choices = [AUTO_PROVIDER] + available_providers()
+        if value not in choices:
+            raise serializers.ValidationError(f"Unsupported provider. Choose one of: {', '.join(choices)}")
+        return value
+
+    def validate_num_images(self, value):
+        if not 1 <= value <= settings.MAX_IMAGES_PER_JOB:
+            raise serializers.ValidationError(f"num_images must be between 1 and {settings.MAX_IMAGES_PER_JOB}")
+        return value
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Payloads moved to cold storage are served through signed URLs
+        if instance.storage_tier == 'cold':
+            request = self.context.get("request")
+            data["input_images"] = expand_cold_refs(data["input_images"], request)
+            data["output_images"] = expand_cold_refs(data["output_images"], request)
+        return data
+
+    def validate(self, attrs):
+        if attrs.get("provider") != AUTO_PROVIDER and not attrs.get("model"):
+            raise serializers.ValidationError({"model": "This field is required unless provider is 'auto'."})
+        return attrs
@@ -1,8 +1,19 @@
 import base64
+import hashlib
+import io
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
 from typing import List, Dict, Any
 from django.conf import settings
-from openai import OpenAI
-from google import genai
+from django.utils.module_loading import import_string
+from .image_preprocessing import PreparedImage
+from .image_storage import store_image_bytes
+from .metrics import track_provider_call
+
+logger = logging.getLogger(__name__)
 
 
 class OpenAIImageService:
@@ -11,9 +22,18 @@ class OpenAIImageService:
         api_key = getattr(settings, 'OPENAI_API_KEY', None)
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # SDKs are imported on first use so processes that never call a provider don't pay for them
+        from openai import OpenAI
         self.client = OpenAI(api_key=api_key)
+        self.model = "dall-e-3"
+
+    @property
+    def max_batch(self) -> int:
+        # DALL-E 3 only accepts n=1; DALL-E 2 returns up to 10 images per call
+        return 1 if self.model == "dall-e-3" else 10
 
-    def generate(self, prompt: str, input_images: List[bytes] | None = None, size: str = "1024x1024") -> List[str]:
+    @track_provider_call('openai')
+    def generate(self, prompt: str, input_images: List[PreparedImage] | None = None, size: str = "1024x1024", n: int = 1) -> List[str]:
         """
         Generate images using DALL-E 3 (cheapest model)
         Pricing: $0.040 per image for 1024x1024, $0.080 for larger sizes
@@ -25,20 +45,20 @@ class OpenAIImageService:
                 # For image editing, we'll use the create variation endpoint
                 # Note: DALL-E 3 doesn't support direct editing, so we'll generate new images
                 result = self.client.images.generate(
-                    model="dall-e-3",
+                    model=self.model,
                     prompt=f"Edit this image: {prompt}",
                     size=size,
                     quality="standard",  # Use standard quality for cost efficiency
-                    n=1
+                    n=n
                 )
             else:
                 # Generate new images with DALL-E 3
                 result = self.client.images.generate(
-                    model="dall-e-3",
+                    model=self.model,
                     prompt=prompt,
                     size=size,
                     quality="standard",  # Use standard quality for cost efficiency
-                    n=1
+                    n=n
                 )
             
             # Extract image URLs
@@ -55,42 +75,161 @@ class OpenAIImageService:
         return outputs
 
 
+class GeminiImageServiceError(RuntimeError):
+    """Raised when a Gemini response yields no usable image"""
+
+
 class GeminiImageService:
     def __init__(self):
         # google-genai client
+        from google import genai
         self.client = genai.Client(api_key=settings.GEMINI_API_KEY) if settings.GEMINI_API_KEY else genai.Client()
         # Model choice: Prefer Gemini 2.5 Flash Image Preview if available
         self.model = "gemini-2.5-flash-image-preview"
+        # An instance serves one job, so GEMINI_MAX_JOB_BYTES is shared by all of the job's
+        # fan-out calls, which run in parallel threads
+        self._received = 0
+        self._budget_lock = threading.Lock()
 
-    def generate(self, prompt: str, input_images: List[bytes] | None = None) -> List[str]:
+    def _reserve(self, size: int) -> bool:
+        """Count `size` decoded bytes against the job's budget; False once it would be exceeded"""
+        max_bytes = settings.GEMINI_MAX_JOB_BYTES
+        with self._budget_lock:
+            if max_bytes and self._received + size > max_bytes:
+                return False
+            self._received += size
+            return True
+
+    # Larger inputs are tiled by the model anyway, so anything bigger only costs upload time
+    max_input_side = 1536
+
+    @track_provider_call('gemini')
+    def generate(self, prompt: str, input_images: List[PreparedImage] | None = None) -> List[str]:
         outputs: List[str] = []
         parts: List[Dict[str, Any]] = []
         parts.append({"text": prompt})
         if input_images:
-            for img_bytes in input_images:
+            for image in input_images:
                 parts.append({
                     "inline_data": {
-                        "mime_type": "image/png",
-                        "data": base64.b64encode(img_bytes).decode('utf-8')
+                        "mime_type": image.mime_type,
+                        "data": image.b64
                     }
                 })
-        resp = self.client.models.generate_content(
+        # Stream the response so each image part is written to storage as soon as it
+        # is decoded; only URLs are kept, and the job stops reading past the byte cap
+        stream = self.client.models.generate_content_stream(
             model=self.model,
             contents={"role": "user", "parts": parts}
         )
-        # google-genai returns candidates with inline data parts
-        if hasattr(resp, 'candidates') and resp.candidates:
-            for cand in resp.candidates:
-                for p in getattr(cand.content, 'parts', []) or []:
-                    data = getattr(p, 'inline_data', None)
-                    if data and data.data:
-                        outputs.append(data.data)
+        try:
+            for chunk in stream:
+                for cand in getattr(chunk, 'candidates', None) or []:
+                    content = getattr(cand, 'content', None)
+                    for p in getattr(content, 'parts', None) or []:
+                        data = getattr(p, 'inline_data', None)
+                        if not (data and data.data):
+                            continue
+                        payload = data.data
+                        if isinstance(payload, str):
+                            payload = base64.b64decode(payload)
+                        if not self._reserve(len(payload)):
+                            logger.warning(
+                                "Gemini job exceeded %s bytes; keeping %s image(s) from this call",
+                                settings.GEMINI_MAX_JOB_BYTES, len(outputs),
+                            )
+                            if not outputs:
+                                # Fail the call so the job is refunded rather than completed empty
+                                raise GeminiImageServiceError(
+                                    f"Gemini image exceeded GEMINI_MAX_JOB_BYTES ({settings.GEMINI_MAX_JOB_BYTES})"
+                                )
+                            return outputs
+                        outputs.append(store_image_bytes(payload, data.mime_type or 'image/png'))
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+        return outputs
+
+
+class LocalImageServiceError(RuntimeError):
+    """Simulated provider failure raised by LocalImageService"""
+
+
+class LocalImageService:
+    """
+    Offline provider that renders deterministic images with Pillow.
+    The same prompt always yields the same image; latency, failure rate and output
+    sizes are drawn from the LOCAL_IMAGE_PROVIDER settings so the job pipeline can be
+    soak-tested without network access or API keys.
+    """
+
+    def __init__(self):
+        config = settings.LOCAL_IMAGE_PROVIDER
+        self.model = config['MODEL']
+        self.latency_range = config['LATENCY_MS']
+        self.failure_rate = config['FAILURE_RATE']
+        self.sizes = config['SIZES']
+        self.seed = config['SEED']
+
+    max_batch = 16
+
+    @track_provider_call('local')
+    def generate(self, prompt: str, input_images: List[PreparedImage] | None = None, n: int = 1) -> List[str]:
+        low, high = self.latency_range
+        if high > 0:
+            time.sleep(random.uniform(low, high) / 1000)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise LocalImageServiceError("Simulated local provider failure")
+
+        outputs: List[str] = []
+        for index in range(n):
+            digest = hashlib.sha256(f"{self.seed}:{self.model}:{prompt}:{index}".encode('utf-8')).hexdigest()
+            size = self.sizes[int(digest[:8], 16) % len(self.sizes)]
+            outputs.append(render_local_image(digest, size))
         return outputs
 
 
+@lru_cache(maxsize=1024)
+def render_local_image(digest: str, size: str) -> str:
+    """Render a PNG (base64) whose colours and shapes are derived from `digest`"""
+    from PIL import Image, ImageDraw
+    width, height = (int(part) for part in size.split('x'))
+    rng = random.Random(digest)
+    image = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = rng.randrange(x0, width + 1), rng.randrange(y0, height + 1)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+# Provider name -> dotted path of the service class. Extra providers can be plugged in
+# through settings.IMAGE_PROVIDERS without touching this module.
+PROVIDERS = {
+    'openai': 'api.services.OpenAIImageService',
+    'gemini': 'api.services.GeminiImageService',
+    'local': 'api.services.LocalImageService',
+}
+
+
+def available_providers() -> List[str]:
+    return sorted({**PROVIDERS, **settings.IMAGE_PROVIDERS})
+
+
+def get_service_class(provider: str):
+    path = {**PROVIDERS, **settings.IMAGE_PROVIDERS}.get(provider)
+    if not path:
+        raise ValueError('Unsupported provider')
+    return import_string(path)
+
+
 def select_service(provider: str):
-    if provider == 'openai':
-        return OpenAIImageService()
-    if provider == 'gemini':
-        return GeminiImageService()
-    raise ValueError('Unsupported provider')
+    return get_service_class(provider)()
@@ -1,10 +1,38 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate, post_save, post_delete
 from django.dispatch import receiver
 from .models import Profile
+from .authentication import invalidate_cached_user
+from .search import install_search_indexes, missing_search_indexes
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance) 
\ No newline at end of file
+        Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    # Covers password changes and deactivation
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_auth_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+@receiver(post_migrate)
+def reinstall_search_indexes(sender, using, **kwargs):
+    # SQLite table rebuilds in later migrations drop the FTS5 triggers 0010 installed
+    if sender.name != 'api':
+        return
+    connection = connections[using]
+    if ('api', '0010_search_indexes') not in MigrationRecorder(connection).applied_migrations():
+        return
+    if missing_search_indexes(connection):
+        install_search_indexes(connection)
@@ -6,8 +6,6 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from allauth.socialaccount.models import SocialAccount
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-import requests
-import json
 
 User = get_user_model()
 
@@ -85,6 +83,7 @@ class SocialLoginCallbackView(APIView):
     
     def get_user_info(self, provider, access_token):
         """Get user information from the social provider"""
+        import requests  # only needed on this path; keeps it out of process startup
         if provider == 'google':
             response = requests.get(
                 'https://www.googleapis.com/oauth2/v2/userinfo',
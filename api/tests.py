@@ -0,0 +1,656 @@
+import gzip
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import urljoin
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.db import connection, connections
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from .admin import ImageModelListFilter
+from .email_services import queue_email, send_pending_emails
+from .benchmarking import compare_to_baseline
+from .deletion import process_deletion_requests, request_user_deletion
+from .image_pipeline import generate_images
+from .image_storage import store_image_bytes, stored_image_name
+from .middleware import CompressionMiddleware
+from .job_queue import claim_next_job, fail_stale_jobs, process_image_jobs, run_image_job
+from .models import ArchivedImageJob, ChatMessage, ChatThread, OutboundEmail, ImageJob, ImageUsageRollup, OrphanedBlob, PasswordResetToken, PaymentTransaction, Profile, RevenueRollup
+from .renderers import FastJSONRenderer, loads
+from . import rollups
+from .rollups import rebuild_rollups
+from .retention import apply_retention, cold_storage, freeze_stored_image
+from .search import missing_search_indexes
+from .serializers import ImageJobSerializer
+
+
+class SearchAfterMigrationTests(APITestCase):
+    """The test database is built by running every migration, including ones that remake the searched tables"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('searcher', password='unused-password')
+        self.client.force_authenticate(self.user)
+
+    def test_search_indexes_survive_migrations(self):
+        self.assertEqual(missing_search_indexes(connection), [])
+
+    def test_job_created_after_migrating_is_searchable(self):
+        ImageJob.objects.create(
+            user=self.user, provider='local', model='local-v1', prompt='a lighthouse at dusk', status='completed',
+        )
+        ImageJob.objects.create(
+            user=self.user, provider='local', model='local-v1', prompt='a bowl of fruit', status='completed',
+        )
+        response = self.client.get('/api/search/images/', {'q': 'lighthouse'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([job['prompt'] for job in response.json()['results']], ['a lighthouse at dusk'])
+
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('finder', password='unused-password')
+        self.client.force_authenticate(self.user)
+
+    def test_results_are_limited_to_the_requesting_user(self):
+        other = User.objects.create_user('stranger', password='unused-password')
+        for owner in (self.user, other):
+            ImageJob.objects.create(user=owner, provider='local', model='local-v1', prompt=f"red kite for {owner.username}")
+        response = self.client.get('/api/search/images/', {'q': 'kite'})
+        self.assertEqual([job['prompt'] for job in response.json()['results']], ['red kite for finder'])
+
+    def test_query_syntax_in_user_input_is_not_an_error(self):
+        ImageJob.objects.create(user=self.user, provider='local', model='local-v1', prompt='a red kite')
+        response = self.client.get('/api/search/images/', {'q': 'kite" OR (NEAR'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/search/images/').status_code, 400)
+
+    def test_messages_in_deleted_threads_are_hidden(self):
+        live = ChatThread.objects.create(user=self.user, title='live')
+        gone = ChatThread.objects.create(user=self.user, title='gone', deleted_at=timezone.now())
+        for thread in (live, gone):
+            ChatMessage.objects.create(thread=thread, role='user', content=f"otters in the {thread.title} thread")
+        response = self.client.get('/api/search/messages/', {'q': 'otters'})
+        self.assertEqual([message['content'] for message in response.json()['results']], ['otters in the live thread'])
+
+
+class SearchAfterRollbackTests(APITransactionTestCase):
+    def test_search_indexes_survive_unapplying_a_table_rebuild(self):
+        try:
+            call_command('migrate', 'api', '0013', verbosity=0)
+            self.assertEqual(missing_search_indexes(connection), [])
+        finally:
+            call_command('migrate', 'api', verbosity=0)
+        self.assertEqual(missing_search_indexes(connection), [])
+
+class PaymentWebhookRedeliveryTests(APITestCase):
+    """Gateways retry webhooks they consider undelivered, so the same event can arrive more than once"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='unused-password')
+        self.payment = PaymentTransaction.objects.create(
+            user=self.user, gateway='binance', transaction_id='txn-redelivered', amount='5.00', credits_purchased=50,
+        )
+
+    def test_redelivered_webhook_credits_once(self):
+        event = {'status': 'SUCCESS', 'transaction_id': 'txn-redelivered'}
+        first = self.client.post('/api/webhooks/binance/', event, format='json')
+        second = self.client.post('/api/webhooks/binance/', event, format='json')
+        self.assertEqual(first.json(), {'status': 'success'})
+        self.assertEqual(second.json(), {'status': 'already_processed'})
+        self.assertEqual(Profile.objects.get(user=self.user).credits, 50)
+        rollups = RevenueRollup.objects.filter(user=self.user).order_by('granularity')
+        self.assertEqual(list(rollups.values_list('granularity', 'transactions')), [('day', 1), ('hour', 1)])
+
+
+class ImageModelFilterTests(APITestCase):
+    def setUp(self):
+        cache.delete('admin:image_models')
+        self.admin = User.objects.create_superuser('admin', password='unused-password')
+        self.client.force_login(self.admin)
+
+    def test_routed_models_are_offered_before_any_rollup_exists(self):
+        ImageJob.objects.create(user=self.admin, provider='openai', model='dall-e-3', prompt='queued', status='pending')
+        response = self.client.get('/admin/api/imagejob/', {'model': 'dall-e-3'})
+        self.assertEqual(response.status_code, 200)
+        changelist = response.context['cl']
+        model_filter = next(spec for spec in changelist.filter_specs if isinstance(spec, ImageModelListFilter))
+        self.assertIn(('dall-e-3', 'dall-e-3'), model_filter.lookup_choices)
+        self.assertEqual(changelist.result_count, 1)
+
+
+class DeletedWhileProcessingTests(APITransactionTestCase):
+    """Workers run in autocommit, so the failed save must not be inside a test transaction"""
+
+    def test_images_stored_after_the_account_is_deleted_are_orphaned(self):
+        user = User.objects.create_user('leaver', password='unused-password')
+        Profile.objects.filter(user=user).update(credits=1)
+        ImageJob.objects.create(user=user, provider='local', model='local-v1', prompt='p', credits_spent=1)
+        stored = urljoin(settings.BACKEND_URL, default_storage.url('generated/leaver.png'))
+
+        def delete_account_mid_run(job):
+            request_user_deletion(user)
+            process_deletion_requests()
+            return [stored]
+
+        with mock.patch('api.job_queue.generate_images', side_effect=delete_account_mid_run):
+            self.assertEqual(process_image_jobs(), (0, 1))
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(list(OrphanedBlob.objects.values_list('storage', 'name')), [('default', 'generated/leaver.png')])
+
+
+class AccountDeletionTests(APITestCase):
+    def test_outbox_mail_to_the_deleted_address_is_purged(self):
+        user = User.objects.create_user('purged', 'purged@example.com', 'unused-password')
+        queue_email('Purged@Example.com', 'Reset your password', 'link')
+        kept = queue_email('other@example.com', 'Welcome', 'hi')
+        request_user_deletion(user)
+        self.assertEqual(process_deletion_requests(), (1, 0))
+        self.assertEqual(list(OutboundEmail.objects.values_list('pk', flat=True)), [kept.pk])
+
+
+class FairSchedulingTests(APITestCase):
+    def queue(self, username, priority, count=1, **user_fields):
+        user = User.objects.filter(username=username).first() or User.objects.create_user(
+            username, password='unused-password', **user_fields,
+        )
+        for _ in range(count):
+            ImageJob.objects.create(user=user, provider='local', model='local-v1', prompt='p', priority=priority)
+        return user
+
+    def claimed_users(self, claims):
+        return [claim_next_job().user.username for _ in range(claims)]
+
+    def test_users_in_a_class_take_turns(self):
+        self.queue('heavy', 'paid', count=5)
+        self.queue('light', 'paid')
+        self.assertEqual(self.claimed_users(3), ['heavy', 'light', 'heavy'])
+
+    def test_higher_weight_class_goes_first(self):
+        self.queue('free-user', 'free')
+        self.queue('paying-user', 'paid')
+        self.assertEqual(self.claimed_users(2), ['paying-user', 'free-user'])
+
+    def test_in_flight_limit_and_deactivated_accounts_hold_jobs_back(self):
+        self.queue('busy', 'free', count=2)
+        self.queue('leaving', 'free', is_active=False)
+        self.assertEqual(self.claimed_users(1), ['busy'])
+        self.assertIsNone(claim_next_job())
+
+
+class StaleSweepRaceTests(APITestCase):
+    """The stale sweep can fail a job whose worker is slow rather than dead"""
+
+    def test_job_failed_by_the_sweep_is_not_settled_again(self):
+        user = User.objects.create_user('slow', password='unused-password')
+        job = ImageJob.objects.create(
+            user=user, provider='local', model='local-v1', prompt='p', num_images=2, credits_spent=2,
+            status='processing', started_at=timezone.now(),
+        )
+        stored = urljoin(settings.BACKEND_URL, default_storage.url('generated/slow.png'))
+
+        def outlive_stale_after(job):
+            ImageJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(days=1))
+            self.assertEqual(fail_stale_jobs(), 1)
+            return [stored]
+
+        with mock.patch('api.job_queue.generate_images', side_effect=outlive_stale_after):
+            run_image_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.credits_spent, job.output_images), ('failed', 0, []))
+        self.assertEqual(Profile.objects.get(user=user).credits, 2)
+        rollup = ImageUsageRollup.objects.get(user=user, granularity='day')
+        self.assertEqual((rollup.jobs, rollup.failed_jobs, rollup.images), (1, 1, 0))
+        self.assertEqual(list(OrphanedBlob.objects.values_list('name', flat=True)), ['generated/slow.png'])
+
+
+def usage_rollups(user):
+    return list(
+        ImageUsageRollup.objects.filter(user=user)
+        .order_by('granularity').values_list('granularity', 'jobs', 'failed_jobs', 'images', 'credits_spent')
+    )
+
+
+class RollupRebuildTests(APITestCase):
+    def test_rebuild_counts_images_produced_and_matches_incremental_rollups(self):
+        user = User.objects.create_user('counted', password='unused-password')
+        job = ImageJob.objects.create(
+            user=user, provider='local', model='local-v1', prompt='p', num_images=3, credits_spent=3,
+            status='processing', started_at=timezone.now(),
+        )
+        with mock.patch('api.job_queue.generate_images', return_value=['a.png', 'b.png']):
+            run_image_job(job)
+        # Charged for more images than it produced, as a hedged or imported job can be
+        rollups.record_image_jobs([ImageJob.objects.create(
+            user=user, provider='local', model='local-v1', prompt='q', status='completed',
+            output_images=['c.png'], credits_spent=4,
+        )])
+        incremental = usage_rollups(user)
+
+        rebuild_rollups(timezone.now() - timedelta(days=1))
+        self.assertEqual(usage_rollups(user), incremental)
+        self.assertEqual(incremental, [('day', 2, 0, 3, 6), ('hour', 2, 0, 3, 6)])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'table locks fence the rebuild on PostgreSQL only')
+class RollupRebuildRaceTests(APITransactionTestCase):
+    def test_job_finishing_during_a_rebuild_is_counted_once(self):
+        user = User.objects.create_user('racer', password='unused-password')
+        ImageJob.objects.create(
+            user=user, provider='local', model='local-v1', prompt='done', status='completed',
+            output_images=['a.png'], credits_spent=1,
+        )
+        job = ImageJob.objects.create(
+            user=user, provider='local', model='local-v1', prompt='late', credits_spent=1,
+            status='processing', started_at=timezone.now(),
+        )
+
+        def finish_job():
+            try:
+                run_image_job(job)
+            finally:
+                connections.close_all()
+
+        worker = threading.Thread(target=finish_job)
+        real_usage_rows = rollups._usage_rows
+
+        def usage_rows_while_job_finishes(queryset, granularity):
+            if worker.ident is None:
+                worker.start()
+                worker.join(0.5)
+                self.assertTrue(worker.is_alive(), 'the rollup upsert should wait for the rebuild')
+            return real_usage_rows(queryset, granularity)
+
+        with mock.patch('api.job_queue.generate_images', return_value=['b.png']), \
+                mock.patch('api.rollups._usage_rows', side_effect=usage_rows_while_job_finishes):
+            rebuild_rollups(timezone.now() - timedelta(days=1))
+            worker.join(5)
+        self.assertEqual(usage_rollups(user), [('day', 2, 0, 2, 2), ('hour', 2, 0, 2, 2)])
+
+
+class ImageJobListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('lister', password='unused-password')
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for days_ago in (1, 3, 5):
+            job = ImageJob.objects.create(user=self.user, provider='local', model='local-v1', prompt=f"hot {days_ago}")
+            ImageJob.objects.filter(pk=job.pk).update(created_at=now - timedelta(days=days_ago))
+        for days_ago, original_id in ((2, 100000), (400, 100001)):
+            ArchivedImageJob.objects.create(
+                original_id=original_id, user=self.user, provider='local', model='local-v1',
+                prompt=f"archived {days_ago}", status='completed', created_at=now - timedelta(days=days_ago),
+            )
+
+    @override_settings(IMAGE_JOB_PAGE_SIZE=2)
+    def test_pages_merge_hot_and_archived_jobs_newest_first(self):
+        prompts, url, pages = [], '/api/image-jobs/', 0
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            prompts += [job['prompt'] for job in page['results']]
+            url, pages = page['next'], pages + 1
+        self.assertEqual(prompts, ['hot 1', 'archived 2', 'hot 3', 'hot 5', 'archived 400'])
+        self.assertEqual(pages, 3)
+
+    def test_days_limits_archived_jobs_too(self):
+        page = self.client.get('/api/image-jobs/', {'days': 30}).json()
+        self.assertEqual([job['prompt'] for job in page['results']], ['hot 1', 'archived 2', 'hot 3', 'hot 5'])
+        self.assertIsNone(page['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/image-jobs/', {'cursor': 'nope'}).status_code, 400)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('revalidator', password='unused-password')
+        self.client.force_authenticate(self.user)
+
+    def assertRevalidates(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_job_etag_changes_when_its_thread_is_detached(self):
+        thread = ChatThread.objects.create(user=self.user, title='t')
+        job = ImageJob.objects.create(user=self.user, thread=thread, provider='local', model='local-v1', prompt='p')
+        self.assertRevalidates(
+            f"/api/image-jobs/{job.pk}/", lambda: ImageJob.objects.filter(pk=job.pk).update(thread=None),
+        )
+
+    def test_payment_list_etag_changes_on_queryset_update(self):
+        PaymentTransaction.objects.create(
+            user=self.user, gateway='stripe', transaction_id='tx-etag', amount=5, credits_purchased=5,
+        )
+        self.assertRevalidates(
+            '/api/payments/', lambda: PaymentTransaction.objects.filter(user=self.user).update(status='failed'),
+        )
+
+
+class HistoryExportTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = User.objects.create_user('exporter', password='unused-password')
+        self.client.force_authenticate(self.user)
+        thread = ChatThread.objects.create(user=self.user, title='t')
+        for content in ('first', 'second'):
+            ChatMessage.objects.create(thread=thread, role='user', content=content)
+        self.job = ImageJob.objects.create(
+            user=self.user, thread=thread, provider='local', model='local-v1', prompt='p', status='completed',
+            output_images=[store_image_bytes(b'\x89PNG exported')],
+        )
+        stranger = User.objects.create_user('stranger', password='unused-password')
+        ImageJob.objects.create(user=stranger, provider='local', model='local-v1', prompt='not mine')
+
+    def ndjson(self, **params):
+        response = self.client.get('/api/me/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return [loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_ndjson_export_resumes_after_the_last_cursor(self):
+        records = self.ndjson()
+        self.assertEqual([record['type'] for record in records], ['threads', 'messages', 'messages', 'image_jobs', 'end'])
+        self.assertEqual(records[-1]['counts']['image_jobs'], 1)
+        resumed = self.ndjson(cursor=records[1]['cursor'])
+        self.assertEqual(resumed[:-1], records[2:-1])
+
+    def test_zip_export_bundles_stored_images(self):
+        response = self.client.get('/api/me/export/', {'output': 'zip'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        [job] = [loads(line) for line in archive.read('image_jobs.ndjson').splitlines()]
+        self.assertEqual(job['output_images'], [f"images/{self.job.pk}-output-0.png"])
+        self.assertEqual(archive.read(job['output_images'][0]), b'\x89PNG exported')
+        self.assertEqual(loads(archive.read('manifest.json'))['missing_images'], [])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/me/export/', {'cursor': 'images:1'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/me/export/', {'output': 'zip', 'cursor': 'messages:1'}).status_code, 400)
+
+
+class CompressionTests(APITestCase):
+    body = b'{"prompt": "%s"}' % (b'a lighthouse at dusk ' * 200)
+
+    def compress(self, accept_encoding, response=None, **headers):
+        if response is None:
+            response = HttpResponse(self.body, content_type='application/json', headers=headers)
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/api/me/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_best_accepted_encoding_is_chosen(self):
+        for accept_encoding, expected in (('gzip, br', 'br'), ('gzip;q=1, br;q=0.5', 'gzip'), ('*', 'zstd'), ('identity', None)):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.compress(accept_encoding)
+                self.assertEqual(response.get('Content-Encoding'), expected)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(self.compress('gzip').content), self.body)
+
+    def test_strong_etag_is_weakened_and_html_is_left_alone(self):
+        self.assertEqual(self.compress('gzip', ETag='"v1"')['ETag'], 'W/"v1"')
+        html = HttpResponse(self.body, content_type='text/html')
+        self.assertFalse(self.compress('gzip', response=html).has_header('Content-Encoding'))
+
+    def test_streaming_bodies_are_gzipped_incrementally(self):
+        chunks = [self.body[:100], self.body[100:]]
+        response = self.compress('br, gzip', response=StreamingHttpResponse(iter(chunks), content_type='application/x-ndjson'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+
+class RetentionStorageErrorTests(APITestCase):
+    def setUp(self):
+        media, cold = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        for directory in (media, cold):
+            self.addCleanup(directory.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, COLD_STORAGE_ROOT=cold.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cold_storage.cache_clear()
+        self.addCleanup(cold_storage.cache_clear)
+
+        user = User.objects.create_user('keeper', password='unused-password')
+        self.jobs = []
+        for prompt in ('fails', 'tiers'):
+            job = ImageJob.objects.create(
+                user=user, provider='local', model='local-v1', prompt=prompt, status='completed',
+                output_images=[store_image_bytes(b'\x89PNG' + prompt.encode())],
+            )
+            ImageJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(days=30))
+            self.jobs.append(job)
+
+    def test_job_hitting_a_storage_error_stays_hot_and_is_retried(self):
+        failing, tiering = self.jobs
+
+        def flaky_freeze(name, prefix):
+            if f"jobs/{failing.pk}/" in prefix:
+                raise OSError('bucket unavailable')
+            return freeze_stored_image(name, prefix)
+
+        with mock.patch('api.retention.freeze_stored_image', side_effect=flaky_freeze):
+            results = apply_retention()
+        self.assertEqual((results['free']['tiered_jobs'], results['free']['deferred_jobs']), (1, 1))
+
+        failing.refresh_from_db()
+        tiering.refresh_from_db()
+        self.assertEqual(failing.storage_tier, 'hot')
+        self.assertTrue(default_storage.exists(stored_image_name(failing.output_images[0])))
+        self.assertEqual(tiering.storage_tier, 'cold')
+        self.assertTrue(tiering.output_images[0].startswith('cold://'))
+
+        results = apply_retention()
+        failing.refresh_from_db()
+        self.assertEqual((results['free']['tiered_jobs'], results['free']['deferred_jobs']), (1, 0))
+        self.assertEqual(failing.storage_tier, 'cold')
+
+
+class ImportBudgetTests(APITestCase):
+    def test_provider_sdks_and_pillow_stay_out_of_startup(self):
+        call_command('check_import_budget', budget_ms=60000, runs=1, stdout=io.StringIO())
+
+    @override_settings(IMPORT_TIME_LAZY_MODULES=['django.urls'])
+    def test_eager_import_of_a_lazy_module_fails(self):
+        with self.assertRaisesMessage(CommandError, 'django.urls'):
+            call_command('check_import_budget', budget_ms=60000, runs=1, stdout=io.StringIO())
+
+
+HEDGE_ROUTING = {
+    'CANDIDATES': [
+        {'provider': 'openai', 'model': 'dall-e-3', 'cost': 0.040},
+        {'provider': 'gemini', 'model': 'gemini-2.5-flash-image-preview', 'cost': 0.039},
+        {'provider': 'openai', 'model': 'dall-e-2', 'cost': 0.020},
+    ],
+    'COST_BUDGET': None, 'WINDOW': 200, 'MIN_SAMPLES': 1000,
+}
+
+
+@override_settings(
+    PROVIDER_ROUTING=HEDGE_ROUTING,
+    IMAGE_HEDGING={**settings.IMAGE_HEDGING, 'ENABLED': True, 'DEFAULT_DELAY': 0.2, 'MIN_DELAY': 0.0},
+)
+class HedgingTests(APITransactionTestCase):
+    """Provider calls are faked; each returns a stored image URL named after its model"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('hedger', password='unused-password')
+        self.job = ImageJob.objects.create(user=self.user, provider='openai', model='dall-e-3', prompt='p')
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.called = []
+        patcher = mock.patch('api.image_pipeline.select_service', side_effect=lambda provider: SimpleNamespace(model='dall-e-3'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_call(self, slow_model):
+        def call(provider, service, job):
+            self.called.append(service.model)
+            if service.model == slow_model:
+                self.release.wait(5)
+            return [urljoin(settings.BACKEND_URL, default_storage.url(f"generated/{service.model}.png"))]
+        return call
+
+    def test_explicit_provider_hedges_within_that_provider_and_orphans_the_loser(self):
+        with mock.patch('api.image_pipeline._call_provider', side_effect=self.fake_call('dall-e-3')):
+            images = generate_images(self.job)
+            self.release.set()
+            deadline = time.monotonic() + 5
+            while not OrphanedBlob.objects.exists() and time.monotonic() < deadline:
+                time.sleep(0.02)
+        self.assertEqual(self.called, ['dall-e-3', 'dall-e-2'])
+        self.assertEqual((self.job.provider, self.job.model), ('openai', 'dall-e-2'))
+        self.assertTrue(images[0].endswith('generated/dall-e-2.png'))
+        self.assertEqual(list(OrphanedBlob.objects.values_list('name', flat=True)), ['generated/dall-e-3.png'])
+
+    def test_time_queued_behind_a_busy_pool_does_not_trigger_a_hedge(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        pool.submit(time.sleep, 0.4)
+        with mock.patch('api.image_pipeline._hedge_pool', pool), \
+                mock.patch('api.image_pipeline._call_provider', side_effect=self.fake_call(slow_model=None)):
+            generate_images(self.job)
+        self.assertEqual(self.called, ['dall-e-3'])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class PasswordResetEmailTests(APITestCase):
+    def test_reset_email_is_queued_not_sent_inline(self):
+        user = User.objects.create_user('forgetful', 'forgetful@example.com', 'unused-password')
+        for address in ('forgetful@example.com', 'nobody@example.com'):
+            response = self.client.post('/api/auth/forgot-password/', {'email': address})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(list(OutboundEmail.objects.values_list('to_email', flat=True)), ['forgetful@example.com'])
+
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertIn(str(PasswordResetToken.objects.get(user=user).token), mail.outbox[0].body)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        self.email = queue_email('someone@example.com', 'Hello', 'Body')
+
+    def test_due_email_is_sent_once(self):
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertEqual(send_pending_emails(), (0, 0))
+        self.assertEqual([message.to for message in mail.outbox], [['someone@example.com']])
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('sent', 1))
+
+    def test_failed_sends_back_off_then_give_up(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('rejected')):
+            self.assertEqual(send_pending_emails(), (0, 1))
+            self.email.refresh_from_db()
+            self.assertEqual((self.email.status, self.email.attempts), ('pending', 1))
+            self.assertGreater(self.email.next_attempt_at, timezone.now())
+
+            OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(send_pending_emails(), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts, self.email.last_error), ('failed', 2, 'rejected'))
+
+    def test_connection_outage_does_not_use_up_attempts(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('no route')):
+            self.assertEqual(send_pending_emails(), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('pending', 0))
+
+    def test_email_claimed_by_another_worker_is_left_alone_until_its_lease_expires(self):
+        OutboundEmail.objects.filter(pk=self.email.pk).update(
+            status='sending', next_attempt_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(send_pending_emails(), (0, 0))
+        OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_file_backend_writes_the_message(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend', EMAIL_FILE_PATH=directory):
+                self.assertEqual(send_pending_emails(), (1, 0))
+            [name] = os.listdir(directory)
+            with open(os.path.join(directory, name)) as written:
+                self.assertIn('Subject: Hello', written.read())
+
+
+class BenchmarkBaselineTests(APITestCase):
+    baseline = {'image_jobs': {'queries_per_request': 2.0, 'p95_relative': 2.0}}
+
+    def result(self, **values):
+        return {'image_jobs': {'errors': 0, 'queries_per_request': 2.0, 'p95_relative': 2.0, **values}}
+
+    def test_extra_queries_and_errors_fail(self):
+        regressions, _ = compare_to_baseline(self.result(queries_per_request=3.0, errors=1), self.baseline, 0.5)
+        self.assertEqual(len(regressions), 2)
+
+    def test_relative_latency_drift_only_warns(self):
+        regressions, warnings = compare_to_baseline(self.result(p95_relative=4.0), self.baseline, 0.5)
+        self.assertEqual((regressions, len(warnings)), ([], 1))
+
+
+class MetricsAccessTests(APITestCase):
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_anonymous_scrape_is_refused_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        staff = User.objects.create_user('ops', 'ops@example.com', 'pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+
+class RendererParityTests(APITestCase):
+    payload = {
+        'when': datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+        'naive': datetime(2026, 1, 2, 3, 4, 5, 6),
+        'day': date(2026, 1, 2),
+        'elapsed': timedelta(seconds=90),
+        'amount': Decimal('12.50'),
+        'id': uuid.UUID(int=7),
+        'label': gettext_lazy('Pending'),
+        'text': 'na\u00efve\u2028line',
+        'nested': [{1: True, 'none': None}, (1.5, 'x')],
+    }
+
+    def test_matches_drf_output(self):
+        for media_type in ('application/json', 'application/json; indent=2', 'application/json; indent=4'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(
+                    FastJSONRenderer().render(self.payload, media_type),
+                    JSONRenderer().render(self.payload, media_type),
+                )
+
+    def test_serialized_job_matches_drf_output(self):
+        user = User.objects.create_user('renderer', password='unused-password')
+        ImageJob.objects.create(user=user, provider='local', model='local-v1', prompt='p', completed_at=timezone.now())
+        data = ImageJobSerializer(ImageJob.objects.all(), many=True).data
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
@@ -1,6 +1,9 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views
+from . import (
+    views, analytics_views, export_views, ops_views, retention_views, search_views, payment_views, webhook_views,
+    password_reset_views, social_auth_views,
+)
 
 urlpatterns = [
     # Authentication
@@ -9,17 +12,18 @@ urlpatterns = [
     path('auth/refresh/', TokenRefreshView.as_view(), name='refresh'),
     
     # Password Reset
-    path('auth/forgot-password/', views.ForgotPasswordView.as_view(), name='forgot_password'),
-    path('auth/reset-password/', views.ResetPasswordView.as_view(), name='reset_password'),
-    path('auth/verify-reset-token/<uuid:token>/', views.VerifyResetTokenView.as_view(), name='verify_reset_token'),
+    path('auth/forgot-password/', password_reset_views.ForgotPasswordView.as_view(), name='forgot_password'),
+    path('auth/reset-password/', password_reset_views.ResetPasswordView.as_view(), name='reset_password'),
+    path('auth/verify-reset-token/<uuid:token>/', password_reset_views.VerifyResetTokenView.as_view(), name='verify_reset_token'),
     
     # Social Auth
-    path('social/urls/', views.SocialLoginUrlsView.as_view(), name='social_login_urls'),
-    path('social/callback/', views.SocialLoginCallbackView.as_view(), name='social_login_callback'),
+    path('social/urls/', social_auth_views.SocialLoginUrlsView.as_view(), name='social_login_urls'),
+    path('social/callback/', social_auth_views.SocialLoginCallbackView.as_view(), name='social_login_callback'),
     
     # User Profile
     path('me/', views.MeView.as_view(), name='me'),
     path('me/credits/add/', views.AddCreditsView.as_view(), name='add_credits'),
+    path('me/export/', export_views.HistoryExportView.as_view(), name='history_export'),
     
     # Chat/History
     path('chat/threads/', views.ChatThreadListCreateView.as_view(), name='chat_threads'),
@@ -29,17 +33,31 @@ urlpatterns = [
     # Image Jobs
     path('image-jobs/', views.ImageJobListCreateView.as_view(), name='image_jobs'),
     path('image-jobs/<int:job_id>/', views.ImageJobDetailView.as_view(), name='image_job_detail'),
+    path('cold-images/<str:token>/', retention_views.cold_image_view, name='cold_image'),
+
+    # Search
+    path('search/images/', search_views.ImageJobSearchView.as_view(), name='search_images'),
+    path('search/messages/', search_views.ChatMessageSearchView.as_view(), name='search_messages'),
     
     # Payments
-    path('payments/', views.PaymentTransactionListView.as_view(), name='payment_list'),
-    path('payments/create/', views.CreatePaymentView.as_view(), name='create_payment'),
-    path('payments/verify/', views.VerifyPaymentView.as_view(), name='verify_payment'),
-    path('payments/<str:transaction_id>/', views.PaymentTransactionDetailView.as_view(), name='payment_detail'),
+    path('payments/', payment_views.PaymentTransactionListView.as_view(), name='payment_list'),
+    path('payments/create/', payment_views.CreatePaymentView.as_view(), name='create_payment'),
+    path('payments/verify/', payment_views.VerifyPaymentView.as_view(), name='verify_payment'),
+    path('payments/<str:transaction_id>/', payment_views.PaymentTransactionDetailView.as_view(), name='payment_detail'),
     
     # Payment Webhooks
-    path('webhooks/khalti/', views.KhaltiWebhookView.as_view(), name='khalti_webhook'),
-    path('webhooks/esewa/', views.ESewaWebhookView.as_view(), name='esewa_webhook'),
-    path('webhooks/stripe/', views.StripeWebhookView.as_view(), name='stripe_webhook'),
-    path('webhooks/razorpay/', views.RazorpayWebhookView.as_view(), name='razorpay_webhook'),
-    path('webhooks/binance/', views.BinanceWebhookView.as_view(), name='binance_webhook'),
+    path('webhooks/khalti/', webhook_views.KhaltiWebhookView.as_view(), name='khalti_webhook'),
+    path('webhooks/esewa/', webhook_views.ESewaWebhookView.as_view(), name='esewa_webhook'),
+    path('webhooks/stripe/', webhook_views.StripeWebhookView.as_view(), name='stripe_webhook'),
+    path('webhooks/razorpay/', webhook_views.RazorpayWebhookView.as_view(), name='razorpay_webhook'),
+    path('webhooks/binance/', webhook_views.BinanceWebhookView.as_view(), name='binance_webhook'),
+    
+    # Analytics
+    path('analytics/usage/', analytics_views.UsageAnalyticsView.as_view(), name='analytics_usage'),
+    path('analytics/revenue/', analytics_views.RevenueAnalyticsView.as_view(), name='analytics_revenue'),
+
+    # Operations (staff only)
+    path('ops/providers/', ops_views.ProviderRoutingStatsView.as_view(), name='ops_providers'),
+    path('ops/database/', ops_views.DatabasePoolStatsView.as_view(), name='ops_database'),
+    path('ops/queue/', ops_views.ImageQueueStatsView.as_view(), name='ops_queue'),
 ]
@@ -1,10 +1,18 @@
+import base64
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse
 from .models import Profile, ChatThread, ChatMessage, ImageJob
 from .serializers import (
     RegisterSerializer,
@@ -13,22 +21,17 @@ from .serializers import (
     ChatMessageSerializer,
     ImageJobSerializer,
 )
-from .services import select_service
-
-# Import webhook views with correct class names
-from .webhook_views import (
-    KhaltiWebhookView,
-    ESewaWebhookView,  # Fixed: capital E
-    StripeWebhookView,
-    RazorpayWebhookView,
-    BinanceWebhookView,
-)
-from .payment_views import (
-    PaymentTransactionListView,
-    CreatePaymentView,
-    VerifyPaymentView,
-    PaymentTransactionDetailView,
-)
+from .deletion import request_thread_deletion, request_user_deletion
+from .http_caching import make_etag, not_modified, set_validators
+from .job_queue import run_image_job
+from .plans import priority_class
+from .retention import archived_image_jobs, archived_messages, find_archived_image_job
+
+
+class InsufficientCredits(APIException):
+    status_code = status.HTTP_402_PAYMENT_REQUIRED
+    default_detail = 'Insufficient credits'
+    default_code = 'insufficient_credits'
 
 
 @extend_schema(tags=['Auth'], summary='Register a new user', responses={201: OpenApiResponse(description='User created')})
@@ -41,14 +44,24 @@ class RegisterView(generics.CreateAPIView):
         return user
 
 
-@extend_schema(tags=['Auth'], summary='Get current user profile', responses={200: UserSerializer})
-class MeView(generics.RetrieveAPIView):
+@extend_schema_view(
+    get=extend_schema(tags=['Auth'], summary='Get current user profile', responses={200: UserSerializer}),
+    delete=extend_schema(
+        tags=['Auth'], summary='Delete your account',
+        responses={202: OpenApiResponse(description='Account deactivated; data is removed in the background')},
+    ),
+)
+class MeView(generics.RetrieveDestroyAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         return self.request.user
 
+    def destroy(self, request, *args, **kwargs):
+        deletion = request_user_deletion(request.user)
+        return Response({'status': 'scheduled', 'deletion_id': deletion.pk}, status=status.HTTP_202_ACCEPTED)
+
 
 @extend_schema(tags=['Credits'], summary='Add credits to user account', responses={200: OpenApiResponse(description='Credits added')})
 class AddCreditsView(APIView):
@@ -61,9 +74,11 @@ class AddCreditsView(APIView):
             if amount <= 0:
                 return Response({'error': 'Amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
             
-            profile = request.user.profile
-            profile.credits += amount
-            profile.save()
+            with transaction.atomic():
+                # Lock a fresh row; request.user.profile may come from the auth cache
+                profile = Profile.objects.select_for_update().get(user=request.user)
+                profile.credits += amount
+                profile.save(update_fields=['credits'])
             
             return Response({
                 'message': f'Added {amount} credits',
@@ -79,19 +94,43 @@ class ChatThreadListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ChatThread.objects.filter(user=self.request.user).order_by('-updated_at')
+        return ChatThread.objects.live().filter(user=self.request.user).order_by('-updated_at')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-@extend_schema(tags=['Chat'], summary='Get chat thread details', responses={200: ChatThreadSerializer})
-class ChatThreadDetailView(generics.RetrieveAPIView):
+@extend_schema_view(
+    get=extend_schema(tags=['Chat'], summary='Get chat thread details', responses={200: ChatThreadSerializer}),
+    delete=extend_schema(
+        tags=['Chat'], summary='Delete chat thread',
+        responses={202: OpenApiResponse(description='Thread hidden; messages are removed in the background')},
+    ),
+)
+class ChatThreadDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = ChatThreadSerializer
     permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = 'thread_id'
 
     def get_queryset(self):
-        return ChatThread.objects.filter(user=self.request.user)
+        return ChatThread.objects.live().filter(user=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        deletion = request_thread_deletion(self.get_object())
+        return Response({'status': 'scheduled', 'deletion_id': deletion.pk}, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, *args, **kwargs):
+        thread = self.get_object()
+        etag = make_etag('thread', thread.pk, thread.updated_at)
+        cached = not_modified(request, etag, thread.updated_at)
+        if cached is not None:
+            return cached
+        data = self.get_serializer(thread).data
+        # Messages of idle threads may have been archived; they are older than any live ones
+        archived = archived_messages(thread)
+        if archived:
+            data['messages'] = ChatMessageSerializer(archived, many=True).data + data['messages']
+        return set_validators(Response(data), etag, thread.updated_at)
 
 
 @extend_schema(tags=['Chat'], summary='Add message to chat thread', responses={201: OpenApiResponse(description='Message added')})
@@ -101,75 +140,133 @@ class ChatMessageCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         thread_id = self.kwargs['thread_id']
-        thread = get_object_or_404(ChatThread, id=thread_id, user=self.request.user)
+        thread = get_object_or_404(ChatThread.objects.live(), id=thread_id, user=self.request.user)
         serializer.save(thread=thread)
+        thread.touch()
+
+
+def created_since(request):
+    """Lower bound from the optional `?days=N` query parameter"""
+    days = request.query_params.get('days')
+    if not days:
+        return None
+    if not days.isdigit() or int(days) < 1:
+        raise ValidationError({'days': 'Must be a positive integer.'})
+    return timezone.now() - timedelta(days=int(days))
+
+
+def encode_job_cursor(job: ImageJob) -> str:
+    return base64.urlsafe_b64encode(f"{job.created_at.isoformat()} {job.pk}".encode()).decode()
+
+
+def decode_job_cursor(request):
+    """(created_at, id) keyset position from the optional `?cursor=` query parameter"""
+    cursor = request.query_params.get('cursor')
+    if not cursor:
+        return None
+    try:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(' ')
+        return datetime.fromisoformat(created_at), int(job_id)
+    except ValueError:
+        raise ValidationError({'cursor': 'Invalid cursor.'})
 
 
-@extend_schema(tags=['Images'], summary='List and create image generation jobs', responses={200: ImageJobSerializer(many=True)})
+@extend_schema(
+    tags=['Images'],
+    summary='List and create image generation jobs',
+    parameters=[
+        OpenApiParameter('days', int, description='Only jobs created in the last N days'),
+        OpenApiParameter('cursor', str, description='Opaque position from the previous page\'s `next` link'),
+    ],
+    responses={200: OpenApiResponse(description='A page of jobs, newest first (archived ones included), and the `next` page URL')},
+)
 class ImageJobListCreateView(generics.ListCreateAPIView):
     serializer_class = ImageJobSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ImageJob.objects.filter(user=self.request.user).order_by('-created_at')
+        return ImageJob.objects.for_user(self.request.user, since=created_since(self.request)).order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        page_size = settings.IMAGE_JOB_PAGE_SIZE
+        before = decode_job_cursor(request)
+        jobs = self.get_queryset()
+        if before is not None:
+            jobs = jobs.filter(Q(created_at__lt=before[0]) | Q(created_at=before[0], id__lt=before[1]))
+        # Archived jobs are rehydrated read-only and merged in, like archived thread messages. Each
+        # side contributes at most one page, so a request never loads more than two pages of rows.
+        archived = archived_image_jobs(request.user, since=created_since(request), before=before, limit=page_size + 1)
+        merged = sorted(list(jobs[:page_size + 1]) + archived, key=lambda job: (job.created_at, job.pk), reverse=True)
+        page = merged[:page_size]
+        next_url = None
+        if len(merged) > page_size:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_job_cursor(page[-1]))
+        return Response({'next': next_url, 'results': self.get_serializer(page, many=True).data})
 
     def perform_create(self, serializer):
-        # Check if user has enough credits
-        profile = self.request.user.profile
-        if profile.credits < 1:
-            return Response({'error': 'Insufficient credits'}, status=status.HTTP_402_PAYMENT_REQUIRED)
-        
-        # Deduct credits
-        profile.credits -= 1
-        profile.save()
-        
-        # Create the job
-        job = serializer.save(user=self.request.user, status='pending', credits_spent=1)
-        
-        # Generate images asynchronously (in a real app, use Celery)
-        try:
-            service = select_service(job.provider)
-            images = service.generate(job.prompt, job.input_images)
-            job.output_images = images
-            job.status = 'completed'
-            job.completed_at = timezone.now()
-            job.save()
+        # One credit per requested image
+        cost = serializer.validated_data.get('num_images', 1)
+        with transaction.atomic():
+            # Check if user has enough credits (fresh, locked row rather than the cached profile)
+            profile = Profile.objects.select_for_update().get(user=self.request.user)
+            if profile.credits < cost:
+                raise InsufficientCredits()
             
-            # Add message to thread if specified
-            if job.thread:
-                thread = job.thread
-                ChatMessage.objects.create(
-                    thread=thread,
-                    role='user',
-                    content=f"Generate image: {job.prompt}"
-                )
-                ChatMessage.objects.create(
-                    thread=thread,
-                    role='assistant',
-                    content=f"Generated {len(images)} image(s) using {job.provider} {job.model}"
-                )
-                
-        except Exception as e:
-            job.status = 'failed'
-            job.save()
-            # Refund credits on failure
-            profile.credits += 1
-            profile.save()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Deduct credits
+            profile.credits -= cost
+            profile.save(update_fields=['credits'])
+        
+        # Create the job; queued jobs wait for a process_image_jobs worker
+        queued = settings.IMAGE_JOB_QUEUE['ASYNC']
+        job = serializer.save(
+            user=self.request.user,
+            status='pending' if queued else 'processing',
+            started_at=None if queued else timezone.now(),
+            credits_spent=cost,
+            priority=priority_class(self.request.user),
+        )
+        if not queued:
+            run_image_job(job)
 
 
 @extend_schema(tags=['Images'], summary='Get image job details', responses={200: ImageJobSerializer})
 class ImageJobDetailView(generics.RetrieveAPIView):
     serializer_class = ImageJobSerializer
     permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = 'job_id'
 
     def get_queryset(self):
         return ImageJob.objects.filter(user=self.request.user)
 
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Served read-only from the archive table
+            job = find_archived_image_job(self.request.user, self.kwargs['job_id'])
+            if job is None:
+                raise
+            return job
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        last_modified = job.completed_at or job.created_at
+        parts = ['job', job.pk, job.status, job.storage_tier, job.thread_id, job.completed_at, job.credits_spent]
+        if job.storage_tier == 'cold':
+            # Signed cold-image URLs expire, so let clients pick up fresh ones well before that;
+            # Last-Modified alone could not express this and is left out
+            parts.append(int(time.time()) // max(settings.COLD_IMAGE_URL_MAX_AGE // 2, 1))
+            last_modified = None
+        etag = make_etag(*parts)
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+        return set_validators(Response(self.get_serializer(job).data), etag, last_modified)
+
 
 def build_thread_context(thread: ChatThread) -> str:
     """Build context string from chat thread history"""
-    messages = thread.messages.all().order_by('created_at')
+    messages = ChatMessage.objects.for_thread(thread).order_by('created_at')
     context_parts = []
     
     for msg in messages:
@@ -177,16 +274,3 @@ def build_thread_context(thread: ChatThread) -> str:
         context_parts.append(f"{role}: {msg.content}")
     
     return "\n".join(context_parts)
-
-# Import password reset views
-from .password_reset_views import (
-    ForgotPasswordView,
-    ResetPasswordView,
-    VerifyResetTokenView,
-)
-
-# Import social auth views
-from .social_auth_views import (
-    SocialLoginUrlsView,
-    SocialLoginCallbackView,
-)
@@ -1,6 +1,4 @@
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from django.utils import timezone
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -8,10 +6,11 @@ from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import json
 import logging
-from .models import PaymentTransaction, Profile
+from .models import PaymentTransaction
 from .payment_services import get_payment_service
+from .payment_views import complete_payment
+from .renderers import loads
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +21,7 @@ class KhaltiWebhookView(APIView):
     
     def post(self, request):
         try:
-            data = json.loads(request.body)
+            data = loads(request.body)
             transaction_id = data.get('transaction_id')
             status = data.get('status')
             
@@ -35,6 +34,9 @@ class KhaltiWebhookView(APIView):
                 transaction_id=transaction_id,
                 gateway='khalti'
             )
+            # Gateways redeliver webhooks; a completed payment is never re-credited or re-failed
+            if payment_transaction.status == 'completed':
+                return Response({'status': 'already_processed'})
             
             if status == 'completed':
                 # Verify with Khalti service
@@ -42,15 +44,8 @@ class KhaltiWebhookView(APIView):
                 is_verified, verification_data = service.verify_payment(transaction_id, data)
                 
                 if is_verified:
-                    with transaction.atomic():
-                        profile = payment_transaction.user.profile
-                        profile.credits += payment_transaction.credits_purchased
-                        profile.save(update_fields=['credits'])
-                        
-                        payment_transaction.status = 'completed'
-                        payment_transaction.completed_at = timezone.now()
-                        payment_transaction.gateway_data.update(verification_data)
-                        payment_transaction.save()
+                    if complete_payment(payment_transaction, verification_data) is None:
+                        return Response({'status': 'already_processed'})
                     
                     logger.info(f"Khalti payment completed: {transaction_id}")
                     return Response({'status': 'success'})
@@ -75,7 +70,7 @@ class ESewaWebhookView(APIView):
     
     def post(self, request):
         try:
-            data = json.loads(request.body)
+            data = loads(request.body)
             transaction_id = data.get('transaction_id')
             status = data.get('status')
             
@@ -87,21 +82,16 @@ class ESewaWebhookView(APIView):
                 transaction_id=transaction_id,
                 gateway='esewa'
             )
+            if payment_transaction.status == 'completed':
+                return Response({'status': 'already_processed'})
             
             if status == 'completed':
                 service = get_payment_service('esewa')
                 is_verified, verification_data = service.verify_payment(transaction_id, data)
                 
                 if is_verified:
-                    with transaction.atomic():
-                        profile = payment_transaction.user.profile
-                        profile.credits += payment_transaction.credits_purchased
-                        profile.save(update_fields=['credits'])
-                        
-                        payment_transaction.status = 'completed'
-                        payment_transaction.completed_at = timezone.now()
-                        payment_transaction.gateway_data.update(verification_data)
-                        payment_transaction.save()
+                    if complete_payment(payment_transaction, verification_data) is None:
+                        return Response({'status': 'already_processed'})
                     
                     return Response({'status': 'success'})
                 else:
@@ -124,7 +114,7 @@ class StripeWebhookView(APIView):
     
     def post(self, request):
         try:
-            data = json.loads(request.body)
+            data = loads(request.body)
             event_type = data.get('type')
             
             if event_type == 'payment_intent.succeeded':
@@ -137,19 +127,15 @@ class StripeWebhookView(APIView):
                         transaction_id=transaction_id,
                         gateway='stripe'
                     )
+                    if payment_transaction.status == 'completed':
+                        return Response({'status': 'already_processed'})
                     
-                    with transaction.atomic():
-                        profile = payment_transaction.user.profile
-                        profile.credits += payment_transaction.credits_purchased
-                        profile.save(update_fields=['credits'])
-                        
-                        payment_transaction.status = 'completed'
-                        payment_transaction.completed_at = timezone.now()
-                        payment_transaction.gateway_data.update({
-                            'stripe_payment_intent_id': payment_intent.get('id'),
-                            'webhook_data': data
-                        })
-                        payment_transaction.save()
+                    gateway_data = {
+                        'stripe_payment_intent_id': payment_intent.get('id'),
+                        'webhook_data': data
+                    }
+                    if complete_payment(payment_transaction, gateway_data) is None:
+                        return Response({'status': 'already_processed'})
                     
                     return Response({'status': 'success'})
             
@@ -166,7 +152,7 @@ class RazorpayWebhookView(APIView):
     
     def post(self, request):
         try:
-            data = json.loads(request.body)
+            data = loads(request.body)
             event = data.get('event')
             
             if event == 'payment.captured':
@@ -179,19 +165,15 @@ class RazorpayWebhookView(APIView):
                         transaction_id=transaction_id,
                         gateway='razorpay'
                     )
+                    if payment_transaction.status == 'completed':
+                        return Response({'status': 'already_processed'})
                     
-                    with transaction.atomic():
-                        profile = payment_transaction.user.profile
-                        profile.credits += payment_transaction.credits_purchased
-                        profile.save(update_fields=['credits'])
-                        
-                        payment_transaction.status = 'completed'
-                        payment_transaction.completed_at = timezone.now()
-                        payment_transaction.gateway_data.update({
-                            'razorpay_payment_id': payment.get('id'),
-                            'webhook_data': data
-                        })
-                        payment_transaction.save()
+                    gateway_data = {
+                        'razorpay_payment_id': payment.get('id'),
+                        'webhook_data': data
+                    }
+                    if complete_payment(payment_transaction, gateway_data) is None:
+                        return Response({'status': 'already_processed'})
                     
                     return Response({'status': 'success'})
             
@@ -208,7 +190,7 @@ class BinanceWebhookView(APIView):
     
     def post(self, request):
         try:
-            data = json.loads(request.body)
+            data = loads(request.body)
             status = data.get('status')
             transaction_id = data.get('transaction_id')
             
@@ -218,16 +200,11 @@ class BinanceWebhookView(APIView):
                     transaction_id=transaction_id,
                     gateway='binance'
                 )
+                if payment_transaction.status == 'completed':
+                    return Response({'status': 'already_processed'})
                 
-                with transaction.atomic():
-                    profile = payment_transaction.user.profile
-                    profile.credits += payment_transaction.credits_purchased
-                    profile.save(update_fields=['credits'])
-                    
-                    payment_transaction.status = 'completed'
-                    payment_transaction.completed_at = timezone.now()
-                    payment_transaction.gateway_data.update(data)
-                    payment_transaction.save()
+                if complete_payment(payment_transaction, data) is None:
+                    return Response({'status': 'already_processed'})
                 
                 return Response({'status': 'success'})
             
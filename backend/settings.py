@@ -50,11 +50,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
 	'django.middleware.security.SecurityMiddleware',
+	'api.middleware.CompressionMiddleware',
 	'corsheaders.middleware.CorsMiddleware',
 	'django.contrib.sessions.middleware.SessionMiddleware',
 	'django.middleware.common.CommonMiddleware',
 	'django.middleware.csrf.CsrfViewMiddleware',
 	'django.contrib.auth.middleware.AuthenticationMiddleware',
+	'api.middleware.RequestMetricsMiddleware',
+	'api.middleware.ReplicaRoutingMiddleware',
 	'django.contrib.messages.middleware.MessageMiddleware',
 	'django.middleware.clickjacking.XFrameOptionsMiddleware',
 	'allauth.account.middleware.AccountMiddleware',
@@ -103,6 +106,37 @@ if env.bool('USE_SQLITE', default=False):
         }
     }
 
+# Optional read replica for GET/HEAD requests: a second Postgres server, or with USE_SQLITE a copy of
+# the database file. Tests mirror it to the default database.
+if env('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif env.bool('USE_SQLITE', default=False) and env('DB_REPLICA_SQLITE_PATH', default=''):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env('DB_REPLICA_SQLITE_PATH'),
+        'TEST': {'MIRROR': 'default'},
+    }
+if 'replica' in DATABASES:
+    DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+# Seconds a client keeps reading from the primary after its own write
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
+
+# Cache
+# Use a shared cache in production so invalidations reach every worker, e.g. CACHE_URL=redis://localhost:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Seconds an authenticated user (and profile) is served from the cache by CachedJWTAuthentication
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -155,11 +189,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+# FastJSONRenderer/FastJSONParser use orjson when it is installed; set False to force the stdlib json path
+FAST_JSON = env.bool('FAST_JSON', default=True)
+
+# Response compression (api.middleware.CompressionMiddleware). zstd and br are used when the
+# optional `zstandard` / `brotli` packages are installed; gzip always is. HTML is never compressed
+# so pages that reflect user input and carry CSRF tokens are not exposed to BREACH.
+COMPRESSION = {
+    'MIN_SIZE': env.int('COMPRESSION_MIN_SIZE', default=1024),
+    'GZIP_LEVEL': env.int('COMPRESSION_GZIP_LEVEL', default=6),
+    'BROTLI_QUALITY': env.int('COMPRESSION_BROTLI_QUALITY', default=5),
+    'ZSTD_LEVEL': env.int('COMPRESSION_ZSTD_LEVEL', default=3),
+    'CONTENT_TYPES': [
+        'application/json',
+        'application/x-ndjson',
+        'application/vnd.oai.openapi',
+        'application/vnd.oai.openapi+json',
+        'application/yaml',
+        'text/plain',
+        'text/csv',
+    ],
+}
+
+# Admin changelists: tables with at least this many rows (planner estimate, PostgreSQL) show an
+# estimated total instead of running COUNT(*); filtered lists count at most ADMIN_COUNT_LIMIT rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000)
+ADMIN_COUNT_LIMIT = env.int('ADMIN_COUNT_LIMIT', default=10000)
+# Latest messages shown inline on a chat thread's admin page
+ADMIN_INLINE_LIMIT = env.int('ADMIN_INLINE_LIMIT', default=20)
+
+# History export (api/exports.py): rows fetched per database round trip. Image jobs can carry
+# inline base64 images, so they are read in smaller chunks.
+EXPORT = {
+    'CHUNK_SIZE': env.int('EXPORT_CHUNK_SIZE', default=500),
+    'JOB_CHUNK_SIZE': env.int('EXPORT_JOB_CHUNK_SIZE', default=20),
+}
+
+# Background deletion of threads and accounts (api/deletion.py): rows per DELETE batch, optional
+# pause between batches (seconds), when a 'running' request counts as abandoned, and retries
+DELETION = {
+    'BATCH_SIZE': env.int('DELETION_BATCH_SIZE', default=1000),
+    'PAUSE': env.float('DELETION_PAUSE', default=0.0),
+    'STALE_AFTER': env.int('DELETION_STALE_AFTER', default=600),
+    'MAX_ATTEMPTS': env.int('DELETION_MAX_ATTEMPTS', default=5),
 }
 
+# Full-text search over prompts and chat history (api/search.py)
+SEARCH_PAGE_SIZE = env.int('SEARCH_PAGE_SIZE', default=20)
+SEARCH_MAX_QUERY_LENGTH = env.int('SEARCH_MAX_QUERY_LENGTH', default=200)
+
 # Simple JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -174,6 +265,10 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
 }
+# The served schema is rebuilt only when the code version changes: set CODE_VERSION (e.g. the git sha)
+# at deploy time, otherwise a hash of the api/ and backend/ sources is used
+CODE_VERSION = env('CODE_VERSION', default='')
+SCHEMA_CACHE_DIR = env('SCHEMA_CACHE_DIR', default=str(BASE_DIR / 'schema_cache'))
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = env.bool('CORS_ALLOW_ALL_ORIGINS', default=True)
@@ -183,6 +278,107 @@ CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=['http://localho
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='')
 GEMINI_API_KEY = env('GEMINI_API_KEY', default='')
 
+# Image providers: extra name -> dotted service class path, merged into api.services.PROVIDERS
+IMAGE_PROVIDERS = {}
+
+# Images a single job may request (each costs one credit)
+MAX_IMAGES_PER_JOB = env.int('MAX_IMAGES_PER_JOB', default=4)
+IMAGE_FANOUT_MAX_WORKERS = env.int('IMAGE_FANOUT_MAX_WORKERS', default=16)
+
+# Generated images are written to default_storage under this prefix instead of inline base64
+GENERATED_IMAGES_DIR = env('GENERATED_IMAGES_DIR', default='generated')
+# Upper bound on decoded image bytes read for one job, across all of its Gemini calls
+GEMINI_MAX_JOB_BYTES = env.int('GEMINI_MAX_JOB_BYTES', default=64 * 1024 * 1024)
+
+# Input images are downscaled and re-encoded before upload (MAX_SIDE is used when a provider sets no max_input_side)
+IMAGE_PREPROCESSING = {
+    'MAX_SIDE': env.int('IMAGE_PREPROCESS_MAX_SIDE', default=2048),
+    'QUALITY': env.int('IMAGE_PREPROCESS_QUALITY', default=85),
+    'PASSTHROUGH_MIME_TYPES': ('image/jpeg', 'image/png', 'image/webp'),
+    'PASSTHROUGH_MAX_BYTES': env.int('IMAGE_PREPROCESS_PASSTHROUGH_MAX_BYTES', default=512 * 1024),
+    'CACHE_TIMEOUT': env.int('IMAGE_PREPROCESS_CACHE_TIMEOUT', default=3600),
+    'MAX_WORKERS': env.int('IMAGE_PREPROCESS_MAX_WORKERS', default=4),
+}
+
+# Routing for jobs created with provider='auto' (cost is USD per image)
+PROVIDER_ROUTING = {
+    'CANDIDATES': [
+        {'provider': 'openai', 'model': 'dall-e-3', 'cost': 0.040},
+        {'provider': 'gemini', 'model': 'gemini-2.5-flash-image-preview', 'cost': 0.039},
+    ],
+    'COST_BUDGET': env.float('PROVIDER_COST_BUDGET', default=None),  # Max USD per image, None = no limit
+    'WINDOW': env.int('PROVIDER_ROUTING_WINDOW', default=200),  # Recent calls kept per provider/model
+    'MIN_SAMPLES': env.int('PROVIDER_ROUTING_MIN_SAMPLES', default=20),  # Explore candidates until this many
+}
+
+# Hedged provider requests: if a call hasn't returned by its latency percentile, race a
+# backup provider/model and keep whichever answers first
+IMAGE_HEDGING = {
+    'ENABLED': env.bool('IMAGE_HEDGING_ENABLED', default=False),
+    'PERCENTILE': env.int('IMAGE_HEDGING_PERCENTILE', default=95),
+    'DEFAULT_DELAY': env.float('IMAGE_HEDGING_DEFAULT_DELAY', default=20.0),  # Seconds, until enough samples exist
+    'MIN_DELAY': env.float('IMAGE_HEDGING_MIN_DELAY', default=2.0),  # Seconds
+    'GLOBAL_BUDGET_PER_HOUR': env.int('IMAGE_HEDGING_GLOBAL_BUDGET_PER_HOUR', default=500),
+    'USER_BUDGET_PER_HOUR': env.int('IMAGE_HEDGING_USER_BUDGET_PER_HOUR', default=20),
+    'MAX_WORKERS': env.int('IMAGE_HEDGING_MAX_WORKERS', default=16),
+}
+
+# Retention: payloads of finished jobs move to cold storage, then jobs and idle threads' messages are archived
+RETENTION_POLICIES = {
+    'free': {
+        'COLD_AFTER_DAYS': env.int('RETENTION_FREE_COLD_AFTER_DAYS', default=14),
+        'ARCHIVE_AFTER_DAYS': env.int('RETENTION_FREE_ARCHIVE_AFTER_DAYS', default=90),
+    },
+    'paid': {
+        'COLD_AFTER_DAYS': env.int('RETENTION_PAID_COLD_AFTER_DAYS', default=60),
+        'ARCHIVE_AFTER_DAYS': env.int('RETENTION_PAID_ARCHIVE_AFTER_DAYS', default=365),
+    },
+}
+RETENTION_BATCH_SIZE = env.int('RETENTION_BATCH_SIZE', default=500)
+# Local directory standing in for an object-storage bucket
+COLD_STORAGE_ROOT = env('COLD_STORAGE_ROOT', default=str(BASE_DIR / 'cold_storage'))
+COLD_IMAGE_URL_MAX_AGE = env.int('COLD_IMAGE_URL_MAX_AGE', default=7 * 24 * 3600)
+# Page size of GET /api/image-jobs/, which merges hot and archived jobs
+IMAGE_JOB_PAGE_SIZE = env.int('IMAGE_JOB_PAGE_SIZE', default=50)
+
+# Image job queue. With IMAGE_JOBS_ASYNC the API only queues jobs and `process_image_jobs`
+# workers run them; otherwise generation happens inside the request as before.
+# CLASSES are in priority order: a user gets the first class whose PLAN matches and whose lifetime
+# credit purchases reach MIN_CREDITS_PURCHASED. While classes compete, each gets dispatches in
+# proportion to WEIGHT over FAIR_SHARE_WINDOW seconds; MAX_IN_FLIGHT caps one user's running jobs.
+IMAGE_JOB_QUEUE = {
+    'ASYNC': env.bool('IMAGE_JOBS_ASYNC', default=False),
+    'CLASSES': {
+        'enterprise': {
+            'PLAN': 'paid',
+            'MIN_CREDITS_PURCHASED': env.int('QUEUE_ENTERPRISE_MIN_CREDITS', default=5000),
+            'WEIGHT': env.int('QUEUE_ENTERPRISE_WEIGHT', default=8),
+            'MAX_IN_FLIGHT': env.int('QUEUE_ENTERPRISE_MAX_IN_FLIGHT', default=8),
+        },
+        'paid': {
+            'PLAN': 'paid',
+            'WEIGHT': env.int('QUEUE_PAID_WEIGHT', default=4),
+            'MAX_IN_FLIGHT': env.int('QUEUE_PAID_MAX_IN_FLIGHT', default=4),
+        },
+        'free': {
+            'PLAN': 'free',
+            'WEIGHT': env.int('QUEUE_FREE_WEIGHT', default=1),
+            'MAX_IN_FLIGHT': env.int('QUEUE_FREE_MAX_IN_FLIGHT', default=1),
+        },
+    },
+    'FAIR_SHARE_WINDOW': env.int('QUEUE_FAIR_SHARE_WINDOW', default=600),  # seconds
+    'STALE_AFTER': env.int('QUEUE_STALE_AFTER', default=900),  # seconds a job may stay processing
+}
+
+# Offline 'local' provider used for soak tests and CI
+LOCAL_IMAGE_PROVIDER = {
+    'MODEL': env('LOCAL_PROVIDER_MODEL', default='local-v1'),
+    'LATENCY_MS': tuple(env.list('LOCAL_PROVIDER_LATENCY_MS', cast=float, default=[0, 0])),  # min, max
+    'FAILURE_RATE': env.float('LOCAL_PROVIDER_FAILURE_RATE', default=0.0),
+    'SIZES': env.list('LOCAL_PROVIDER_SIZES', default=['256x256', '512x512']),
+    'SEED': env('LOCAL_PROVIDER_SEED', default='rupixai'),
+}
+
 # Payment Gateway API Keys
 KHALTI_SECRET_KEY = env('KHALTI_SECRET_KEY', default='')
 ESEWA_SECRET_KEY = env('ESEWA_SECRET_KEY', default='')
@@ -191,12 +387,20 @@ RAZORPAY_SECRET_KEY = env('RAZORPAY_SECRET_KEY', default='')
 BINANCE_API_KEY = env('BINANCE_API_KEY', default='')
 BINANCE_SECRET_KEY = env('BINANCE_SECRET_KEY', default='')
 
+# Payment gateways: extra name -> dotted service class path, merged into api.payment_services.GATEWAYS
+PAYMENT_GATEWAYS = {}
+
 # Frontend URL for password reset links
 FRONTEND_URL = env('FRONTEND_URL', default='http://localhost:3000')
 
+# Public backend URL, used to make stored media URLs absolute
+BACKEND_URL = env('BACKEND_URL', default='http://localhost:8000')
+
 # Email configuration (for password reset)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
-# EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  # For production
+# Use 'django.core.mail.backends.smtp.EmailBackend' in production; 'locmem' or 'filebased' work for tests
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = env('EMAIL_FILE_PATH', default=str(BASE_DIR / 'logs' / 'emails'))
+EMAIL_TIMEOUT = env.int('EMAIL_TIMEOUT', default=10)
 EMAIL_HOST = env('EMAIL_HOST', default='')
 EMAIL_PORT = env('EMAIL_PORT', default=587)
 EMAIL_USE_TLS = env('EMAIL_USE_TLS', default=True)
@@ -204,6 +408,13 @@ EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='noreply@rupixai.com')
 
+# Email outbox (delivered by `python manage.py send_queued_emails --loop`)
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6)
+EMAIL_OUTBOX_RETRY_BASE_DELAY = env.int('EMAIL_OUTBOX_RETRY_BASE_DELAY', default=30)  # seconds
+EMAIL_OUTBOX_MAX_RETRY_DELAY = env.int('EMAIL_OUTBOX_MAX_RETRY_DELAY', default=3600)  # seconds
+EMAIL_OUTBOX_SEND_LEASE = env.int('EMAIL_OUTBOX_SEND_LEASE', default=600)  # seconds a claimed email waits before another worker retries it
+
 # Django Allauth Configuration
 SITE_ID = 1
 
@@ -288,9 +499,34 @@ GITHUB_CLIENT_SECRET = env('GITHUB_CLIENT_SECRET', default='')
 TWITTER_CLIENT_ID = env('TWITTER_CLIENT_ID', default='')
 TWITTER_CLIENT_SECRET = env('TWITTER_CLIENT_SECRET', default='')
 
-# Database Connection Pooling (for production)
-if not DEBUG:
-    DATABASES['default']['CONN_MAX_AGE'] = 600
+# Database connections
+# Persistent connections are reused for DB_CONN_MAX_AGE seconds and checked before reuse.
+# DB_POOL=True switches PostgreSQL databases to psycopg 3's connection pool (Django then needs CONN_MAX_AGE=0).
+DB_POOL = env.bool('DB_POOL', default=False)
+for _db in DATABASES.values():
+    if DB_POOL and _db['ENGINE'] == 'django.db.backends.postgresql':
+        _db['CONN_MAX_AGE'] = 0
+        _db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),  # seconds to wait for a free connection
+            'max_idle': env.float('DB_POOL_MAX_IDLE', default=300.0),
+            'max_lifetime': env.float('DB_POOL_MAX_LIFETIME', default=3600.0),
+        }
+    else:
+        _db['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0 if DEBUG else 600)
+        _db['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+
+# Metrics and profiling
+METRICS_TOKEN = env('METRICS_TOKEN', default='')  # Bearer token for /metrics; without one only DEBUG or staff sessions may scrape
+REQUEST_PROFILING_ENABLED = env.bool('REQUEST_PROFILING_ENABLED', default=False)  # X-Profile header, staff only
+REQUEST_PROFILING_LIMIT = env.int('REQUEST_PROFILING_LIMIT', default=60)  # Rows of cProfile output
+
+# Startup import budget enforced by `manage.py check_import_budget`; provider SDKs and Pillow must load
+# on first use. requests (allauth's google provider imports it) and orjson (the default renderer) are
+# needed at startup and are deliberately not listed.
+IMPORT_TIME_BUDGET_MS = env.int('IMPORT_TIME_BUDGET_MS', default=1000)
+IMPORT_TIME_LAZY_MODULES = ['openai', 'google.genai', 'PIL']
 
 # Logging Configuration
 LOGGING = {
@@ -16,14 +16,18 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
 from django.conf import settings
 from django.conf.urls.static import static
+from api.ops_views import metrics_view
+from api.schema_views import CachedSpectacularAPIView
 
 urlpatterns = [
 	path('admin/', admin.site.urls),
+	# Prometheus metrics
+	path('metrics', metrics_view, name='metrics'),
 	# OpenAPI schema and docs
-	path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+	path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
 	path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 	path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 	# Django Allauth URLs
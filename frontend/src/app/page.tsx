@@ -30,7 +30,7 @@ export default function Dashboard() {
   const [loading, setLoading] = useState(false);
 
   async function loadJobs() {
-    try { setJobs(await apiFetch<ImageJob[]>("/image-jobs/")); } catch (e:any) { setError(e.message); }
+    try { setJobs((await apiFetch<{ results: ImageJob[] }>("/image-jobs/")).results); } catch (e:any) { setError(e.message); }
   }
   async function loadThreads() {
     try { setThreads(await apiFetch<Thread[]>("/chat/threads/")); } catch (e:any) { setError(e.message); }